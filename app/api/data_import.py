@@ -5,39 +5,50 @@ from pathlib import Path
 from typing import List
 
 from app.models import sql_models
-from app.models.sql_models import get_db
+from app.models.sql_models import get_db, StatusEnum
 from app.core.response import Success, Fail
-from app.services.import_service import DataImportService
+from app.services.import_service import DataImportService, IMPORT_MODES, SUPPORTED_EXTENSIONS
+from app.services.batch_extraction_service import create_extraction_batch, get_batch_progress
+from app.services.file_store import UploadTooLargeError, store_upload
+from app.services.job_queue import get_job_queue
+from app.services.jobs import EXTRACTION_QUEUE
 
 router = APIRouter()
 
 
 @router.post("/import/excel")
-async def import_from_excel(
+def import_from_excel(
     *,
     db: Session = Depends(get_db),
     data_type: str = Form(...),
+    mode: str = Form("insert"),
     file: UploadFile = File(...)
 ):
     """
-    Import historical data from Excel file.
+    Import historical data from an Excel, CSV, JSONL or Parquet file.
     data_type: requirements, testcases, or defects
+    mode: insert (add every row) or upsert (match on external_key / defect_id,
+          update changed rows and skip unchanged ones)
     """
     if data_type not in ["requirements", "testcases", "defects"]:
         return Fail(message="Invalid data_type", code=40001)
+    if mode not in IMPORT_MODES:
+        return Fail(message="Invalid mode", code=40001)
+    if Path(file.filename).suffix.lower() not in SUPPORTED_EXTENSIONS:
+        return Fail(message=f"Unsupported file type, expected one of {', '.join(SUPPORTED_EXTENSIONS)}", code=40001)
 
-    # Save uploaded file
-    upload_dir = Path("uploads/imports")
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    file_path = upload_dir / file.filename
+    # Stream the upload into the content-addressed store without holding it in memory
+    try:
+        stored = store_upload(file.file, file.filename)
+    except UploadTooLargeError as e:
+        return Fail(message=str(e), code=40001, status_code=413)
 
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
-
-    # Import data
+    # Import data in streamed batches
     import_service = DataImportService(db)
-    result = import_service.import_from_excel(str(file_path), data_type)
+    result = import_service.import_file(
+        str(stored.path), data_type, mode, source_file=Path(file.filename).name, suffix=stored.suffix
+    )
+    result["file"] = {"sha256": stored.sha256, "size": stored.size, "duplicate": stored.duplicate}
 
     return Success(data=result)
 
@@ -50,25 +61,54 @@ def batch_extract_knowledge(
 ):
     """
     Batch extract test knowledge from requirements.
+    Queues an extraction batch for the workers; poll GET /import/batch-extract/{batch_id} for progress.
+    """
+    if not requirement_ids:
+        return Fail(message="requirement_ids is empty", code=40001)
+
+    batch = create_extraction_batch(db, requirement_ids)
+    # Queued in the same transaction so the job exists exactly when the batch does
+    get_job_queue().enqueue(EXTRACTION_QUEUE, "batch_extraction", {"batch_id": batch.id}, db=db)
+    db.commit()
+
+    return Success(data={"batch_id": str(batch.id), "status": batch.status, "total": batch.total})
+
+
+@router.get("/import/batch-extract/{batch_id}")
+def read_batch_extract_progress(
+    *,
+    db: Session = Depends(get_db),
+    batch_id: int,
+    failures_limit: int = 100
+):
+    """
+    Progress of an extraction batch: item counts and the failed requirements with their errors.
     """
-    from app.core.dependencies import get_extraction_service
-
-    extraction_service = get_extraction_service()
-    extracted = 0
-    failed = 0
-
-    for req_id in requirement_ids:
-        try:
-            req = db.query(sql_models.RequirementRaw).filter(
-                sql_models.RequirementRaw.id == req_id
-            ).first()
-            if req:
-                extraction_service.extract_and_store(
-                    str(req.id), f"KB-{req.id}", req.full_content
-                )
-                extracted += 1
-        except Exception as e:
-            print(f"Extract failed for {req_id}: {e}")
-            failed += 1
-
-    return Success(data={"extracted": extracted, "failed": failed})
+    progress = get_batch_progress(db, batch_id, failures_limit=max(0, min(failures_limit, 1000)))
+    if progress is None:
+        return Fail(message="Extraction batch not found", code=40401, status_code=404)
+    return Success(data=progress)
+
+
+@router.post("/import/batch-extract/{batch_id}/retry")
+def retry_batch_extract(
+    *,
+    db: Session = Depends(get_db),
+    batch_id: int
+):
+    """
+    Queue a finished batch again; only requirements that are not DONE are processed.
+    """
+    batch = db.query(sql_models.ExtractionBatch).filter(
+        sql_models.ExtractionBatch.id == batch_id
+    ).with_for_update().first()
+    if batch is None:
+        return Fail(message="Extraction batch not found", code=40401, status_code=404)
+    if batch.status in (StatusEnum.INIT, StatusEnum.RUNNING):
+        return Fail(message="Extraction batch is already queued or running", code=40001)
+
+    batch.status = StatusEnum.INIT
+    get_job_queue().enqueue(EXTRACTION_QUEUE, "batch_extraction", {"batch_id": batch.id}, db=db)
+    db.commit()
+
+    return Success(data={"batch_id": str(batch.id), "status": batch.status})
@@ -7,6 +7,7 @@ from app.models import sql_models
 from app.schemas import defect_schema
 from app.models.sql_models import get_db
 from app.core.response import Success, Fail
+from app.core.pagination import clamp_limit, paginate, page
 
 router = APIRouter()
 
@@ -51,10 +52,10 @@ def list_defects(
     db: Session = Depends(get_db),
     requirement_id: Optional[int] = None,
     severity: Optional[str] = None,
-    skip: int = 0,
+    cursor: Optional[str] = None,
     limit: int = 100
 ):
-    """List defects with optional filters."""
+    """List defects newest first with optional filters; pass next_cursor back as cursor."""
     query = db.query(sql_models.Defect)
 
     if requirement_id:
@@ -62,7 +63,12 @@ def list_defects(
     if severity:
         query = query.filter(sql_models.Defect.severity == severity)
 
-    defects = query.offset(skip).limit(limit).all()
+    limit = clamp_limit(limit)
+    try:
+        query = paginate(query, sql_models.Defect.created_at, sql_models.Defect.id, cursor, limit)
+    except ValueError:
+        return Fail(message="Invalid cursor", code=40001)
+    defects, next_cursor = page(query.all(), limit)
 
     result = []
     for defect in defects:
@@ -76,7 +82,7 @@ def list_defects(
             "created_at": defect.created_at.isoformat() if defect.created_at else None
         })
 
-    return Success(data=result)
+    return Success(data={"items": result, "next_cursor": next_cursor})
 
 
 @router.get("/{defect_id}")
@@ -1,7 +1,8 @@
-from typing import List, Dict, Any
+from typing import List
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from app.services.graph_service import GraphService
+from app.core.dependencies import get_graph_service
 from app.core.response import Success, Fail
 
 router = APIRouter()
@@ -10,21 +11,6 @@ class GraphExpandRequest(BaseModel):
     node_ids: List[str]
     depth: int = 2
 
-class GraphNode(BaseModel):
-    id: str
-    labels: List[str]
-    properties: Dict[str, Any]
-
-class GraphRelationship(BaseModel):
-    source: str
-    target: str
-    type: str
-    properties: Dict[str, Any]
-
-class Subgraph(BaseModel):
-    nodes: List[GraphNode]
-    relationships: List[GraphRelationship]
-
 @router.post("/expand")
 def expand_graph(
     req: GraphExpandRequest,
@@ -39,11 +25,7 @@ def expand_graph(
             depth=req.depth
         )
 
-        response_data = Subgraph(
-            nodes=[GraphNode(**node) for node in nodes],
-            relationships=[GraphRelationship(**rel) for rel in relationships]
-        )
-        
-        return Success(data=response_data.dict())
+        # Subgraphs can hold thousands of nodes; the service dicts are serialized as they are
+        return Success(data={"nodes": nodes, "relationships": relationships})
     except Exception as e:
         return Fail(message=f"Graph expansion failed: {str(e)}")
@@ -2,6 +2,7 @@ from typing import List
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from app.services.retrieval_service import RetrievalService
+from app.core.dependencies import get_retrieval_service
 from app.core.response import Success, Fail
 
 router = APIRouter()
@@ -10,12 +11,6 @@ class SearchRequest(BaseModel):
     query_text: str
     top_k: int = 10
 
-class SearchResult(BaseModel):
-    id: str
-    content: str
-    type: str
-    score: float
-
 @router.post("/search")
 def search(
     req: SearchRequest,
@@ -36,16 +31,16 @@ def search(
             graph_depth=0 # We don't need graph expansion here
         )
         
-        # Map the results to the SearchResult model
+        # Map the results straight to the response fields
         response_data = [
-            SearchResult(
-                id=res.get("id"),
-                content=res.get("content"),
-                type=res.get("type"),
-                score=res.get("score")
-            ) for res in search_results
+            {
+                "id": res.get("id"),
+                "content": res.get("content"),
+                "type": res.get("type"),
+                "score": float(res.get("score") or 0.0)
+            } for res in search_results
         ]
-        
-        return Success(data=[res.dict() for res in response_data])
+
+        return Success(data=response_data)
     except Exception as e:
         return Fail(message=f"Search failed: {str(e)}")
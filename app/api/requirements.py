@@ -1,54 +1,34 @@
-from typing import List
-from fastapi import APIRouter, Depends, BackgroundTasks, UploadFile, File, Form
+import asyncio
+import json
+from typing import Any, Dict, List
+from fastapi import APIRouter, Depends, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import uuid
 import os
-from pathlib import Path
 
 from app.models import sql_models
 from app.schemas import requirement_schema, knowledge_base_schema
-from app.models.sql_models import get_db, StatusEnum, SessionLocal
+from app.models.sql_models import get_db, get_async_db, StatusEnum
+from app.core.config import settings
 from app.core.response import Success, Fail
-from app.services.extraction_service import ExtractionService
+from app.core.pagination import clamp_limit, paginate, page
 from app.services.intent_service import IntentService
-from app.services.parser import DocumentParser
+from app.services.job_queue import get_job_queue
+from app.services.jobs import EXTRACTION_QUEUE
+from app.services.parse_pool import parse_file
+from app.services.chunker import chunk_text
+from app.services.file_store import StoredFile, UploadTooLargeError, store_upload
+from app.services.llm_client import llm_call_context
 
 router = APIRouter()
 
-def run_extraction_in_background(
-    requirement_id: int,
-    knowledge_base_id: str,
-    text: str,
-):
-    """
-    A function to run the extraction process in the background.
-    """
-    db = SessionLocal()
-    extraction_service = ExtractionService()
-    try:
-        extraction_service.extract_and_store(
-            requirement_id=str(requirement_id),
-            knowledge_base_id=knowledge_base_id,
-            text=text
-        )
-        db_kb = db.query(sql_models.KnowledgeBase).filter(sql_models.KnowledgeBase.id == knowledge_base_id).first()
-        if db_kb:
-            db_kb.status = StatusEnum.COMPLETED
-            db.commit()
-    except Exception as e:
-        db_kb = db.query(sql_models.KnowledgeBase).filter(sql_models.KnowledgeBase.id == knowledge_base_id).first()
-        if db_kb:
-            db_kb.status = StatusEnum.FAILED
-            db.commit()
-        print(f"Extraction failed for KB {knowledge_base_id}: {e}")
-    finally:
-        db.close()
-
-
 @router.post("/upload")
 async def upload_requirement(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     project_id: str = Form(...),
     input_type: str = Form(...),
     files: List[UploadFile] = File(...)
@@ -59,53 +39,57 @@ async def upload_requirement(
     if input_type not in ["text", "doc", "pdf", "excel", "image"]:
         return Fail(message="Invalid input_type. Must be one of: text, doc, pdf, excel, image", code=40001)
 
-    # Create upload directory if it doesn't exist
-    upload_dir = Path("uploads") / project_id
-    upload_dir.mkdir(parents=True, exist_ok=True)
-
-    parser = DocumentParser()
-    parsed_content = ""
-    source_files = []
-
+    # Stream every file into the content-addressed store; identical files are stored once
+    stored_files = []
     for file in files:
-        # Save file
-        file_path = upload_dir / file.filename
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-
-        source_files.append(file.filename)
-
-        # Parse content based on type
         try:
+            stored = await run_in_threadpool(store_upload, file.file, file.filename)
+        except UploadTooLargeError as e:
+            return Fail(message=str(e), code=40001, status_code=413)
+        stored_files.append((file.filename, stored))
+
+    # Documents parse in the process pool, all files of the upload in parallel, into
+    # text and the structured chunks (headings, tables, pages) extraction runs on
+    async def parse(filename: str, stored: StoredFile) -> Dict[str, Any]:
+        if input_type in ("text", "image"):
             if input_type == "text":
-                parsed_content += content.decode("utf-8") + "\n"
-            elif input_type in ["doc", "docx"]:
-                parsed_content += parser.parse_word(str(file_path)) + "\n"
-            elif input_type == "pdf":
-                parsed_content += parser.parse_pdf(str(file_path)) + "\n"
-            elif input_type == "excel":
-                parsed_content += parser.parse_excel(str(file_path)) + "\n"
-            elif input_type == "image":
+                text = await run_in_threadpool(stored.path.read_text, encoding="utf-8")
+            else:
                 # For images, save path for future OCR processing
-                parsed_content += f"[Image: {file.filename}]\n"
-        except Exception as e:
-            return Fail(message=f"Failed to parse file {file.filename}: {str(e)}", code=50001)
+                text = f"[Image: {filename}]"
+            return {"text": text, "chunks": await run_in_threadpool(chunk_text, text, settings.chunk_max_chars)}
+        return await parse_file(str(stored.path), input_type, stored.sha256)
+
+    results = await asyncio.gather(*(parse(*stored) for stored in stored_files), return_exceptions=True)
+    for (filename, _), result in zip(stored_files, results):
+        if isinstance(result, Exception):
+            return Fail(message=f"Failed to parse file {filename}: {str(result)}", code=50001)
+    parsed_content = "".join(result["text"] + "\n" for result in results)
+    chunks = []
+    for (filename, _), result in zip(stored_files, results):
+        for chunk in result["chunks"]:
+            chunks.append({**chunk, "index": len(chunks), "source_file": filename})
+    source_files = [filename for filename, _ in stored_files]
 
     # Create requirement_raw entry
     db_req_raw = sql_models.RequirementRaw(
         title=f"Requirement from {input_type}",
         full_content=parsed_content,
         source_type=input_type,
-        source_file=", ".join(source_files)
+        source_file=", ".join(source_files),
+        chunks=json.dumps(chunks, ensure_ascii=False)
     )
     db.add(db_req_raw)
-    db.commit()
-    db.refresh(db_req_raw)
+    await db.commit()
+    await db.refresh(db_req_raw)
 
     return Success(data={
         "requirement_id": str(db_req_raw.id),
-        "raw_chunks": len(source_files)
+        "raw_chunks": len(chunks),
+        "files": [
+            {"filename": filename, "sha256": stored.sha256, "size": stored.size, "duplicate": stored.duplicate}
+            for filename, stored in stored_files
+        ]
     })
 
 
@@ -128,23 +112,50 @@ def create_requirement(
     return Success(data=response_data.dict())
 
 @router.get("/")
-def read_requirements(
-    db: Session = Depends(get_db),
-    skip: int = 0,
+async def read_requirements(
+    db: AsyncSession = Depends(get_async_db),
+    status: str = None,
+    cursor: str = None,
     limit: int = 100,
 ):
-    requirements = db.query(sql_models.Requirement).offset(skip).limit(limit).all()
-    response_data = [requirement_schema.RequirementOut.model_validate(req).dict() for req in requirements]
-    return Success(data=response_data)
+    """List requirements newest first. Pass next_cursor back as cursor for the next page."""
+    query = select(sql_models.Requirement)
+    if status:
+        try:
+            query = query.where(sql_models.Requirement.status == StatusEnum(status))
+        except ValueError:
+            return Fail(message="Invalid status", code=40001)
+
+    limit = clamp_limit(limit)
+    try:
+        query = paginate(query, sql_models.Requirement.create_time, sql_models.Requirement.id, cursor, limit)
+    except ValueError:
+        return Fail(message="Invalid cursor", code=40001)
+    requirements, next_cursor = page((await db.execute(query)).scalars().all(), limit, created_attr="create_time")
+
+    # Rows are serialized directly; validating each one through RequirementOut costs more than the query
+    response_data = [
+        {
+            "id": req.id,
+            "name": req.name,
+            "description": req.description,
+            "priority": req.priority,
+            "status": req.status,
+            "create_time": req.create_time,
+            "update_time": req.update_time,
+        }
+        for req in requirements
+    ]
+    return Success(data={"items": response_data, "next_cursor": next_cursor})
 
 @router.get("/{requirement_id}")
-def read_requirement(
+async def read_requirement(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     requirement_id: int,
 ):
     # Try to get from requirement_raw first
-    requirement = db.query(sql_models.RequirementRaw).filter(sql_models.RequirementRaw.id == requirement_id).first()
+    requirement = await db.get(sql_models.RequirementRaw, requirement_id)
     if requirement:
         return Success(data={
             "requirement_id": requirement.id,
@@ -155,7 +166,7 @@ def read_requirement(
         })
 
     # Fallback to legacy table
-    requirement = db.query(sql_models.Requirement).filter(sql_models.Requirement.id == requirement_id).first()
+    requirement = await db.get(sql_models.Requirement, requirement_id)
     if not requirement:
         return Fail(message="Requirement not found", code=40401, status_code=404)
     
@@ -170,7 +181,6 @@ def run_extraction(
     *,
     db: Session = Depends(get_db),
     requirement_id: int,
-    background_tasks: BackgroundTasks,
     req_in: ExtractionRequest
 ):
     requirement = db.query(sql_models.Requirement).filter(sql_models.Requirement.id == requirement_id).first()
@@ -185,15 +195,15 @@ def run_extraction(
         status=StatusEnum.PROCESSING
     )
     db.add(db_kb)
+    # Queued in the same transaction so the job exists exactly when the knowledge base does
+    get_job_queue().enqueue(
+        EXTRACTION_QUEUE,
+        "knowledge_extraction",
+        {"requirement_id": requirement_id, "knowledge_base_id": knowledge_base_id, "text": req_in.description},
+        db=db
+    )
     db.commit()
     db.refresh(db_kb)
-
-    background_tasks.add_task(
-        run_extraction_in_background,
-        requirement_id,
-        knowledge_base_id,
-        req_in.description,
-    )
     
     response_data = knowledge_base_schema.KnowledgeBaseOut.model_validate(db_kb)
     return Success(data=response_data.dict())
@@ -217,7 +227,8 @@ def analyze_intent(
     
     try:
         content = requirement.full_content if hasattr(requirement, 'full_content') else requirement.description
-        intents = intent_service.analyze(content)
+        with llm_call_context(requirement_id=requirement_id):
+            intents = intent_service.analyze(content)
         return Success(data=intents)
     except Exception as e:
         return Fail(message=f"Intent analysis failed: {str(e)}")
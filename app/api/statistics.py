@@ -1,9 +1,10 @@
 """Statistics and analytics API."""
-from fastapi import APIRouter, Depends
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 
 from app.models.sql_models import get_db
-from app.core.response import Success
+from app.core.response import Success, Fail
 from app.services.statistics_service import StatisticsService
 
 router = APIRouter()
@@ -30,6 +31,17 @@ def get_generation_statistics(
     return Success(data=stats)
 
 
+@router.get("/coverage")
+def get_all_coverage_statistics(
+    db: Session = Depends(get_db),
+    requirement_ids: Optional[List[int]] = Query(None)
+):
+    """Get test coverage statistics for all requirements (or the given requirement_ids) at once."""
+    stats_service = StatisticsService(db)
+    stats = stats_service.get_test_coverage_all(requirement_ids)
+    return Success(data=stats)
+
+
 @router.get("/coverage/{requirement_id}")
 def get_coverage_statistics(
     *,
@@ -50,3 +62,21 @@ def get_knowledge_statistics(
     stats_service = StatisticsService(db)
     stats = stats_service.get_knowledge_stats()
     return Success(data=stats)
+
+
+@router.get("/llm-usage")
+def get_llm_usage_statistics(
+    db: Session = Depends(get_db),
+    days: int = 7,
+    group_by: str = "call_site"
+):
+    """
+    Get LLM/embedding token usage, latency and estimated cost.
+    group_by: call_site, task, requirement or day
+    """
+    if group_by not in ["call_site", "task", "requirement", "day"]:
+        return Fail(message="Invalid group_by. Must be call_site, task, requirement, or day", code=40001)
+
+    stats_service = StatisticsService(db)
+    stats = stats_service.get_llm_usage_stats(days, group_by)
+    return Success(data=stats)
@@ -1,36 +1,54 @@
+from datetime import datetime
 from typing import List
 from fastapi import APIRouter, Depends
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import json
 
 from app.models import sql_models
 from app.schemas import task_schema
-from app.models.sql_models import get_db
+from app.models.sql_models import get_db, get_async_db
 from app.core.response import Success, Fail
+from app.core.pagination import clamp_limit, paginate, page
+from app.models.sql_models import StatusEnum
+from app.services.job_queue import get_job_queue
+from app.services.jobs import GENERATION_QUEUE
+from app.services.outbox import outbox_stats
 
 router = APIRouter()
 
 
+@router.get("/queue/stats")
+def get_queue_stats(db: Session = Depends(get_db)):
+    """
+    Job queue metrics: ready/delayed depth, running jobs, expired leases and
+    terminal counts per queue, plus the outbox backlog.
+    """
+    stats = get_job_queue().stats()
+    stats["outbox"] = outbox_stats(db)
+    return Success(data=stats)
+
+
 @router.get("/{task_id}")
-def get_task_status(
+async def get_task_status(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     task_id: int,
 ):
     """
     Query generation task status and results.
     This endpoint is specifically for GenerationTask which tracks test case generation.
+    Clients poll it, so it runs on the async engine.
     """
     # Try to get from GenerationTask table
-    task = db.query(sql_models.GenerationTask).filter(
-        sql_models.GenerationTask.id == task_id
-    ).first()
+    task = await db.get(sql_models.GenerationTask, task_id)
 
     if task:
         # Get associated test cases from generation results
-        results = db.query(sql_models.GenerationResult).filter(
-            sql_models.GenerationResult.task_id == task_id
-        ).all()
+        results = (await db.execute(
+            select(sql_models.GenerationResult).where(sql_models.GenerationResult.task_id == task_id)
+        )).scalars().all()
 
         test_cases = []
         for result in results:
@@ -43,18 +61,30 @@ def get_task_status(
                 except:
                     pass
 
+        completed_steps = await db.scalar(
+            select(func.count(sql_models.GenerationStep.id)).where(sql_models.GenerationStep.task_id == task_id)
+        )
+
         return Success(data={
             "task_id": task.id,
             "status": task.status.value,
             "progress": task.progress,
+            "completed_steps": completed_steps,
             "error_message": task.error_message,
+            "cancel_requested": bool(task.cancel_requested),
+            "deadline_at": task.deadline_at.isoformat() if task.deadline_at else None,
+            "token_usage": {
+                "prompt_tokens": task.prompt_tokens or 0,
+                "completion_tokens": task.completion_tokens or 0,
+                "cached_tokens": task.cached_tokens or 0
+            },
             "test_cases": test_cases,
             "created_at": task.created_at.isoformat() if task.created_at else None,
             "finished_at": task.finished_at.isoformat() if task.finished_at else None
         })
 
     # Fallback to legacy Task table
-    task = db.query(sql_models.Task).filter(sql_models.Task.id == task_id).first()
+    task = await db.get(sql_models.Task, task_id)
     if not task:
         return Fail(message="Task not found", code=40401, status_code=404)
 
@@ -62,22 +92,127 @@ def get_task_status(
     return Success(data=response_data.dict())
 
 
-@router.get("/")
-def list_tasks(
+@router.post("/{task_id}/resume")
+def resume_task(
+    *,
     db: Session = Depends(get_db),
+    task_id: int,
+):
+    """
+    Resume a failed, interrupted, cancelled or timed out generation task.
+    Steps checkpointed by earlier attempts (context, test points, finished cases) are skipped.
+    The deadline of the original submission is dropped.
+    """
+    # Locked like cancel_task so a concurrent cancel cannot slip in between
+    task = db.query(sql_models.GenerationTask).filter(
+        sql_models.GenerationTask.id == task_id
+    ).with_for_update().first()
+    if not task:
+        return Fail(message="Task not found", code=40401, status_code=404)
+    if task.status == StatusEnum.DONE:
+        return Fail(message="Task already completed", code=40001)
+
+    job_queue = get_job_queue()
+    active = job_queue.active_job(task_id)
+    if active is not None:
+        if task.cancel_requested:
+            # Withdraw the pending cancel: the running worker keeps going and a
+            # queued job is no longer skipped when it is claimed
+            task.cancel_requested = False
+            if task.status == StatusEnum.CANCELLED:
+                task.status = StatusEnum.INIT
+                task.error_message = None
+                task.finished_at = None
+        db.commit()
+    else:
+        task.status = StatusEnum.INIT
+        task.error_message = None
+        task.finished_at = None
+        task.cancel_requested = False
+        task.deadline_at = None
+        active = job_queue.enqueue(
+            GENERATION_QUEUE,
+            "batch_generation",
+            {"task_id": task.id, "requirement_id": task.raw_req_id},
+            task_id=task.id,
+            db=db
+        )
+        db.commit()
+
+    completed_steps = db.query(sql_models.GenerationStep).filter(
+        sql_models.GenerationStep.task_id == task_id
+    ).count()
+
+    return Success(data={
+        "task_id": task.id,
+        "job_id": active.id,
+        "status": task.status.value,
+        "completed_steps": completed_steps
+    })
+
+
+@router.post("/{task_id}/cancel")
+def cancel_task(
+    *,
+    db: Session = Depends(get_db),
+    task_id: int,
+):
+    """
+    Cancel a generation task.
+    A queued task is cancelled at once; a running task stops before its next step
+    and keeps the test cases generated so far.
+    """
+    task = db.query(sql_models.GenerationTask).filter(
+        sql_models.GenerationTask.id == task_id
+    ).with_for_update().first()
+    if not task:
+        return Fail(message="Task not found", code=40401, status_code=404)
+    if task.status in (StatusEnum.DONE, StatusEnum.FAILED, StatusEnum.CANCELLED, StatusEnum.TIMED_OUT):
+        return Fail(message=f"Task already finished with status {task.status.value}", code=40001)
+
+    task.cancel_requested = True
+    if task.status == StatusEnum.INIT:
+        # Not picked up by a worker yet; the worker skips it when the job is claimed
+        task.status = StatusEnum.CANCELLED
+        task.error_message = "Cancelled by user"
+        task.finished_at = datetime.utcnow()
+    db.commit()
+
+    return Success(data={
+        "task_id": task.id,
+        "status": task.status.value,
+        "cancel_requested": True
+    })
+
+
+@router.get("/")
+async def list_tasks(
+    db: AsyncSession = Depends(get_async_db),
     requirement_id: int = None,
-    skip: int = 0,
+    status: str = None,
+    cursor: str = None,
     limit: int = 100,
 ):
     """
-    List generation tasks, optionally filtered by requirement_id.
+    List generation tasks newest first, optionally filtered by requirement_id and status.
+    Pass next_cursor back as cursor for the next page.
     """
-    query = db.query(sql_models.GenerationTask)
+    query = select(sql_models.GenerationTask)
 
     if requirement_id:
-        query = query.filter(sql_models.GenerationTask.raw_req_id == requirement_id)
+        query = query.where(sql_models.GenerationTask.raw_req_id == requirement_id)
+    if status:
+        try:
+            query = query.where(sql_models.GenerationTask.status == StatusEnum(status))
+        except ValueError:
+            return Fail(message="Invalid status", code=40001)
 
-    tasks = query.offset(skip).limit(limit).all()
+    limit = clamp_limit(limit)
+    try:
+        query = paginate(query, sql_models.GenerationTask.created_at, sql_models.GenerationTask.id, cursor, limit)
+    except ValueError:
+        return Fail(message="Invalid cursor", code=40001)
+    tasks, next_cursor = page((await db.execute(query)).scalars().all(), limit)
 
     result = []
     for task in tasks:
@@ -90,7 +225,7 @@ def list_tasks(
             "finished_at": task.finished_at.isoformat() if task.finished_at else None
         })
 
-    return Success(data=result)
+    return Success(data={"items": result, "next_cursor": next_cursor})
 
 
 # Legacy endpoints for backward compatibility
@@ -1,15 +1,25 @@
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 import json
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from app.models import sql_models
 from app.schemas import testcase_schema
-from app.models.sql_models import get_db, StatusEnum, SessionLocal
+from app.models.sql_models import get_db, get_async_db, StatusEnum
+from app.models.rollups import record_changed
 from app.core.response import Success, Fail
+from app.core.pagination import clamp_limit, paginate, page
+from app.services.llm_client import get_llm_client
+from app.services.job_queue import get_job_queue
+from app.services.jobs import GENERATION_QUEUE, EXTRACTION_QUEUE
+from app.services.batch_generation_service import generation_dedup_key
+from app.services.export_service import EXPORT_FORMATS, export_conditions, stream_export
 
 router = APIRouter()
 
@@ -23,6 +33,7 @@ class BatchGenerateRequest(BaseModel):
     """Request for batch generation from requirement to test cases"""
     requirement_id: int
     options: Optional[Dict[str, Any]] = None
+    timeout_seconds: Optional[int] = None  # Deadline; partial results are kept when exceeded
 
 
 class ConfirmTestCaseRequest(BaseModel):
@@ -32,166 +43,12 @@ class ConfirmTestCaseRequest(BaseModel):
 
 
 class ExportRequest(BaseModel):
-    """Request to export test cases"""
-    case_ids: List[int]
-    format: str = "excel"  # excel, csv, json
-
-
-def run_batch_generation_in_background(task_id: int, requirement_id: int):
-    """Background task for batch test case generation"""
-    db = SessionLocal()
-    try:
-        # Update task status
-        task = db.query(sql_models.GenerationTask).filter(
-            sql_models.GenerationTask.id == task_id
-        ).first()
-
-        if not task:
-            return
-
-        task.status = StatusEnum.RUNNING
-        task.progress = 10
-        db.commit()
-
-        # Get requirement
-        requirement = db.query(sql_models.RequirementRaw).filter(
-            sql_models.RequirementRaw.id == requirement_id
-        ).first()
-
-        if not requirement:
-            task.status = StatusEnum.FAILED
-            task.error_message = "Requirement not found"
-            db.commit()
-            return
-
-        # Step 1: Generate test points
-        task.progress = 30
-        db.commit()
-
-        from app.core.dependencies import get_retrieval_service
-        from openai import OpenAI
-        from app.core.config import settings
-
-        retrieval_service = get_retrieval_service()
-        client = OpenAI(api_key=settings.openai_api_key)
-
-        # Search for relevant context
-        context = retrieval_service.search(
-            query_text=requirement.full_content,
-            top_k=10,
-            graph_depth=2
-        )
-
-        context_str = json.dumps(context, ensure_ascii=False, indent=2)
-
-        # Generate test points
-        prompt_testpoints = f"""
-你是一名资深测试架构师，基于需求生成测试点。
-
-需求：{requirement.full_content}
-
-历史知识：{context_str}
-
-输出JSON格式：{{"test_points": [{{"category": "正常/异常/边界", "description": "测试点描述"}}]}}
-"""
-
-        response = client.chat.completions.create(
-            model=settings.openai_model,
-            messages=[{"role": "user", "content": prompt_testpoints}],
-            response_format={"type": "json_object"}
-        )
-
-        test_points_data = json.loads(response.choices[0].message.content)
-        test_points = test_points_data.get("test_points", [])
-
-        task.progress = 50
-        db.commit()
-
-        # Step 2: Generate test cases from test points
-        generated_cases = []
-
-        for i, tp in enumerate(test_points):
-            # Save test point
-            db_tp = sql_models.TestPoint(
-                content=tp["description"],
-                type="TestPoint",
-                confidence=0.8,
-                source="requirement"
-            )
-            db.add(db_tp)
-            db.commit()
-            db.refresh(db_tp)
-
-            # Generate test case
-            prompt_case = f"""
-你是测试工程师，为测试点生成详细测试用例。
-
-测试点：{tp["description"]}
-需求背景：{requirement.full_content[:500]}
-
-输出JSON格式：
-{{
-  "title": "测试用例标题",
-  "precondition": "前置条件",
-  "steps": ["步骤1", "步骤2"],
-  "expected": "预期结果"
-}}
-"""
-
-            response = client.chat.completions.create(
-                model=settings.openai_model,
-                messages=[{"role": "user", "content": prompt_case}],
-                response_format={"type": "json_object"}
-            )
-
-            case_data = json.loads(response.choices[0].message.content)
-
-            # Save test case
-            db_case = sql_models.TestCase(
-                title=case_data.get("title", tp["description"]),
-                precondition=case_data.get("precondition"),
-                steps=json.dumps(case_data.get("steps", []), ensure_ascii=False),
-                expected=case_data.get("expected", ""),
-                related_req_id=None,  # Will be linked later
-                test_point_id=db_tp.id,
-                status=sql_models.TestCaseStatusEnum.DRAFT,
-                created_by=sql_models.CreatorEnum.AI
-            )
-            db.add(db_case)
-            db.commit()
-            db.refresh(db_case)
-
-            # Save generation result
-            db_result = sql_models.GenerationResult(
-                task_id=task_id,
-                test_point_id=db_tp.id,
-                test_case_content=json.dumps(case_data, ensure_ascii=False),
-                approved=False
-            )
-            db.add(db_result)
-            generated_cases.append(db_case.id)
-
-            # Update progress
-            task.progress = 50 + int((i + 1) / len(test_points) * 40)
-            db.commit()
-
-        # Complete task
-        task.status = StatusEnum.DONE
-        task.progress = 100
-        task.finished_at = datetime.utcnow()
-        db.commit()
-
-    except Exception as e:
-        task = db.query(sql_models.GenerationTask).filter(
-            sql_models.GenerationTask.id == task_id
-        ).first()
-        if task:
-            task.status = StatusEnum.FAILED
-            task.error_message = str(e)
-            task.finished_at = datetime.utcnow()
-            db.commit()
-    finally:
-        db.close()
+    """Request to export test cases, selected by IDs and/or filters"""
+    case_ids: Optional[List[int]] = None
+    requirement_id: Optional[int] = None
+    test_point_id: Optional[int] = None
+    status: Optional[str] = None
+    format: str = "excel"  # excel, csv, json, jsonl
 
 
 @router.post("/generate")
@@ -208,10 +65,7 @@ def generate_test_cases(
         return Fail(message="No test points provided", code=40001)
 
     try:
-        from openai import OpenAI
-        from app.core.config import settings
-
-        client = OpenAI(api_key=settings.openai_api_key)
+        client = get_llm_client()
         test_cases = []
 
         for tp_id in req.test_points:
@@ -238,9 +92,9 @@ def generate_test_cases(
 }}
 """
 
-            response = client.chat.completions.create(
-                model=settings.openai_model,
-                messages=[{"role": "user", "content": prompt}],
+            response = client.chat(
+                "test_case",
+                [{"role": "user", "content": prompt}],
                 response_format={"type": "json_object"}
             )
 
@@ -279,41 +133,66 @@ def generate_test_cases(
 def batch_generate_test_cases(
     *,
     db: Session = Depends(get_db),
-    req: BatchGenerateRequest,
-    background_tasks: BackgroundTasks
+    req: BatchGenerateRequest
 ):
     """
     One-shot generation from requirement to test cases.
-    Returns a task ID for tracking progress.
+    Returns a task ID for tracking progress. Resubmitting the same requirement
+    content and options while a task is queued or running returns that task.
     """
-    # Verify requirement exists
+    if req.timeout_seconds is not None and req.timeout_seconds <= 0:
+        return Fail(message="timeout_seconds must be positive", code=40001)
+
+    # Verify requirement exists; the row lock serializes concurrent submissions
+    # for the same requirement so duplicates cannot slip past the check below
     requirement = db.query(sql_models.RequirementRaw).filter(
         sql_models.RequirementRaw.id == req.requirement_id
-    ).first()
+    ).with_for_update().first()
 
     if not requirement:
         return Fail(message="Requirement not found", code=40401, status_code=404)
 
+    dedup_key = generation_dedup_key(req.requirement_id, requirement.full_content, req.options)
+    in_flight = db.query(sql_models.GenerationTask).filter(
+        sql_models.GenerationTask.dedup_key == dedup_key,
+        sql_models.GenerationTask.status.in_([StatusEnum.INIT, StatusEnum.RUNNING]),
+        sql_models.GenerationTask.cancel_requested.isnot(True)
+    ).order_by(sql_models.GenerationTask.id.desc()).first()
+    if in_flight:
+        db.rollback()
+        return Success(data={
+            "task_id": str(in_flight.id),
+            "status": in_flight.status.value,
+            "deduplicated": True
+        })
+
     # Create generation task
     task = sql_models.GenerationTask(
         raw_req_id=req.requirement_id,
         status=StatusEnum.INIT,
-        progress=0
+        progress=0,
+        cancel_requested=False,
+        dedup_key=dedup_key,
+        deadline_at=datetime.utcnow() + timedelta(seconds=req.timeout_seconds) if req.timeout_seconds else None
     )
     db.add(task)
+    db.flush()
+
+    # Queue generation for the workers; committed together with the task
+    get_job_queue().enqueue(
+        GENERATION_QUEUE,
+        "batch_generation",
+        {"task_id": task.id, "requirement_id": req.requirement_id},
+        task_id=task.id,
+        db=db
+    )
     db.commit()
     db.refresh(task)
 
-    # Start background generation
-    background_tasks.add_task(
-        run_batch_generation_in_background,
-        task.id,
-        req.requirement_id
-    )
-
     return Success(data={
         "task_id": str(task.id),
-        "status": task.status.value
+        "status": task.status.value,
+        "deduplicated": False
     })
 
 
@@ -325,48 +204,50 @@ def confirm_test_cases(
 ):
     """
     Confirm generated test cases with optional modifications.
-    Confirmed cases will trigger knowledge feedback.
+    The cases are loaded, modified and confirmed in one transaction; their knowledge
+    feedback is queued as one job for the workers.
     """
-    confirmed_count = 0
-    failed_cases = []
-
-    for case_id in req.case_ids:
-        try:
-            test_case = db.query(sql_models.TestCase).filter(
-                sql_models.TestCase.id == case_id
-            ).first()
-
-            if not test_case:
-                failed_cases.append({"case_id": case_id, "reason": "Not found"})
-                continue
-
-            # Apply modifications if provided
-            if req.modifications and case_id in req.modifications:
-                mods = req.modifications[case_id]
-                for key, value in mods.items():
-                    if hasattr(test_case, key):
-                        setattr(test_case, key, value)
-
-            # Update status to confirmed
-            test_case.status = sql_models.TestCaseStatusEnum.CONFIRMED
-            db.commit()
-
-            # Trigger knowledge feedback
-            try:
-                from app.services.knowledge_feedback_service import KnowledgeFeedbackService
-                feedback_service = KnowledgeFeedbackService(db)
-                feedback_service.feedback_from_confirmed_testcase(case_id)
-            except Exception as e:
-                print(f"Knowledge feedback failed for case {case_id}: {e}")
-
-            confirmed_count += 1
+    case_ids = list(dict.fromkeys(req.case_ids))
+    cases = db.query(sql_models.TestCase).filter(sql_models.TestCase.id.in_(case_ids)).all() if case_ids else []
+    found = {test_case.id: test_case for test_case in cases}
+    failed_cases = [{"case_id": case_id, "reason": "Not found"} for case_id in case_ids if case_id not in found]
+
+    # Apply modifications if provided
+    for case_id, mods in (req.modifications or {}).items():
+        test_case = found.get(case_id)
+        if test_case:
+            for key, value in mods.items():
+                if hasattr(test_case, key):
+                    setattr(test_case, key, value)
+    db.flush()
+
+    # Update status to confirmed in one statement
+    confirmed = sql_models.TestCaseStatusEnum.CONFIRMED
+    changed = [test_case for test_case in cases if test_case.status != confirmed]
+    if changed:
+        record_changed(db, sql_models.TestCase, [
+            ({"status": test_case.status, "created_by": test_case.created_by},
+             {"status": confirmed, "created_by": test_case.created_by})
+            for test_case in changed
+        ])
+        db.execute(
+            update(sql_models.TestCase)
+            .where(sql_models.TestCase.id.in_([test_case.id for test_case in changed]))
+            .values(status=confirmed)
+        )
 
-        except Exception as e:
-            failed_cases.append({"case_id": case_id, "reason": str(e)})
+    # Trigger knowledge feedback; queued in the same transaction as the confirmation
+    feedback_job = None
+    if found:
+        feedback_job = get_job_queue().enqueue(
+            EXTRACTION_QUEUE, "knowledge_feedback", {"case_ids": list(found)}, db=db
+        )
+    db.commit()
 
     return Success(data={
-        "confirmed_count": confirmed_count,
-        "failed_cases": failed_cases
+        "confirmed_count": len(found),
+        "failed_cases": failed_cases,
+        "feedback_job_id": str(feedback_job.id) if feedback_job else None
     })
 
 
@@ -377,53 +258,30 @@ def export_test_cases(
     req: ExportRequest
 ):
     """
-    Export test cases to specified format (excel/csv/json).
+    Export the selected test cases as an excel/csv/json/jsonl file download.
+    Cases are selected by case_ids and/or requirement_id, test_point_id and status
+    (all cases when none is given) and streamed, so large exports use constant memory.
     """
-    if req.format not in ["excel", "csv", "json"]:
-        return Fail(message="Invalid format. Must be excel, csv, or json", code=40001)
-
-    # Get test cases
-    test_cases = db.query(sql_models.TestCase).filter(
-        sql_models.TestCase.id.in_(req.case_ids)
-    ).all()
+    if req.format not in EXPORT_FORMATS:
+        return Fail(message="Invalid format. Must be excel, csv, json, or jsonl", code=40001)
+    status = None
+    if req.status:
+        try:
+            status = sql_models.TestCaseStatusEnum(req.status)
+        except ValueError:
+            return Fail(message="Invalid status. Must be draft, confirmed, or executed", code=40001)
 
-    if not test_cases:
+    conditions = export_conditions(req.case_ids, req.requirement_id, req.test_point_id, status)
+    if db.query(sql_models.TestCase.id).filter(*conditions).first() is None:
         return Fail(message="No test cases found", code=40401)
 
-    # Convert to export format
-    export_data = []
-    for tc in test_cases:
-        export_data.append({
-            "id": tc.id,
-            "title": tc.title,
-            "precondition": tc.precondition,
-            "steps": json.loads(tc.steps) if tc.steps else [],
-            "expected": tc.expected,
-            "status": tc.status.value if tc.status else "draft",
-            "created_at": tc.created_at.isoformat() if tc.created_at else None
-        })
-
-    # For now, return JSON data
-    # In production, you would generate actual Excel/CSV files and return download URLs
-    if req.format == "json":
-        import tempfile
-        import os
-
-        # Create temp file
-        temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json', encoding='utf-8')
-        json.dump(export_data, temp_file, ensure_ascii=False, indent=2)
-        temp_file.close()
-
-        # In production, upload to storage and return URL
-        file_url = f"/downloads/{os.path.basename(temp_file.name)}"
-
-        return Success(data={"file_url": file_url, "data": export_data})
-
-    # For excel and csv, return data for now
-    return Success(data={
-        "file_url": f"/downloads/testcases.{req.format}",
-        "data": export_data
-    })
+    extension, media_type = EXPORT_FORMATS[req.format]
+    filename = f"testcases_{datetime.now().strftime('%Y%m%d%H%M%S')}{extension}"
+    return StreamingResponse(
+        stream_export(conditions, req.format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 
 @router.post("/")
@@ -452,20 +310,35 @@ def create_test_case(
     return Success(data=response_data.dict())
 
 @router.get("/")
-def read_test_cases(
-    db: Session = Depends(get_db),
+async def read_test_cases(
+    db: AsyncSession = Depends(get_async_db),
     requirement_id: int = None,
-    skip: int = 0,
+    test_point_id: int = None,
+    status: str = None,
+    cursor: str = None,
     limit: int = 100,
 ):
     """
-    Retrieve all test cases, optionally filtered by requirement_id.
+    Retrieve test cases newest first, optionally filtered by requirement_id,
+    test_point_id and status. Pass next_cursor back as cursor for the next page.
     """
-    query = db.query(sql_models.TestCase)
+    query = select(sql_models.TestCase)
     if requirement_id:
-        query = query.filter(sql_models.TestCase.related_req_id == requirement_id)
+        query = query.where(sql_models.TestCase.related_req_id == requirement_id)
+    if test_point_id:
+        query = query.where(sql_models.TestCase.test_point_id == test_point_id)
+    if status:
+        try:
+            query = query.where(sql_models.TestCase.status == sql_models.TestCaseStatusEnum(status))
+        except ValueError:
+            return Fail(message="Invalid status. Must be draft, confirmed, or executed", code=40001)
 
-    test_cases = query.offset(skip).limit(limit).all()
+    limit = clamp_limit(limit)
+    try:
+        query = paginate(query, sql_models.TestCase.created_at, sql_models.TestCase.id, cursor, limit)
+    except ValueError:
+        return Fail(message="Invalid cursor", code=40001)
+    test_cases, next_cursor = page((await db.execute(query)).scalars().all(), limit)
 
     result = []
     for tc in test_cases:
@@ -479,18 +352,18 @@ def read_test_cases(
             "created_at": tc.created_at.isoformat() if tc.created_at else None
         })
 
-    return Success(data=result)
+    return Success(data={"items": result, "next_cursor": next_cursor})
 
 @router.get("/{test_case_id}")
-def read_test_case(
+async def read_test_case(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     test_case_id: int,
 ):
     """
     Get a specific test case by ID.
     """
-    test_case = db.query(sql_models.TestCase).filter(sql_models.TestCase.id == test_case_id).first()
+    test_case = await db.get(sql_models.TestCase, test_case_id)
     if not test_case:
         return Fail(message="Test case not found", code=40401, status_code=404)
     
@@ -7,6 +7,7 @@ import json
 from app.models import sql_models
 from app.models.sql_models import get_db
 from app.core.response import Success, Fail
+from app.core.pagination import clamp_limit, paginate, page
 from app.services.retrieval_service import RetrievalService
 from app.services.generation_service import GenerationService
 
@@ -58,24 +59,24 @@ def generate_test_points(
         # Get requirement content
         content = requirement.full_content if hasattr(requirement, 'full_content') else requirement.description
 
+        from app.core.config import settings
+        from app.services.llm_client import get_llm_client, llm_call_context
+
         # Retrieve relevant historical knowledge
         if req.history_context:
             context = req.history_context
         else:
             # Auto-retrieve context using vector search + graph expansion
-            search_results = retrieval_service.search(
-                query_text=content,
-                top_k=10,
-                graph_depth=2
-            )
+            with llm_call_context(requirement_id=req.requirement_id):
+                search_results = retrieval_service.search(
+                    query_text=content,
+                    top_k=10,
+                    graph_depth=2
+                )
             context = search_results
 
         # Generate test points using LLM
-        from openai import OpenAI
-        from app.core.config import settings
-        import uuid
-
-        client = OpenAI(api_key=settings.openai_api_key)
+        client = get_llm_client()
 
         context_str = json.dumps(context, ensure_ascii=False, indent=2)
 
@@ -106,12 +107,13 @@ def generate_test_points(
 }}
 """
 
-        response = client.chat.completions.create(
-            model=settings.openai_model,
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-            temperature=settings.llm_temperature
-        )
+        with llm_call_context(requirement_id=req.requirement_id):
+            response = client.chat(
+                "test_points",
+                [{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"},
+                temperature=settings.llm_temperature
+            )
 
         result = json.loads(response.choices[0].message.content)
         test_points = result.get("test_points", [])
@@ -175,11 +177,27 @@ def get_test_point(
 @router.get("/")
 def list_test_points(
     db: Session = Depends(get_db),
-    skip: int = 0,
+    type: Optional[str] = None,
+    source: Optional[str] = None,
+    cursor: Optional[str] = None,
     limit: int = 100
 ):
-    """List all test points"""
-    test_points = db.query(sql_models.TestPoint).offset(skip).limit(limit).all()
+    """List test points newest first, optionally filtered by type and source"""
+    query = db.query(sql_models.TestPoint)
+    if type:
+        try:
+            query = query.filter(sql_models.TestPoint.type == sql_models.TestKnowledgeTypeEnum(type))
+        except ValueError:
+            return Fail(message="Invalid type. Must be TestPoint, Scenario, or Risk", code=40001)
+    if source:
+        query = query.filter(sql_models.TestPoint.source == source)
+
+    limit = clamp_limit(limit)
+    try:
+        query = paginate(query, sql_models.TestPoint.created_at, sql_models.TestPoint.id, cursor, limit)
+    except ValueError:
+        return Fail(message="Invalid cursor", code=40001)
+    test_points, next_cursor = page(query.all(), limit)
 
     result = []
     for tp in test_points:
@@ -191,4 +209,4 @@ def list_test_points(
             "created_at": tp.created_at.isoformat() if tp.created_at else None
         })
 
-    return Success(data=result)
+    return Success(data={"items": result, "next_cursor": next_cursor})
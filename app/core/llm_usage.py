@@ -0,0 +1,40 @@
+"""
+LLM usage helpers.
+Normalizes the token usage reported by OpenAI-compatible APIs.
+"""
+from typing import Any, Dict, Optional
+
+
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+
+def _get(obj: Any, name: str) -> Any:
+    # Older SDK versions keep unknown usage fields as plain dicts
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def extract_usage(response: Any) -> Dict[str, int]:
+    """
+    Extract prompt, completion and cached prompt token counts from an API response.
+    Missing fields are reported as 0.
+    """
+    usage = _get(response, "usage")
+    details = _get(usage, "prompt_tokens_details")
+    return {
+        "prompt_tokens": _get(usage, "prompt_tokens") or 0,
+        "completion_tokens": _get(usage, "completion_tokens") or 0,
+        "cached_tokens": _get(details, "cached_tokens") or 0,
+    }
+
+
+def accumulate_usage(total: Optional[Dict[str, int]], response: Any) -> Dict[str, int]:
+    """Add the usage of a response into a running total and return the response usage."""
+    usage = extract_usage(response)
+    if total is not None:
+        for field in USAGE_FIELDS:
+            total[field] = total.get(field, 0) + usage[field]
+    return usage
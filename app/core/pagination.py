@@ -0,0 +1,67 @@
+"""
+Keyset (cursor) pagination over (created_at, id), newest first.
+
+The cursor is an opaque URL-safe token holding the sort key of the last row of
+the previous page, so each page is an index range scan of `limit` rows instead
+of scanning and discarding `offset` rows. Every paginated table has an index
+starting with (created_at, id), or (filter column, created_at, id) for its
+common filters.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(created_at: Optional[datetime], row_id: int) -> str:
+    payload = {"t": created_at.isoformat() if created_at else None, "id": row_id}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """Decode a cursor; raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        created_at = datetime.fromisoformat(payload["t"]) if payload["t"] else None
+        return created_at, int(payload["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+
+def paginate(query, created_column, id_column, cursor: Optional[str], limit: int):
+    """
+    Apply the keyset condition, ordering and limit to an ORM Query or a select().
+    Fetches limit + 1 rows so page() can tell whether another page exists.
+    Raises ValueError for an invalid cursor.
+    """
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        if created_at is None:
+            # Rows without created_at sort last (NULLs are smallest in MySQL)
+            query = query.filter(created_column.is_(None), id_column < last_id)
+        else:
+            query = query.filter(or_(
+                created_column < created_at,
+                and_(created_column == created_at, id_column < last_id),
+                created_column.is_(None)
+            ))
+    return query.order_by(created_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def page(rows: List[Any], limit: int, created_attr: str = "created_at") -> Tuple[List[Any], Optional[str]]:
+    """Split a paginate() result into the page rows and the cursor of the next page."""
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = list(rows[:limit])
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, created_attr), last.id)
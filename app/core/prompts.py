@@ -2,15 +2,16 @@
 Prompt templates management.
 Centralized prompt templates for LLM calls with version control.
 """
-from typing import Dict
+import json
+from typing import Any, Dict, List
 from datetime import datetime
 
 
 class PromptTemplates:
     """Centralized prompt template management."""
 
-    VERSION = "1.0.0"
-    LAST_UPDATED = "2026-01-29"
+    VERSION = "1.1.0"
+    LAST_UPDATED = "2026-10-19"
 
     # Step 1: Requirement Intent Analysis
     INTENT_ANALYSIS = """
@@ -99,6 +100,64 @@ JSON格式：
   "steps": ["步骤1", "步骤2", "步骤3"],
   "expected": "预期结果"
 }}
+"""
+
+    # Shared-prefix layout for multi-call generation tasks.
+    # Providers cache prompts by exact prefix, so the static instructions and the
+    # per-task context go first and only the per-item instruction goes last.
+    GENERATION_SYSTEM = """
+你是一名资深测试架构师兼测试工程师，负责基于需求和历史测试知识完成测试设计。
+同一需求的多个子任务（生成测试点、为每个测试点生成测试用例）共享下面的需求内容和历史测试知识，
+每条用户消息的最后会通过【当前任务】说明本次需要完成的具体工作。
+
+【测试点要求】
+- category: "正常" | "异常" | "边界"
+- description: 测试点描述（简洁明确，不超过50字）
+- 测试点应该是稳定的、可复用的，不包含UI细节、接口字段等易变内容
+- 优先复用历史测试知识中的测试点
+
+【测试点输出格式】
+{
+  "test_points": [
+    {"category": "正常", "description": "验证用户登录成功流程"}
+  ]
+}
+
+【测试用例要求】
+- title: 用例标题
+- precondition: 前置条件（可选）
+- steps: 测试步骤（数组），步骤要具体、可执行
+- expected: 预期结果，要明确、可验证
+- 考虑异常情况和边界条件
+
+【测试用例输出格式】
+{
+  "title": "测试用例标题",
+  "precondition": "前置条件",
+  "steps": ["步骤1", "步骤2", "步骤3"],
+  "expected": "预期结果"
+}
+"""
+
+    GENERATION_SHARED_CONTEXT = """
+【需求内容】
+{requirement_content}
+
+【历史测试知识】
+{historical_knowledge}
+"""
+
+    TEST_POINT_TASK = """
+【当前任务】
+基于以上需求和历史测试知识，生成结构化的测试点列表，按【测试点输出格式】输出JSON。
+"""
+
+    TEST_CASE_TASK = """
+【当前任务】
+为以下测试点生成详细测试用例，按【测试用例输出格式】输出JSON。
+
+【测试点】
+{test_point_description}
 """
 
     # Knowledge Extraction from Requirements
@@ -176,6 +235,32 @@ JSON格式：
             reference_cases=references or "无"
         )
 
+    @staticmethod
+    def serialize_context(context: Any) -> str:
+        """Serialize retrieval context deterministically so that shared prefixes stay byte-identical."""
+        return json.dumps(context, ensure_ascii=False, indent=2, sort_keys=True, default=str)
+
+    @classmethod
+    def get_generation_prefix(cls, requirement_content: str, historical_knowledge: str) -> List[Dict[str, str]]:
+        """Get the cacheable message prefix shared by every LLM call of one generation task."""
+        return [
+            {"role": "system", "content": cls.GENERATION_SYSTEM},
+            {"role": "user", "content": cls.GENERATION_SHARED_CONTEXT.format(
+                requirement_content=requirement_content,
+                historical_knowledge=historical_knowledge
+            )},
+        ]
+
+    @classmethod
+    def get_test_point_messages(cls, prefix: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Get messages for test point generation on top of a shared prefix."""
+        return prefix + [{"role": "user", "content": cls.TEST_POINT_TASK}]
+
+    @classmethod
+    def get_test_case_messages(cls, prefix: List[Dict[str, str]], test_point: str) -> List[Dict[str, str]]:
+        """Get messages for test case generation on top of a shared prefix."""
+        return prefix + [{"role": "user", "content": cls.TEST_CASE_TASK.format(test_point_description=test_point)}]
+
     @classmethod
     def get_knowledge_extraction_prompt(cls, text: str) -> str:
         """Get prompt for knowledge extraction."""
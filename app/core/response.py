@@ -1,4 +1,6 @@
+from decimal import Decimal
 from typing import Generic, TypeVar, Optional, Any
+import orjson
 from pydantic import BaseModel, Field
 from fastapi.responses import JSONResponse
 from fastapi import status as http_status
@@ -10,11 +12,40 @@ class ResponseModel(BaseModel, Generic[T]):
     message: str = Field("success", description="响应消息")
     data: Optional[T] = None
 
+
+def _default(value: Any) -> Any:
+    """
+    Types orjson does not serialize natively
+    (datetime, date, enum, UUID, dataclass and numpy values are handled by orjson itself)
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson, several times faster than the stdlib json
+    on large payloads. Non-string dict keys are converted to strings like json.dumps does.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+
 def Success(data: Any = None, message: str = "success", code: int = 0):
     """
     统一成功响应
     """
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=http_status.HTTP_200_OK,
         content={
             'code': code,
@@ -27,7 +58,7 @@ def Fail(message: str = "fail", code: int = 50001, status_code: int = http_statu
     """
     统一失败响应
     """
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status_code,
         content={
             'code': code,
@@ -0,0 +1,44 @@
+"""
+Upload size limit enforced before the request body is read.
+
+FastAPI parses a multipart form, spooling every file to disk, before the endpoint
+runs, so a limit checked there only stops an oversized upload after it was fully
+received. This middleware rejects multipart requests from their Content-Length
+instead (the server never delivers more body than Content-Length announces);
+multipart requests without one are refused. store_upload still checks each file.
+"""
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.response import Fail
+
+# Room for multipart boundaries, part headers and the form fields next to the files
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """Reject multipart requests larger than UPLOAD_MAX_SIZE_MB (plus form overhead)."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        max_mb = settings.upload_max_size_mb
+        if scope["type"] != "http" or not max_mb:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = headers.get("content-length", "")
+        if not content_length.isdigit():
+            response = Fail(message="Uploads must send a Content-Length header", code=40001, status_code=411)
+        elif int(content_length) > max_mb * 1024 * 1024 + MULTIPART_OVERHEAD_BYTES:
+            response = Fail(message=f"Upload exceeds the upload limit of {max_mb} MB", code=40001, status_code=413)
+        else:
+            await self.app(scope, receive, send)
+            return
+        await response(scope, receive, send)
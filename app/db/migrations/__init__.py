@@ -0,0 +1,129 @@
+"""
+Versioned schema migrations.
+
+Each module in this package named vNNN_<name>.py defines VERSION (int),
+DESCRIPTION (str) and upgrade(conn). run_migrations applies the pending ones in
+version order and records them in schema_version. MySQL commits DDL implicitly,
+so every migration must be idempotent (use the *_if_missing / *_if_changed
+helpers): a migration interrupted halfway is simply run again.
+"""
+import importlib
+import pkgutil
+from typing import List
+
+from sqlalchemy import Column, Index, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+
+from app.models import sql_models
+
+# Serializes migrations when several API/worker processes start at once (MySQL only)
+LOCK_NAME = "vx_knowledge_schema_migrations"
+LOCK_TIMEOUT_SECONDS = 300
+
+
+def load_migrations() -> List:
+    """Import all migration modules, ordered by VERSION."""
+    modules = [
+        importlib.import_module(f"{__name__}.{info.name}")
+        for info in pkgutil.iter_modules(__path__)
+        if info.name.startswith("v")
+    ]
+    modules.sort(key=lambda module: module.VERSION)
+    versions = [module.VERSION for module in modules]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions: {versions}")
+    return modules
+
+
+def applied_versions(conn: Connection) -> List[int]:
+    sql_models.SchemaVersion.__table__.create(bind=conn, checkfirst=True)
+    rows = conn.execute(text("SELECT version FROM schema_version ORDER BY version"))
+    return [row[0] for row in rows]
+
+
+def run_migrations(engine: Engine, target: int = None) -> List[int]:
+    """Apply pending migrations up to target (default: all). Returns the versions applied."""
+    applied = []
+    with engine.connect() as conn:
+        locked = _acquire_lock(conn)
+        try:
+            done = set(applied_versions(conn))
+            conn.commit()
+            for module in load_migrations():
+                if module.VERSION in done or (target is not None and module.VERSION > target):
+                    continue
+                print(f"Applying migration {module.VERSION:03d}: {module.DESCRIPTION}")
+                module.upgrade(conn)
+                conn.execute(
+                    sql_models.SchemaVersion.__table__.insert().values(
+                        version=module.VERSION, description=module.DESCRIPTION
+                    )
+                )
+                conn.commit()
+                applied.append(module.VERSION)
+        finally:
+            if locked:
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+                conn.commit()
+    return applied
+
+
+def _acquire_lock(conn: Connection) -> bool:
+    if conn.dialect.name != "mysql":
+        return False
+    acquired = conn.execute(
+        text("SELECT GET_LOCK(:name, :timeout)"), {"name": LOCK_NAME, "timeout": LOCK_TIMEOUT_SECONDS}
+    ).scalar()
+    if acquired != 1:
+        raise RuntimeError("Timed out waiting for another process to finish schema migrations")
+    return True
+
+
+# ---------- Helpers for migration modules ----------
+
+def add_column_if_missing(conn: Connection, column: Column) -> bool:
+    """Add a model column to its table unless it already exists."""
+    table = column.table.name
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column.name in existing:
+        return False
+    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {ddl}"))
+    return True
+
+
+def alter_enum_if_changed(conn: Connection, column: Column) -> bool:
+    """
+    Bring a native ENUM column's value list in line with the model (MySQL only:
+    other dialects store enums as plain strings). create_all and add_column_if_missing
+    never touch an existing column, so values added to a Python enum need this.
+    """
+    if conn.dialect.name != "mysql":
+        return False
+    table = column.table.name
+    existing = {c["name"]: c["type"] for c in inspect(conn).get_columns(table)}
+    current = getattr(existing.get(column.name), "enums", None)
+    if current is None or list(current) == list(column.type.enums):
+        return False
+    # MODIFY replaces the whole definition, so restate it from the model (NULL, COMMENT)
+    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table} MODIFY COLUMN {ddl}"))
+    return True
+
+
+def create_index_if_missing(conn: Connection, index: Index) -> bool:
+    """Create a model index unless an index with the same name exists."""
+    existing = {i["name"] for i in inspect(conn).get_indexes(index.table.name)}
+    if index.name in existing:
+        return False
+    index.create(bind=conn)
+    return True
+
+
+def model_index(model, name: str) -> Index:
+    """Look up an index declared on a model by name."""
+    for index in model.__table__.indexes:
+        if index.name == name:
+            return index
+    raise KeyError(f"{model.__tablename__} has no index {name}")
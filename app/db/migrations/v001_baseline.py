@@ -0,0 +1,9 @@
+"""Create every table of sql_models that does not exist yet."""
+from app.models import sql_models
+
+VERSION = 1
+DESCRIPTION = "Baseline: create missing tables"
+
+
+def upgrade(conn):
+    sql_models.Base.metadata.create_all(bind=conn, checkfirst=True)
@@ -0,0 +1,17 @@
+"""
+Columns added to generation_task after its first release: token usage,
+cancellation, deadline and de-duplication. create_all never alters existing tables.
+"""
+from app.db.migrations import add_column_if_missing, create_index_if_missing, model_index
+from app.models import sql_models
+
+VERSION = 2
+DESCRIPTION = "Add token usage, cancellation, deadline and dedup columns to generation_task"
+
+
+def upgrade(conn):
+    table = sql_models.GenerationTask.__table__
+    for name in ("prompt_tokens", "completion_tokens", "cached_tokens",
+                 "cancel_requested", "deadline_at", "dedup_key"):
+        add_column_if_missing(conn, table.c[name])
+    create_index_if_missing(conn, model_index(sql_models.GenerationTask, "ix_generation_task_dedup_key"))
@@ -0,0 +1,34 @@
+"""
+Secondary indexes for the hot filters and joins:
+overview/generation/knowledge statistics, knowledge feedback of confirmed cases,
+task status and the list endpoints.
+"""
+from app.db.migrations import create_index_if_missing, model_index
+from app.models import sql_models
+
+VERSION = 3
+DESCRIPTION = "Add secondary and composite indexes on hot filter and join columns"
+
+INDEXES = [
+    (sql_models.RequirementRaw, "ix_requirement_raw_created"),
+    (sql_models.TestPoint, "ix_test_point_source_type"),
+    (sql_models.TestPoint, "ix_test_point_type_confidence"),
+    (sql_models.TestCase, "ix_test_case_status_test_point"),
+    (sql_models.TestCase, "ix_test_case_created_by_status"),
+    (sql_models.TestCase, "ix_test_case_related_req_created"),
+    (sql_models.TestCase, "ix_test_case_test_point"),
+    (sql_models.TestCase, "ix_test_case_created"),
+    (sql_models.Defect, "ix_defect_related_req_severity"),
+    (sql_models.Defect, "ix_defect_severity"),
+    (sql_models.GenerationTask, "ix_generation_task_raw_req_created"),
+    (sql_models.GenerationTask, "ix_generation_task_created_status"),
+    (sql_models.GenerationResult, "ix_generation_result_task"),
+    (sql_models.LLMCallLog, "ix_llm_call_log_created"),
+    (sql_models.LLMCallLog, "ix_llm_call_log_task"),
+]
+
+
+def upgrade(conn):
+    for model, name in INDEXES:
+        if create_index_if_missing(conn, model_index(model, name)):
+            print(f"  created {name}")
@@ -0,0 +1,19 @@
+"""(created_at, id) indexes backing keyset pagination of the list endpoints (app/core/pagination.py)."""
+from app.db.migrations import create_index_if_missing, model_index
+from app.models import sql_models
+
+VERSION = 4
+DESCRIPTION = "Add (created_at, id) indexes for keyset pagination"
+
+INDEXES = [
+    (sql_models.TestPoint, "ix_test_point_created"),
+    (sql_models.Defect, "ix_defect_created"),
+    (sql_models.GenerationTask, "ix_generation_task_created"),
+    (sql_models.Requirement, "ix_requirements_create_time"),
+]
+
+
+def upgrade(conn):
+    for model, name in INDEXES:
+        if create_index_if_missing(conn, model_index(model, name)):
+            print(f"  created {name}")
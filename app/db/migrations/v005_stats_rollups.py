@@ -0,0 +1,12 @@
+"""Statistics rollup tables (app/models/rollups.py), seeded from the existing rows."""
+from app.models import rollups, sql_models
+
+VERSION = 5
+DESCRIPTION = "Add statistics rollup tables and seed them from the base tables"
+
+
+def upgrade(conn):
+    for model in (sql_models.StatsCounter, sql_models.StatsDailyGeneration):
+        model.__table__.create(bind=conn, checkfirst=True)
+    deltas = rollups.rebuild(conn)
+    print(f"  seeded {len(deltas.counters)} counters and {len(deltas.days)} daily generation buckets")
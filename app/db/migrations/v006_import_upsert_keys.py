@@ -0,0 +1,18 @@
+"""
+Natural keys and content hashes for idempotent imports (DataImportService upsert mode):
+external_key on requirement_raw and test_case (defect already has defect_id).
+"""
+from app.db.migrations import add_column_if_missing, create_index_if_missing, model_index
+from app.models import sql_models
+
+VERSION = 6
+DESCRIPTION = "Add external_key and content_hash columns for upsert imports"
+
+
+def upgrade(conn):
+    for model in (sql_models.RequirementRaw, sql_models.TestCase):
+        add_column_if_missing(conn, model.__table__.c.external_key)
+        add_column_if_missing(conn, model.__table__.c.content_hash)
+    add_column_if_missing(conn, sql_models.Defect.__table__.c.content_hash)
+    create_index_if_missing(conn, model_index(sql_models.RequirementRaw, "ux_requirement_raw_external_key"))
+    create_index_if_missing(conn, model_index(sql_models.TestCase, "ux_test_case_external_key"))
@@ -0,0 +1,10 @@
+"""Tables of the batch knowledge extraction pipeline (app/services/batch_extraction_service.py)."""
+from app.models import sql_models
+
+VERSION = 7
+DESCRIPTION = "Add extraction_batch and extraction_batch_item tables"
+
+
+def upgrade(conn):
+    for model in (sql_models.ExtractionBatch, sql_models.ExtractionBatchItem):
+        model.__table__.create(bind=conn, checkfirst=True)
@@ -0,0 +1,9 @@
+"""Transactional outbox drained by the relay into Milvus and Neo4j (app/services/outbox.py)."""
+from app.models import sql_models
+
+VERSION = 8
+DESCRIPTION = "Add outbox_event table"
+
+
+def upgrade(conn):
+    sql_models.OutboxEvent.__table__.create(bind=conn, checkfirst=True)
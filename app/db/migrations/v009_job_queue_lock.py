@@ -0,0 +1,9 @@
+"""Per-queue lock rows that make the job queue concurrency cap atomic (JobQueue.claim)."""
+from app.models import sql_models
+
+VERSION = 9
+DESCRIPTION = "Add job_queue_lock table"
+
+
+def upgrade(conn):
+    sql_models.JobQueueLock.__table__.create(bind=conn, checkfirst=True)
@@ -0,0 +1,10 @@
+"""Structured document chunks stored with uploaded requirements (DocumentParser.parse_chunks)."""
+from app.db.migrations import add_column_if_missing
+from app.models import sql_models
+
+VERSION = 10
+DESCRIPTION = "Add chunks column to requirement_raw"
+
+
+def upgrade(conn):
+    add_column_if_missing(conn, sql_models.RequirementRaw.__table__.c.chunks)
@@ -0,0 +1,18 @@
+"""
+CANCELLED and TIMED_OUT were added to StatusEnum after these tables were first
+created, and MySQL rejects values missing from a native ENUM ("Data truncated").
+generation_task.status is written with them by cancellation and deadlines; the
+other pre-existing StatusEnum columns are widened too so the schema matches the
+model. Tables created later (extraction_batch, outbox_event, ...) already have them.
+"""
+from app.db.migrations import alter_enum_if_changed
+from app.models import sql_models
+
+VERSION = 11
+DESCRIPTION = "Add CANCELLED and TIMED_OUT to StatusEnum columns"
+
+
+def upgrade(conn):
+    for model in (sql_models.GenerationTask, sql_models.Requirement,
+                  sql_models.KnowledgeBase, sql_models.Task):
+        alter_enum_if_changed(conn, model.__table__.c.status)
@@ -1,9 +1,13 @@
+import threading
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.api import requirements, knowledge, graph, testcases, tasks, testpoints, data_import
-from app.models.sql_models import init_db
+from app.api import requirements, knowledge, graph, testcases, tasks, testpoints, data_import, defects, statistics
+from app.models.sql_models import init_db, async_engine
 from app.core.config import settings
 from app.core.dependencies import cleanup_services
+from app.core.response import ORJSONResponse
+from app.core.upload_limit import UploadSizeLimitMiddleware
+from app.services.parse_pool import shutdown_parse_pool
 
 
 @asynccontextmanager
@@ -11,11 +15,29 @@ async def lifespan(app: FastAPI):
     # Startup
     print("Application startup: Initializing database...")
     init_db()
+    worker = None
+    relay = None
+    if settings.embedded_worker:
+        # Development convenience; production runs scripts/worker.py separately
+        import app.services.jobs  # noqa: F401
+        from app.services.job_queue import Worker
+        worker = Worker({name: limit for name, limit in settings.queue_concurrency.items()})
+        threading.Thread(target=worker.run, daemon=True).start()
+        if settings.outbox_relay_enabled:
+            from app.services.outbox import OutboxRelay
+            relay = OutboxRelay()
+            threading.Thread(target=relay.run, daemon=True).start()
     print("Application startup: Services are ready.")
     yield
     # Shutdown
     print("Application shutdown: Cleaning up services...")
+    if worker is not None:
+        worker.stop()
+    if relay is not None:
+        relay.stop()
     cleanup_services()
+    shutdown_parse_pool()
+    await async_engine.dispose()
     print("Application shutdown: Complete.")
 
 
@@ -23,8 +45,10 @@ app = FastAPI(
     title=settings.project_name,
     version=settings.project_version,
     description=settings.project_description,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
+app.add_middleware(UploadSizeLimitMiddleware)
 
 app.include_router(requirements.router, prefix="/api/requirements", tags=["Requirements"])
 app.include_router(knowledge.router, prefix="/api/knowledge", tags=["Knowledge"])
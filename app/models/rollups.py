@@ -0,0 +1,299 @@
+"""
+Incrementally maintained statistics rollups.
+
+stats_counter holds totals, counts by status/creator/type and confidence sums;
+stats_daily_generation holds generation tasks per creation day and status.
+Session events add the deltas of every flush that creates, changes or deletes a
+tracked row inside the same transaction, so the rollups commit and roll back
+together with the data. Core bulk inserts and updates bypass the ORM events and
+call record_inserted() / record_changed() instead.
+
+Each flush writes to one random shard, so concurrent writers seldom wait on the
+same counter row; readers sum the shards. rebuild() recomputes everything from
+the base tables to repair drift (scripts/rebuild_stats.py).
+"""
+import random
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from app.models import sql_models
+
+COUNTER_SHARDS = 8
+# confidence is DECIMAL(3, 2); sums are kept as integers in hundredths
+CONFIDENCE_SCALE = 100
+
+# table -> attributes counted per value
+GROUPED_ATTRIBUTES = {
+    "requirement_raw": (),
+    "test_point": ("type",),
+    "test_case": ("status", "created_by"),
+    "defect": (),
+}
+TRACKED_MODELS = {
+    "requirement_raw": sql_models.RequirementRaw,
+    "test_point": sql_models.TestPoint,
+    "test_case": sql_models.TestCase,
+    "defect": sql_models.Defect,
+}
+TASK_TABLE = "generation_task"
+
+_PENDING_KEY = "stats_rollup_pending"
+
+
+def counter_name(table: str, attribute: Optional[str] = None, value: Any = None) -> str:
+    if attribute is None:
+        return f"{table}.total"
+    return f"{table}.{attribute}.{_plain(value)}"
+
+
+def _plain(value: Any) -> Any:
+    return getattr(value, "value", value)
+
+
+def _scaled(confidence: Any) -> int:
+    return int(round(float(confidence) * CONFIDENCE_SCALE))
+
+
+def _day(created_at: Any) -> Optional[date]:
+    if created_at is None:
+        return None
+    if isinstance(created_at, datetime):
+        return created_at.date()
+    if isinstance(created_at, date):
+        return created_at
+    return date.fromisoformat(str(created_at)[:10])
+
+
+class Deltas:
+    """Counter and daily-bucket increments collected for one flush."""
+
+    def __init__(self):
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.days: Dict[Tuple[date, str], int] = defaultdict(int)
+
+    def add_row(self, table: str, values: Dict[str, Any], sign: int):
+        if table == TASK_TABLE:
+            self.add_task(values.get("created_at"), values.get("status"), sign)
+            return
+        self.counters[counter_name(table)] += sign
+        for attribute in GROUPED_ATTRIBUTES[table]:
+            if values.get(attribute) is not None:
+                self.counters[counter_name(table, attribute, values[attribute])] += sign
+        if table == "test_point" and values.get("confidence") is not None:
+            self.counters["test_point.confidence_sum"] += sign * _scaled(values["confidence"])
+            self.counters["test_point.confidence_count"] += sign
+
+    def add_task(self, created_at: Any, status: Any, sign: int):
+        day = _day(created_at)
+        if day is not None and status is not None:
+            self.days[(day, _plain(status))] += sign
+
+    def apply(self, connection):
+        """Write the non-zero increments to one random shard, in key order to avoid deadlocks."""
+        shard = random.randrange(COUNTER_SHARDS)
+        counter_rows = [
+            {"name": name, "shard": shard, "value": value}
+            for name, value in sorted(self.counters.items()) if value
+        ]
+        day_rows = [
+            {"day": day, "status": status, "shard": shard, "count": value}
+            for (day, status), value in sorted(self.days.items()) if value
+        ]
+        if counter_rows:
+            _upsert_add(connection, sql_models.StatsCounter.__table__, ["name", "shard"], "value", counter_rows)
+        if day_rows:
+            _upsert_add(connection, sql_models.StatsDailyGeneration.__table__, ["day", "status", "shard"], "count", day_rows)
+
+
+def _upsert_add(connection, table, keys: List[str], value_column: str, rows: List[Dict[str, Any]]):
+    """INSERT rows, adding value_column onto existing rows with the same key."""
+    if connection.dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_duplicate_key_update({value_column: table.c[value_column] + stmt.inserted[value_column]})
+    else:
+        if connection.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={value_column: table.c[value_column] + stmt.excluded[value_column]}
+        )
+    connection.execute(stmt, rows)
+
+
+def _table_of(obj) -> Optional[str]:
+    table = getattr(obj, "__tablename__", None)
+    return table if table in GROUPED_ATTRIBUTES or table == TASK_TABLE else None
+
+
+def _tracked_attributes(table: str) -> Tuple[str, ...]:
+    if table == TASK_TABLE:
+        return ("status", "created_at")
+    if table == "test_point":
+        return GROUPED_ATTRIBUTES[table] + ("confidence",)
+    return GROUPED_ATTRIBUTES[table]
+
+
+def _current_values(obj, table: str) -> Dict[str, Any]:
+    return {attribute: getattr(obj, attribute) for attribute in _tracked_attributes(table)}
+
+
+def _change_deltas(obj, table: str, deltas: Deltas):
+    """Move a modified row from its old buckets to its new ones."""
+    state = inspect(obj)
+    old, new, changed = {}, {}, False
+    for attribute in _tracked_attributes(table):
+        history = state.attrs[attribute].load_history()
+        if history.has_changes():
+            changed = True
+            old[attribute] = history.deleted[0] if history.deleted else None
+            new[attribute] = history.added[0] if history.added else None
+        else:
+            value = history.unchanged[0] if history.unchanged else None
+            old[attribute] = new[attribute] = value
+    if not changed:
+        return
+    deltas.add_row(table, old, -1)
+    deltas.add_row(table, new, 1)
+
+
+def _track_history(model, attribute: str):
+    # Load the old value when an expired attribute is set, so its bucket can be decremented
+    event.listen(getattr(model, attribute), "set", lambda target, value, oldvalue, initiator: value,
+                 active_history=True, retval=True)
+
+
+for _table, _model in list(TRACKED_MODELS.items()) + [(TASK_TABLE, sql_models.GenerationTask)]:
+    for _attribute in _tracked_attributes(_table):
+        _track_history(_model, _attribute)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_changes(session: Session, flush_context, instances):
+    # Old values of changed and deleted rows can still be loaded here
+    deltas = session.info.setdefault(_PENDING_KEY, Deltas())
+    for obj in session.deleted:
+        table = _table_of(obj)
+        if table:
+            deltas.add_row(table, _current_values(obj, table), -1)
+    for obj in session.dirty:
+        table = _table_of(obj)
+        if table and obj not in session.deleted:
+            _change_deltas(obj, table, deltas)
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_changes(session: Session, flush_context):
+    # New rows are counted after the INSERT so column defaults are filled in
+    deltas = session.info.pop(_PENDING_KEY, None) or Deltas()
+    for obj in session.new:
+        table = _table_of(obj)
+        if table:
+            deltas.add_row(table, inspect(obj).dict, 1)
+    if deltas.counters or deltas.days:
+        deltas.apply(session.connection())
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changes(session: Session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def record_inserted(db: Session, model, rows: Iterable[Dict[str, Any]]):
+    """Count rows written with a Core bulk INSERT, in the caller's transaction."""
+    deltas = Deltas()
+    for row in rows:
+        deltas.add_row(model.__tablename__, row, 1)
+    deltas.apply(db.connection())
+
+
+def record_changed(db: Session, model, changes: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]]):
+    """Move rows changed with a Core bulk UPDATE from their (old, new) buckets, in the caller's transaction."""
+    deltas = Deltas()
+    for old, new in changes:
+        deltas.add_row(model.__tablename__, old, -1)
+        deltas.add_row(model.__tablename__, new, 1)
+    deltas.apply(db.connection())
+
+
+# ---------- Reads ----------
+
+def read_counters(db, names: Optional[Iterable[str]] = None, prefix: Optional[str] = None) -> Dict[str, int]:
+    """Sum the shards of the given counters (or all counters starting with prefix)."""
+    counter = sql_models.StatsCounter
+    query = select(counter.name, func.sum(counter.value)).group_by(counter.name)
+    if names is not None:
+        query = query.where(counter.name.in_(list(names)))
+    if prefix is not None:
+        query = query.where(counter.name.startswith(prefix))
+    return {name: int(value or 0) for name, value in db.execute(query)}
+
+
+def read_daily_generation(db, since: date) -> Dict[str, int]:
+    """Generation tasks created on or after since, by status."""
+    daily = sql_models.StatsDailyGeneration
+    rows = db.execute(
+        select(daily.status, func.sum(daily.count)).where(daily.day >= since).group_by(daily.status)
+    )
+    return {status: int(count or 0) for status, count in rows}
+
+
+def read_stored(connection) -> Deltas:
+    """All stored rollup values with the shards summed, comparable to compute_deltas()."""
+    stored = Deltas()
+    stored.counters.update(read_counters(connection))
+    daily = sql_models.StatsDailyGeneration
+    for day, status, count in connection.execute(
+        select(daily.day, daily.status, func.sum(daily.count)).group_by(daily.day, daily.status)
+    ):
+        stored.add_task(day, status, int(count or 0))
+    return stored
+
+
+# ---------- Rebuild ----------
+
+def compute_deltas(connection) -> Deltas:
+    """Recompute all rollups from the base tables."""
+    deltas = Deltas()
+    for table, model in TRACKED_MODELS.items():
+        deltas.counters[counter_name(table)] = connection.execute(
+            select(func.count()).select_from(model)
+        ).scalar()
+        for attribute in GROUPED_ATTRIBUTES[table]:
+            column = getattr(model, attribute)
+            for value, count in connection.execute(select(column, func.count()).group_by(column)):
+                if value is not None:
+                    deltas.counters[counter_name(table, attribute, value)] = count
+
+    total, count = connection.execute(
+        select(func.sum(sql_models.TestPoint.confidence), func.count(sql_models.TestPoint.confidence))
+    ).one()
+    deltas.counters["test_point.confidence_sum"] = _scaled(total or 0)
+    deltas.counters["test_point.confidence_count"] = count
+
+    task = sql_models.GenerationTask
+    day = func.date(task.created_at)
+    for created_day, status, count in connection.execute(
+        select(day, task.status, func.count()).where(task.created_at.isnot(None)).group_by(day, task.status)
+    ):
+        deltas.add_task(created_day, status, count)
+    return deltas
+
+
+def rebuild(connection):
+    """
+    Replace the rollups with values recomputed from the base tables.
+    Run it when writes are quiet: increments committed while it runs may be lost.
+    """
+    deltas = compute_deltas(connection)
+    connection.execute(delete(sql_models.StatsCounter))
+    connection.execute(delete(sql_models.StatsDailyGeneration))
+    deltas.apply(connection)
+    return deltas
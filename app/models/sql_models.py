@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Text, DECIMAL, Boolean, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Text, DECIMAL, Boolean, Date, DateTime, ForeignKey, Index, UniqueConstraint, Enum as SQLEnum
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -6,9 +8,43 @@ import enum
 
 from app.core.config import settings
 
-engine = create_engine(settings.sqlalchemy_database_uri)
+# Async driver used for each backend when ASYNC_DATABASE_URI is not set
+ASYNC_DRIVERS = {
+    "mysql": "mysql+asyncmy",
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def engine_options(uri) -> dict:
+    """Connection pool options for an engine; SQLite keeps SQLAlchemy's defaults."""
+    if make_url(uri).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+def async_database_uri():
+    """URL of the async engine: ASYNC_DATABASE_URI, or the sync URL with its async driver."""
+    if settings.async_database_uri:
+        return make_url(settings.async_database_uri)
+    url = make_url(settings.sqlalchemy_database_uri)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+engine = create_engine(settings.sqlalchemy_database_uri, **engine_options(settings.sqlalchemy_database_uri))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for read endpoints that run on the event loop
+async_url = async_database_uri()
+async_engine = create_async_engine(async_url, **engine_options(async_url))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 class StatusEnum(str, enum.Enum):
@@ -19,6 +55,14 @@ class StatusEnum(str, enum.Enum):
     COMPLETED = "completed"
     DONE = "DONE"
     FAILED = "failed"
+    CANCELLED = "CANCELLED"
+    TIMED_OUT = "TIMED_OUT"
+
+class JobStatusEnum(str, enum.Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
 
 class TestCaseStatusEnum(str, enum.Enum):
     DRAFT = "draft"
@@ -39,12 +83,19 @@ class CreatorEnum(str, enum.Enum):
 class RequirementRaw(Base):
     """存储用户原始需求，完整保留原始信息"""
     __tablename__ = "requirement_raw"
+    __table_args__ = (
+        Index("ix_requirement_raw_created", "created_at", "id"),
+        Index("ux_requirement_raw_external_key", "external_key", unique=True),
+    )
 
     id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
     title = Column(String(255), nullable=False, comment="需求标题")
     full_content = Column(Text, nullable=False, comment="完整需求内容")
+    chunks = Column(Text(length=2**32 - 1), comment="解析器按标题/表格/页码切分的文档块（JSON），供知识抽取使用")
     source_type = Column(String(50), comment="来源类型：text/pdf/docx/excel/image")
     source_file = Column(String(255), comment="原始文件名")
+    external_key = Column(String(100), comment="外部系统ID，增量导入的自然键")
+    content_hash = Column(String(64), comment="导入内容哈希，用于跳过未变更的行")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -71,6 +122,11 @@ class RequirementStd(Base):
 class TestPoint(Base):
     """存储抽象后的测试知识单元"""
     __tablename__ = "test_point"
+    __table_args__ = (
+        Index("ix_test_point_source_type", "source", "type"),
+        Index("ix_test_point_type_confidence", "type", "confidence"),
+        Index("ix_test_point_created", "created_at", "id"),
+    )
 
     id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
     content = Column(String(500), nullable=False, comment="测试点内容")
@@ -90,6 +146,15 @@ class TestPoint(Base):
 class TestCase(Base):
     """存储测试用例数据"""
     __tablename__ = "test_case"
+    __table_args__ = (
+        # Confirmed cases not yet fed back: status = confirmed AND test_point_id IS NULL
+        Index("ix_test_case_status_test_point", "status", "test_point_id"),
+        Index("ix_test_case_created_by_status", "created_by", "status"),
+        Index("ix_test_case_related_req_created", "related_req_id", "created_at", "id"),
+        Index("ix_test_case_test_point", "test_point_id"),
+        Index("ix_test_case_created", "created_at", "id"),
+        Index("ux_test_case_external_key", "external_key", unique=True),
+    )
 
     id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
     title = Column(String(255), nullable=False, comment="用例标题")
@@ -100,6 +165,8 @@ class TestCase(Base):
     test_point_id = Column(BigInteger, ForeignKey("test_point.id"), comment="关联测试点ID")
     status = Column(SQLEnum(TestCaseStatusEnum), default=TestCaseStatusEnum.DRAFT, comment="状态")
     created_by = Column(SQLEnum(CreatorEnum), comment="创建者：ai/manual")
+    external_key = Column(String(100), comment="外部系统ID，增量导入的自然键")
+    content_hash = Column(String(64), comment="导入内容哈希，用于跳过未变更的行")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -112,6 +179,11 @@ class TestCase(Base):
 class Defect(Base):
     """存储缺陷信息"""
     __tablename__ = "defect"
+    __table_args__ = (
+        Index("ix_defect_related_req_severity", "related_req_id", "severity"),
+        Index("ix_defect_severity", "severity"),
+        Index("ix_defect_created", "created_at", "id"),
+    )
 
     id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
     defect_id = Column(String(100), unique=True, comment="缺陷系统ID")
@@ -121,6 +193,7 @@ class Defect(Base):
     related_req_id = Column(BigInteger, comment="关联需求ID")
     severity = Column(String(20), comment="严重程度")
     status = Column(String(20), comment="状态")
+    content_hash = Column(String(64), comment="导入内容哈希，用于跳过未变更的行")
     created_at = Column(DateTime, default=datetime.utcnow)
 
 # ========== Generation Task Tables ==========
@@ -128,22 +201,37 @@ class Defect(Base):
 class GenerationTask(Base):
     """记录测试用例生成任务的执行状态"""
     __tablename__ = "generation_task"
+    __table_args__ = (
+        Index("ix_generation_task_raw_req_created", "raw_req_id", "created_at"),
+        Index("ix_generation_task_created_status", "created_at", "status"),
+        Index("ix_generation_task_created", "created_at", "id"),
+    )
 
     id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
     raw_req_id = Column(BigInteger, ForeignKey("requirement_raw.id"), comment="关联原始需求ID")
     status = Column(SQLEnum(StatusEnum), default=StatusEnum.INIT, comment="任务状态")
     progress = Column(Integer, default=0, comment="进度百分比")
     error_message = Column(Text, comment="错误信息")
+    prompt_tokens = Column(Integer, default=0, comment="累计输入Token数")
+    completion_tokens = Column(Integer, default=0, comment="累计输出Token数")
+    cached_tokens = Column(Integer, default=0, comment="累计命中提示词缓存的Token数")
+    cancel_requested = Column(Boolean, default=False, comment="是否已请求取消")
+    deadline_at = Column(DateTime, comment="截止时间，超时后保留已生成结果并结束任务")
+    dedup_key = Column(String(64), index=True, comment="去重键：需求ID+内容哈希+生成选项")
     created_at = Column(DateTime, default=datetime.utcnow)
     finished_at = Column(DateTime, comment="完成时间")
 
     # Relationships
     requirement_raw = relationship("RequirementRaw")
     generation_results = relationship("GenerationResult", back_populates="task")
+    steps = relationship("GenerationStep", back_populates="task", cascade="all, delete-orphan")
 
 class GenerationResult(Base):
     """存储生成结果及人工确认状态"""
     __tablename__ = "generation_result"
+    __table_args__ = (
+        Index("ix_generation_result_task", "task_id", "approved"),
+    )
 
     id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
     task_id = Column(BigInteger, ForeignKey("generation_task.id"), nullable=False, comment="关联任务ID")
@@ -156,11 +244,163 @@ class GenerationResult(Base):
     task = relationship("GenerationTask", back_populates="generation_results")
     test_point = relationship("TestPoint", back_populates="generation_results")
 
+class GenerationStep(Base):
+    """记录批量生成任务中已完成的步骤（检查点），用于断点续跑"""
+    __tablename__ = "generation_step"
+    __table_args__ = (
+        UniqueConstraint("task_id", "step_key", name="uq_generation_step_task_step"),
+    )
+
+    id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
+    task_id = Column(BigInteger, ForeignKey("generation_task.id"), nullable=False, comment="关联任务ID")
+    step_key = Column(String(100), nullable=False, comment="步骤标识：context/test_points/case:<序号>")
+    output = Column(Text, comment="步骤产出（JSON）")
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    task = relationship("GenerationTask", back_populates="steps")
+
+# ========== Job Queue Tables ==========
+
+class Job(Base):
+    """持久化任务队列，由独立 worker 进程按队列并发上限领取执行"""
+    __tablename__ = "job_queue"
+    __table_args__ = (
+        Index("ix_job_queue_claim", "queue", "status", "visible_at"),
+    )
+
+    id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
+    queue = Column(String(50), nullable=False, comment="队列名称：generation/extraction")
+    job_type = Column(String(50), nullable=False, comment="任务类型，对应 worker 中注册的处理函数")
+    payload = Column(Text, comment="任务参数（JSON）")
+    status = Column(SQLEnum(JobStatusEnum), default=JobStatusEnum.QUEUED, nullable=False, comment="任务状态")
+    attempts = Column(Integer, default=0, comment="已执行次数")
+    max_attempts = Column(Integer, default=3, comment="最大执行次数")
+    task_id = Column(BigInteger, comment="关联生成任务ID")
+    visible_at = Column(DateTime, default=datetime.utcnow, comment="可被领取的时间；运行中时为租约到期时间")
+    locked_by = Column(String(100), comment="当前持有租约的 worker")
+    last_error = Column(Text, comment="最近一次错误信息")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, comment="最近一次开始执行时间")
+    finished_at = Column(DateTime, comment="完成时间")
+
+class JobQueueLock(Base):
+    """每个队列一行；领取任务时 FOR UPDATE 锁定，使并发上限检查与领取在所有 worker 间原子执行"""
+    __tablename__ = "job_queue_lock"
+
+    queue = Column(String(50), primary_key=True, comment="队列名称")
+
+# ========== Extraction Batch Tables ==========
+
+class ExtractionBatch(Base):
+    """批量知识抽取任务，由 worker 按流水线执行，进度按明细状态统计"""
+    __tablename__ = "extraction_batch"
+
+    id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
+    status = Column(SQLEnum(StatusEnum), default=StatusEnum.INIT, comment="任务状态")
+    total = Column(Integer, default=0, comment="需求总数")
+    error_message = Column(Text, comment="错误信息")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, comment="开始执行时间")
+    finished_at = Column(DateTime, comment="完成时间")
+
+class ExtractionBatchItem(Base):
+    """批量知识抽取中每个需求的处理结果"""
+    __tablename__ = "extraction_batch_item"
+    __table_args__ = (
+        # Progress counts and the pending/failed pages of one batch
+        Index("ix_extraction_batch_item_batch_status", "batch_id", "status", "id"),
+    )
+
+    id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
+    batch_id = Column(BigInteger, ForeignKey("extraction_batch.id"), nullable=False, comment="批量抽取任务ID")
+    requirement_id = Column(BigInteger, nullable=False, comment="需求ID（requirement_raw）")
+    status = Column(SQLEnum(StatusEnum), default=StatusEnum.PENDING, comment="状态：pending/DONE/failed")
+    nodes = Column(Integer, comment="写入的知识节点数")
+    error_message = Column(Text, comment="失败原因")
+    finished_at = Column(DateTime, comment="处理完成时间")
+
+# ========== Outbox Tables ==========
+
+class OutboxEvent(Base):
+    """事务性发件箱：与业务变更在同一事务中写入，由 relay 异步批量同步到 Milvus 和 Neo4j"""
+    __tablename__ = "outbox_event"
+    __table_args__ = (
+        Index("ix_outbox_event_status_id", "status", "id"),
+    )
+
+    id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
+    event_type = Column(String(50), nullable=False, comment="事件类型")
+    aggregate_type = Column(String(50), nullable=False, comment="实体类型，同一实体的事件按顺序投递")
+    aggregate_id = Column(String(100), nullable=False, comment="实体ID")
+    payload = Column(Text, nullable=False, comment="事件内容（JSON）")
+    status = Column(SQLEnum(StatusEnum), default=StatusEnum.PENDING, nullable=False, comment="状态：pending/DONE/failed")
+    attempts = Column(Integer, default=0, comment="已投递次数")
+    next_attempt_at = Column(DateTime, comment="下次重试时间")
+    last_error = Column(Text, comment="最近一次错误信息")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, comment="投递成功时间")
+
+# ========== LLM Accounting Tables ==========
+
+class LLMCallLog(Base):
+    """记录每次LLM/Embedding调用的Token用量与耗时"""
+    __tablename__ = "llm_call_log"
+    __table_args__ = (
+        Index("ix_llm_call_log_created", "created_at"),
+        Index("ix_llm_call_log_task", "task_id"),
+    )
+
+    id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
+    call_site = Column(String(50), nullable=False, comment="调用点：intent/plan/test_points/test_case/extraction/embedding.*")
+    kind = Column(String(20), nullable=False, comment="调用类型：chat/embedding")
+    model = Column(String(100), comment="模型名称")
+    prompt_tokens = Column(Integer, default=0, comment="输入Token数")
+    completion_tokens = Column(Integer, default=0, comment="输出Token数")
+    cached_tokens = Column(Integer, default=0, comment="命中提示词缓存的Token数")
+    latency_ms = Column(Integer, default=0, comment="调用耗时（毫秒）")
+    success = Column(Boolean, default=True, comment="是否调用成功")
+    task_id = Column(BigInteger, comment="关联生成任务ID")
+    requirement_id = Column(BigInteger, comment="关联需求ID")
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# ========== Statistics Rollup Tables ==========
+
+class StatsCounter(Base):
+    """统计计数器，随业务数据写入在同一事务内增量维护（app/models/rollups.py）；按分片累加以分散热点行锁，读取时求和"""
+    __tablename__ = "stats_counter"
+
+    name = Column(String(100), primary_key=True, comment="计数项，如 test_case.total、test_case.status.confirmed")
+    shard = Column(Integer, primary_key=True, autoincrement=False, default=0, comment="分片号")
+    value = Column(BigInteger, nullable=False, default=0, comment="计数值")
+
+class StatsDailyGeneration(Base):
+    """按创建日期和状态汇总的生成任务数，增量维护方式同 stats_counter"""
+    __tablename__ = "stats_daily_generation"
+
+    day = Column(Date, primary_key=True, comment="任务创建日期（UTC）")
+    status = Column(String(20), primary_key=True, comment="任务状态")
+    shard = Column(Integer, primary_key=True, autoincrement=False, default=0, comment="分片号")
+    count = Column(BigInteger, nullable=False, default=0, comment="任务数")
+
+# ========== Schema Tables ==========
+
+class SchemaVersion(Base):
+    """记录已执行的数据库迁移版本（app/db/migrations）"""
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True, autoincrement=False, comment="迁移版本号")
+    description = Column(String(255), comment="迁移说明")
+    applied_at = Column(DateTime, default=datetime.utcnow, comment="执行时间")
+
 # ========== Legacy Tables (for backward compatibility) ==========
 
 class Requirement(Base):
     """Legacy requirement table for backward compatibility"""
     __tablename__ = "requirements"
+    __table_args__ = (
+        Index("ix_requirements_create_time", "create_time", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
@@ -198,7 +438,9 @@ class Task(Base):
     knowledge_base = relationship("KnowledgeBase", back_populates="tasks")
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    """Bring the schema up to date: creates missing tables, then applies pending migrations."""
+    from app.db.migrations import run_migrations
+    run_migrations(engine)
 
 def get_db():
     db = SessionLocal()
@@ -206,3 +448,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Registers the session events that keep the statistics rollup tables up to date
+from app.models import rollups  # noqa: E402,F401
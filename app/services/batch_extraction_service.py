@@ -0,0 +1,297 @@
+"""
+Batch knowledge extraction as a staged pipeline.
+
+    reader ──texts──> extractors (N threads, LLM) ──results──> writer (Milvus + Neo4j + status)
+
+The reader pages the pending items of a batch together with their requirement
+text, the extractors call the LLM concurrently, and the writer stores the
+extractions in batches (one embedding request, one Milvus insert and one
+Neo4j query per label) and records each item's outcome. The stages are joined
+by bounded queues, so a slow writer throttles the LLM calls and a slow LLM
+keeps the reader from loading the whole batch into memory.
+
+Items already DONE are skipped, so re-running a batch (job retry, the retry
+endpoint or scripts/batch_extract.py --resume) only processes the rest.
+"""
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func, literal, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.dependencies import get_extraction_service
+from app.models import sql_models
+from app.models.sql_models import SessionLocal, StatusEnum
+from app.services.llm_client import llm_call_context
+
+# Marks the end of a stage's output
+_DONE = object()
+# Seconds the writer waits for more results before writing a partial batch
+WRITE_WAIT_SECONDS = 5.0
+# Failed items returned with the progress
+MAX_REPORTED_FAILURES = 100
+
+
+def create_extraction_batch(db: Session, requirement_ids: Optional[List[int]] = None) -> sql_models.ExtractionBatch:
+    """
+    Create a batch with one pending item per requirement (all requirements when ids is None).
+    The caller commits, together with the job that runs it.
+    """
+    Item = sql_models.ExtractionBatchItem
+    batch = sql_models.ExtractionBatch(status=StatusEnum.INIT, total=0)
+    db.add(batch)
+    db.flush()
+
+    if requirement_ids is None:
+        db.execute(Item.__table__.insert().from_select(
+            ["batch_id", "requirement_id", "status"],
+            select(
+                literal(batch.id),
+                sql_models.RequirementRaw.id,
+                literal(StatusEnum.PENDING, type_=Item.__table__.c.status.type)
+            ).order_by(sql_models.RequirementRaw.id)
+        ))
+    else:
+        unique_ids = list(dict.fromkeys(requirement_ids))
+        if unique_ids:
+            db.execute(Item.__table__.insert(), [
+                {"batch_id": batch.id, "requirement_id": requirement_id, "status": StatusEnum.PENDING}
+                for requirement_id in unique_ids
+            ])
+    batch.total = db.query(func.count(Item.id)).filter(Item.batch_id == batch.id).scalar()
+    return batch
+
+
+def get_batch_progress(db: Session, batch_id: int, failures_limit: int = MAX_REPORTED_FAILURES) -> Optional[Dict[str, Any]]:
+    """Status, item counts and the first failed items of a batch."""
+    batch = db.get(sql_models.ExtractionBatch, batch_id)
+    if batch is None:
+        return None
+    Item = sql_models.ExtractionBatchItem
+    counts = dict(
+        db.query(Item.status, func.count(Item.id)).filter(Item.batch_id == batch_id).group_by(Item.status).all()
+    )
+    done = counts.get(StatusEnum.DONE, 0)
+    failed = counts.get(StatusEnum.FAILED, 0)
+    failures = db.query(Item).filter(
+        Item.batch_id == batch_id, Item.status == StatusEnum.FAILED
+    ).order_by(Item.id).limit(failures_limit).all()
+    nodes = db.query(func.sum(Item.nodes)).filter(Item.batch_id == batch_id).scalar() or 0
+
+    return {
+        "batch_id": str(batch.id),
+        "status": batch.status,
+        "total": batch.total,
+        "done": done,
+        "failed": failed,
+        "pending": batch.total - done - failed,
+        "progress": int((done + failed) / batch.total * 100) if batch.total else 100,
+        "nodes": int(nodes),
+        "error_message": batch.error_message,
+        "failures": [
+            {"requirement_id": item.requirement_id, "error": item.error_message}
+            for item in failures
+        ],
+        "created_at": batch.created_at.isoformat() if batch.created_at else None,
+        "started_at": batch.started_at.isoformat() if batch.started_at else None,
+        "finished_at": batch.finished_at.isoformat() if batch.finished_at else None,
+    }
+
+
+class ExtractionPipeline:
+    """Runs the pending items of one batch through reader, extractor and writer stages."""
+
+    def __init__(self, batch_id: int, concurrency: Optional[int] = None, page_size: Optional[int] = None,
+                 write_batch_size: Optional[int] = None, on_progress: Optional[Callable[[int, int], None]] = None):
+        self.batch_id = batch_id
+        self.concurrency = concurrency or settings.extraction_concurrency
+        self.page_size = page_size or settings.extraction_page_size
+        self.write_batch_size = write_batch_size or settings.extraction_write_batch_size
+        self.on_progress = on_progress
+        self.extraction_service = get_extraction_service()
+
+        self._texts = queue.Queue(maxsize=self.concurrency * 2)
+        self._results = queue.Queue(maxsize=self.write_batch_size * 2)
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+        self.done = 0
+        self.failed = 0
+
+    def run(self):
+        """Process the batch; raises the first error that stopped a stage."""
+        threads = [threading.Thread(target=self._guard, args=(self._read,), daemon=True)]
+        threads += [
+            threading.Thread(target=self._guard, args=(self._extract,), daemon=True)
+            for _ in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            self._guard(self._write)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def _guard(self, stage: Callable[[], None]):
+        try:
+            stage()
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def _put(self, target: queue.Queue, item: Any) -> bool:
+        """Put with backpressure; gives up once the pipeline is stopping."""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self):
+        Item = sql_models.ExtractionBatchItem
+        db = SessionLocal()
+        try:
+            last_id = 0
+            while not self._stop.is_set():
+                rows = db.execute(
+                    select(Item.id, Item.requirement_id, sql_models.RequirementRaw.full_content,
+                           sql_models.RequirementRaw.chunks)
+                    .outerjoin(sql_models.RequirementRaw, sql_models.RequirementRaw.id == Item.requirement_id)
+                    .where(Item.batch_id == self.batch_id, Item.status != StatusEnum.DONE, Item.id > last_id)
+                    .order_by(Item.id)
+                    .limit(self.page_size)
+                ).all()
+                # Do not hold a snapshot while the writer updates the items
+                db.rollback()
+                if not rows:
+                    break
+                for row in rows:
+                    if not self._put(self._texts, row):
+                        return
+                last_id = rows[-1].id
+        finally:
+            db.close()
+            for _ in range(self.concurrency):
+                self._put(self._texts, _DONE)
+
+    def _extract(self):
+        while True:
+            try:
+                row = self._texts.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            if row is _DONE:
+                self._put(self._results, _DONE)
+                return
+            result = {"item_id": row.id}
+            if row.full_content is None:
+                result["error"] = "Requirement not found"
+            else:
+                try:
+                    with llm_call_context(requirement_id=row.requirement_id):
+                        # Uploaded documents carry the parser's chunks; other requirements are chunked from text
+                        result["extraction"] = self.extraction_service.extract(
+                            str(row.requirement_id), f"KB-{row.requirement_id}", row.full_content,
+                            chunks=json.loads(row.chunks) if row.chunks else None
+                        )
+                except Exception as e:
+                    result["error"] = str(e)
+            if not self._put(self._results, result):
+                return
+
+    def _write(self):
+        db = SessionLocal()
+        try:
+            finished_extractors = 0
+            pending: List[Dict[str, Any]] = []
+            last_write = time.monotonic()
+            while finished_extractors < self.concurrency and not self._stop.is_set():
+                try:
+                    result = self._results.get(timeout=0.5)
+                except queue.Empty:
+                    result = None
+                if result is _DONE:
+                    finished_extractors += 1
+                elif result is not None:
+                    pending.append(result)
+                if pending and (len(pending) >= self.write_batch_size
+                                or time.monotonic() - last_write >= WRITE_WAIT_SECONDS):
+                    self._write_batch(db, pending)
+                    pending = []
+                    last_write = time.monotonic()
+            if pending and not self._stop.is_set():
+                self._write_batch(db, pending)
+        finally:
+            db.close()
+
+    def _write_batch(self, db: Session, results: List[Dict[str, Any]]):
+        """Store the successful extractions together, then record every item's outcome."""
+        extracted = [result for result in results if "extraction" in result]
+        if extracted:
+            try:
+                self.extraction_service.store([result["extraction"] for result in extracted])
+            except Exception as e:
+                for result in extracted:
+                    result["error"] = f"Store failed: {e}"
+
+        now = datetime.utcnow()
+        db.execute(update(sql_models.ExtractionBatchItem), [
+            {
+                "id": result["item_id"],
+                "status": StatusEnum.FAILED if "error" in result else StatusEnum.DONE,
+                "nodes": None if "error" in result else len(result["extraction"]["nodes"]),
+                "error_message": result.get("error"),
+                "finished_at": now,
+            }
+            for result in results
+        ])
+        db.commit()
+
+        failed = sum(1 for result in results if "error" in result)
+        self.failed += failed
+        self.done += len(results) - failed
+        if self.on_progress:
+            self.on_progress(self.done, self.failed)
+
+
+def run_batch_extraction(batch_id: int, concurrency: Optional[int] = None,
+                         on_progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """Run the pending items of a batch and mark it DONE, or FAILED if the pipeline broke."""
+    db = SessionLocal()
+    try:
+        batch = db.get(sql_models.ExtractionBatch, batch_id)
+        if batch is None:
+            raise ValueError(f"Extraction batch {batch_id} not found")
+        batch.status = StatusEnum.RUNNING
+        batch.started_at = datetime.utcnow()
+        batch.finished_at = None
+        batch.error_message = None
+        db.commit()
+
+        try:
+            ExtractionPipeline(batch_id, concurrency=concurrency, on_progress=on_progress).run()
+        except Exception as e:
+            batch.status = StatusEnum.FAILED
+            batch.error_message = str(e)
+            batch.finished_at = datetime.utcnow()
+            db.commit()
+            raise
+
+        batch.status = StatusEnum.DONE
+        batch.finished_at = datetime.utcnow()
+        db.commit()
+        return get_batch_progress(db, batch_id)
+    finally:
+        db.close()
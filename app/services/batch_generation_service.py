@@ -0,0 +1,235 @@
+"""
+Batch generation from a requirement to test points and test cases.
+
+The work is split into idempotent steps that are checkpointed in generation_step:
+"context" (retrieval), "test_points" (test point LLM call) and "case:<i>" (one
+test case LLM call each). Rows are written by GenerationWriter together with
+their checkpoints, so a retried or resumed task skips everything already done.
+
+Before every step the task is checked for a cancel request and its deadline; a
+stopped task keeps the results written so far and ends as CANCELLED or TIMED_OUT.
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models import sql_models
+from app.models.sql_models import SessionLocal, StatusEnum
+from app.core.prompts import PromptTemplates
+from app.core.llm_usage import accumulate_usage
+from app.core.dependencies import get_retrieval_service
+from app.services.llm_client import get_llm_client, llm_call_context
+from app.services.generation_writer import GenerationWriter, apply_usage
+
+CONTEXT_STEP = "context"
+TEST_POINTS_STEP = "test_points"
+
+# Task states the worker does not run (again)
+FINAL_STATUSES = (StatusEnum.DONE, StatusEnum.CANCELLED, StatusEnum.TIMED_OUT)
+
+
+def case_step(index: int) -> str:
+    return f"case:{index}"
+
+
+def _load_steps(db: Session, task_id: int) -> Dict[str, Any]:
+    steps = db.query(sql_models.GenerationStep).filter(
+        sql_models.GenerationStep.task_id == task_id
+    ).all()
+    return {step.step_key: json.loads(step.output) if step.output else None for step in steps}
+
+
+def generation_dedup_key(requirement_id: int, content: str, options: Optional[Dict[str, Any]]) -> str:
+    """Identify identical submissions: same requirement, same content, same options."""
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    options_json = json.dumps(options or {}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{requirement_id}:{content_hash}:{options_json}".encode("utf-8")).hexdigest()
+
+
+class GenerationStopped(Exception):
+    """Raised between steps when a task was cancelled or ran past its deadline."""
+
+    def __init__(self, status: StatusEnum):
+        super().__init__(f"Generation stopped: {status.value}")
+        self.status = status
+
+
+def _stop_status(db: Session, task: sql_models.GenerationTask) -> Optional[StatusEnum]:
+    """Return CANCELLED or TIMED_OUT if the task must stop, else None."""
+    # Read the flag from the database: the cancel endpoint sets it from another process
+    cancel_requested = db.query(sql_models.GenerationTask.cancel_requested).filter(
+        sql_models.GenerationTask.id == task.id
+    ).scalar()
+    if cancel_requested:
+        return StatusEnum.CANCELLED
+    if task.deadline_at and datetime.utcnow() >= task.deadline_at:
+        return StatusEnum.TIMED_OUT
+    return None
+
+
+def _check_stop(db: Session, task: sql_models.GenerationTask):
+    status = _stop_status(db, task)
+    if status is not None:
+        raise GenerationStopped(status)
+
+
+def run_batch_generation(task_id: int, requirement_id: int):
+    """
+    Batch test case generation from a requirement, run by the job queue worker.
+    Completed steps of earlier attempts are skipped.
+    Exceptions are re-raised so the queue can retry the job.
+    """
+    with llm_call_context(task_id=task_id, requirement_id=requirement_id):
+        _run_batch_generation(task_id, requirement_id)
+
+
+def _run_batch_generation(task_id: int, requirement_id: int):
+    db = SessionLocal()
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    writer = None
+    try:
+        # Update task status
+        task = db.query(sql_models.GenerationTask).filter(
+            sql_models.GenerationTask.id == task_id
+        ).first()
+
+        if not task or task.status in FINAL_STATUSES:
+            return
+
+        done = _load_steps(db, task_id)
+        task.status = StatusEnum.RUNNING
+        task.error_message = None
+        task.progress = max(task.progress or 0, 10)
+        db.commit()
+
+        # Get requirement
+        requirement = db.query(sql_models.RequirementRaw).filter(
+            sql_models.RequirementRaw.id == requirement_id
+        ).first()
+
+        if not requirement:
+            task.status = StatusEnum.FAILED
+            task.error_message = "Requirement not found"
+            task.finished_at = datetime.utcnow()
+            db.commit()
+            return
+
+        client = get_llm_client()
+        writer = GenerationWriter(db, task, usage)
+        _check_stop(db, task)
+
+        # Step 1: Retrieve context. The serialized form is checkpointed so a resumed
+        # task rebuilds exactly the same (cache-friendly) prompt prefix.
+        if CONTEXT_STEP in done:
+            historical_knowledge = done[CONTEXT_STEP]
+        else:
+            context = get_retrieval_service().search(
+                query_text=requirement.full_content,
+                top_k=10,
+                graph_depth=2
+            )
+            historical_knowledge = PromptTemplates.serialize_context(context)
+            writer.checkpoint(CONTEXT_STEP, historical_knowledge, progress=30)
+            _check_stop(db, task)
+
+        # Instructions, requirement and retrieved knowledge form a prefix that is
+        # byte-identical for every call of this task, so the provider can cache it.
+        prefix = PromptTemplates.get_generation_prefix(
+            requirement_content=requirement.full_content,
+            historical_knowledge=historical_knowledge
+        )
+
+        # Step 2: Generate test points and bulk insert them together with the checkpoint
+        if TEST_POINTS_STEP in done:
+            test_points = done[TEST_POINTS_STEP]
+        else:
+            response = client.chat(
+                "test_points",
+                PromptTemplates.get_test_point_messages(prefix),
+                response_format={"type": "json_object"}
+            )
+            accumulate_usage(usage, response)
+
+            test_points_data = json.loads(response.choices[0].message.content)
+            test_points = writer.write_test_points(
+                TEST_POINTS_STEP, test_points_data.get("test_points", []), progress=50
+            )
+
+        # Step 3: Generate one test case per test point; the writer persists them in batches
+        writer.total_cases = len(test_points)
+        writer.cases_done = sum(1 for i in range(len(test_points)) if case_step(i) in done)
+        for i, tp in enumerate(test_points):
+            if case_step(i) in done:
+                continue
+            _check_stop(db, task)
+
+            response = client.chat(
+                "test_case",
+                PromptTemplates.get_test_case_messages(prefix, tp["description"]),
+                response_format={"type": "json_object"}
+            )
+            accumulate_usage(usage, response)
+
+            writer.add_case(case_step(i), tp, json.loads(response.choices[0].message.content))
+
+        writer.flush()
+
+        # Complete task
+        task.status = StatusEnum.DONE
+        task.progress = 100
+        task.finished_at = datetime.utcnow()
+        apply_usage(task, usage)
+        db.commit()
+
+    except GenerationStopped as e:
+        _finish_stopped(db, task_id, writer, usage, e.status)
+
+    except Exception as e:
+        # Status is left to the job queue, which retries or marks the task FAILED.
+        # Cases generated before the failure are still written so a retry skips them.
+        db.rollback()
+        _save_staged(db, task_id, writer)
+        task = db.query(sql_models.GenerationTask).filter(
+            sql_models.GenerationTask.id == task_id
+        ).first()
+        if task:
+            # A call that failed because the task was cancelled or ran out of time
+            # should not be retried
+            status = _stop_status(db, task)
+            if status is not None:
+                _finish_stopped(db, task_id, None, usage, status)
+                return
+            task.error_message = str(e)
+            apply_usage(task, usage)
+            db.commit()
+        raise
+    finally:
+        db.close()
+
+
+def _save_staged(db: Session, task_id: int, writer: Optional[GenerationWriter]):
+    """Write cases generated before a failure or stop so they are not paid for twice."""
+    if writer is None:
+        return
+    try:
+        writer.flush()
+    except Exception as flush_error:
+        db.rollback()
+        print(f"Failed to save staged cases of task {task_id}: {flush_error}")
+
+
+def _finish_stopped(db: Session, task_id: int, writer: Optional[GenerationWriter],
+                    usage: Dict[str, int], status: StatusEnum):
+    """End a cancelled or timed out task, keeping its partial results."""
+    _save_staged(db, task_id, writer)
+    task = db.query(sql_models.GenerationTask).filter(
+        sql_models.GenerationTask.id == task_id
+    ).first()
+    task.status = status
+    task.error_message = "Cancelled by user" if status == StatusEnum.CANCELLED else "Deadline exceeded"
+    task.finished_at = datetime.utcnow()
+    apply_usage(task, usage)
+    db.commit()
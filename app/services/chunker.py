@@ -0,0 +1,215 @@
+"""
+Structure-aware document chunking.
+
+Documents are first turned into blocks (headings, paragraphs, tables; with page
+numbers where the format has pages), then packed into chunks of at most
+max_chars characters:
+
+- a heading starts a new chunk unless the current one is still small, so
+  sections stay together and tiny sections share a chunk;
+- a chunk that starts inside a section repeats the section's heading path, so
+  every chunk can be understood on its own;
+- tables are split between rows only, repeating the header row;
+- oversized paragraphs are split at sentence ends.
+
+text_blocks() recovers the structure from plain text, including the text
+DocumentParser.parse produces (" | " table rows, "=== Sheet: x ===" markers),
+so stored requirement content chunks the same way as the original file.
+"""
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+HEADING = "heading"
+PARAGRAPH = "paragraph"
+TABLE = "table"
+
+# Sections shorter than this fraction of max_chars share a chunk with the next section
+MIN_SECTION_FRACTION = 0.25
+
+_MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*$")
+_SHEET_HEADING = re.compile(r"^=== Sheet: (.+) ===$")
+# 第一章 / 第3节
+_CHAPTER_HEADING = re.compile(r"^第[一二三四五六七八九十百零\d]+[章节部分篇]")
+# 一、 / （一）
+_CHINESE_HEADING = re.compile(r"^(?:[一二三四五六七八九十]+、|[（(][一二三四五六七八九十]+[）)])")
+# 1 / 1. / 1.2 / 1.2.3 followed by a title
+_NUMBERED_HEADING = re.compile(r"^(\d+(?:\.\d+)*)\.?\s+\S")
+_TABLE_SEPARATOR = re.compile(r"^[\s|:+-]+$")
+_SENTENCE_END = re.compile(r"(?<=[。！？；.!?;])\s*")
+# Lines longer than this are never headings
+MAX_HEADING_CHARS = 60
+
+
+class Block(NamedTuple):
+    kind: str
+    text: str
+    # Heading level, 1 = top
+    level: int = 0
+    page: Optional[int] = None
+
+
+def _heading_level(line: str) -> int:
+    """Heading level of a line of plain text, or 0 when it is not a heading."""
+    match = _MARKDOWN_HEADING.match(line)
+    if match:
+        return len(match.group(1))
+    if len(line) > MAX_HEADING_CHARS:
+        return 0
+    if _SHEET_HEADING.match(line) or _CHAPTER_HEADING.match(line):
+        return 1
+    if _CHINESE_HEADING.match(line):
+        return 2
+    match = _NUMBERED_HEADING.match(line)
+    # A numbered sentence ending in punctuation is a list item, not a heading
+    if match and not line.endswith(("。", ".", "；", ";", "，", ",")):
+        return match.group(1).count(".") + 1
+    return 0
+
+
+def _is_table_row(line: str) -> bool:
+    return " | " in line or (line.startswith("|") and line.endswith("|"))
+
+
+def text_blocks(text: str, page: Optional[int] = None) -> List[Block]:
+    """Split plain text into heading, paragraph and table blocks."""
+    blocks = []
+    table_rows: List[str] = []
+    paragraph: List[str] = []
+
+    def flush_table():
+        if table_rows:
+            blocks.append(Block(TABLE, "\n".join(table_rows), page=page))
+            table_rows.clear()
+
+    def flush_paragraph():
+        if paragraph:
+            blocks.append(Block(PARAGRAPH, "\n".join(paragraph), page=page))
+            paragraph.clear()
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            flush_table()
+            flush_paragraph()
+            continue
+        if _is_table_row(line) or (table_rows and _TABLE_SEPARATOR.match(line)):
+            flush_paragraph()
+            table_rows.append(line)
+            continue
+        flush_table()
+        level = _heading_level(line)
+        if level:
+            flush_paragraph()
+            blocks.append(Block(HEADING, line.lstrip("#").strip(), level, page))
+        else:
+            # One paragraph per line: the parsers emit Word paragraphs one per line
+            paragraph.append(line)
+            flush_paragraph()
+    flush_table()
+    flush_paragraph()
+    return blocks
+
+
+def _split_paragraph(text: str, max_chars: int) -> List[str]:
+    pieces = []
+    current = ""
+    for sentence in _SENTENCE_END.split(text):
+        while len(sentence) > max_chars:
+            # No sentence boundary in reach: hard split
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) > max_chars:
+            pieces.append(current)
+            current = ""
+        current += sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _split_table(text: str, max_chars: int) -> List[str]:
+    rows = text.split("\n")
+    header = rows[:2] if len(rows) > 1 and _TABLE_SEPARATOR.match(rows[1]) else rows[:1]
+    header_text = "\n".join(header)
+    pieces = []
+    current: List[str] = []
+    size = len(header_text)
+    for row in rows[len(header):]:
+        if current and size + len(row) + 1 > max_chars:
+            pieces.append("\n".join(header + current))
+            current = []
+            size = len(header_text)
+        current.append(row)
+        size += len(row) + 1
+    if current or not pieces:
+        pieces.append("\n".join(header + current))
+    return pieces
+
+
+def chunk_blocks(blocks: Iterable[Block], max_chars: int) -> List[Dict[str, Any]]:
+    """
+    Pack blocks into chunks of at most max_chars characters (a single row or sentence
+    longer than that is kept whole). Each chunk is a dict with index, headings (the
+    section path where it starts), page_start, page_end and text.
+    """
+    chunks: List[Dict[str, Any]] = []
+    path: List[Block] = []
+    parts: List[str] = []
+    size = 0
+    pages: List[int] = []
+    chunk_path: List[str] = []
+
+    def flush():
+        nonlocal parts, size, pages
+        if parts:
+            chunks.append({
+                "index": len(chunks),
+                "headings": chunk_path,
+                "page_start": min(pages) if pages else None,
+                "page_end": max(pages) if pages else None,
+                "text": "\n".join(parts)
+            })
+        parts, size, pages = [], 0, []
+
+    def add(text: str, page: Optional[int]):
+        nonlocal size, chunk_path
+        if parts and size + len(text) + 1 > max_chars:
+            flush()
+        if not parts:
+            chunk_path = [heading.text for heading in path]
+            # Repeat where in the document the chunk starts; a chunk opening with
+            # a heading only needs that heading's parents
+            context = chunk_path[:-1] if path and text == path[-1].text else chunk_path
+            if context:
+                parts.append(" > ".join(context))
+                size = len(parts[0]) + 1
+        parts.append(text)
+        size += len(text) + 1
+        if page is not None:
+            pages.append(page)
+
+    for block in blocks:
+        if block.kind == HEADING:
+            if size >= max_chars * MIN_SECTION_FRACTION:
+                flush()
+            path = [heading for heading in path if heading.level < block.level] + [block]
+            add(block.text, block.page)
+        else:
+            # Room left in a chunk that repeats the heading path
+            budget = max(max_chars - len(" > ".join(heading.text for heading in path)) - 1, max_chars // 2)
+            if len(block.text) + 1 <= budget:
+                add(block.text, block.page)
+            else:
+                split = _split_table if block.kind == TABLE else _split_paragraph
+                for piece in split(block.text, budget):
+                    add(piece, block.page)
+    flush()
+    return chunks
+
+
+def chunk_text(text: str, max_chars: int) -> List[Dict[str, Any]]:
+    """Chunk plain text; see chunk_blocks."""
+    return chunk_blocks(text_blocks(text), max_chars)
@@ -0,0 +1,179 @@
+"""
+Streaming test case export.
+
+Cases are read through a server-side cursor (yield_per) and written as they
+arrive: CSV and JSONL line by line, JSON as one incrementally written array and
+Excel through an openpyxl write-only workbook, which spills rows to a temporary
+file. Memory stays flat however many cases are exported.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import select
+
+from app.models import sql_models
+from app.models.sql_models import SessionLocal
+
+# format -> (file extension, media type)
+EXPORT_FORMATS = {
+    "excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": (".csv", "text/csv; charset=utf-8"),
+    "json": (".json", "application/json"),
+    "jsonl": (".jsonl", "application/x-ndjson"),
+}
+EXPORT_COLUMNS = ["id", "title", "precondition", "steps", "expected", "status", "created_at"]
+# Rows fetched from the cursor per round trip
+FETCH_SIZE = 1000
+# Rows written to the response per chunk
+WRITE_CHUNK_ROWS = 500
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def export_conditions(case_ids: Optional[List[int]] = None, requirement_id: Optional[int] = None,
+                      test_point_id: Optional[int] = None,
+                      status: Optional[sql_models.TestCaseStatusEnum] = None) -> List[Any]:
+    """WHERE clauses selecting the cases to export; no clauses selects every case."""
+    TestCase = sql_models.TestCase
+    conditions = []
+    if case_ids:
+        conditions.append(TestCase.id.in_(case_ids))
+    if requirement_id:
+        conditions.append(TestCase.related_req_id == requirement_id)
+    if test_point_id:
+        conditions.append(TestCase.test_point_id == test_point_id)
+    if status:
+        conditions.append(TestCase.status == status)
+    return conditions
+
+
+def iter_cases(conditions: List[Any]) -> Iterator[Dict[str, Any]]:
+    """Yield the selected cases in id order without loading them all."""
+    TestCase = sql_models.TestCase
+    # The stream outlives the request's session, so it reads with its own
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            select(TestCase.id, TestCase.title, TestCase.precondition, TestCase.steps,
+                   TestCase.expected, TestCase.status, TestCase.created_at)
+            .where(*conditions)
+            .order_by(TestCase.id)
+            .execution_options(yield_per=FETCH_SIZE)
+        )
+        for row in result:
+            yield {
+                "id": row.id,
+                "title": row.title,
+                "precondition": row.precondition,
+                "steps": json.loads(row.steps) if row.steps else [],
+                "expected": row.expected,
+                "status": row.status.value if row.status else "draft",
+                "created_at": row.created_at,
+            }
+    finally:
+        db.close()
+
+
+def stream_export(conditions: List[Any], export_format: str) -> Iterator[bytes]:
+    """The export file of the selected cases, as byte chunks."""
+    cases = iter_cases(conditions)
+    if export_format == "csv":
+        return _stream_csv(cases)
+    if export_format == "jsonl":
+        return _stream_jsonl(cases)
+    if export_format == "json":
+        return _stream_json(cases)
+    if export_format == "excel":
+        return _stream_xlsx(cases)
+    raise ValueError(f"Unsupported export format: {export_format}")
+
+
+def _flat(case: Dict[str, Any]) -> List[Any]:
+    """A case as one spreadsheet row; steps become one cell with a line per step."""
+    return [
+        case["id"],
+        case["title"],
+        case["precondition"],
+        "\n".join(str(step) for step in case["steps"]),
+        case["expected"],
+        case["status"],
+        case["created_at"],
+    ]
+
+
+def _json_ready(case: Dict[str, Any]) -> Dict[str, Any]:
+    created_at = case["created_at"]
+    return {**case, "created_at": created_at.isoformat() if created_at else None}
+
+
+def _stream_csv(cases: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens the UTF-8 file with the right encoding
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_COLUMNS)
+    for count, case in enumerate(cases, 1):
+        row = _flat(case)
+        row[-1] = row[-1].isoformat() if row[-1] else ""
+        writer.writerow(row)
+        if count % WRITE_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _stream_jsonl(cases: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    lines = []
+    for case in cases:
+        lines.append(json.dumps(_json_ready(case), ensure_ascii=False))
+        if len(lines) >= WRITE_CHUNK_ROWS:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _stream_json(cases: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    yield b"["
+    separator = "\n"
+    items = []
+    for case in cases:
+        items.append(separator + json.dumps(_json_ready(case), ensure_ascii=False))
+        separator = ",\n"
+        if len(items) >= WRITE_CHUNK_ROWS:
+            yield "".join(items).encode("utf-8")
+            items = []
+    yield ("".join(items) + "\n]").encode("utf-8")
+
+
+def _stream_xlsx(cases: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    # A zip needs its central directory at the end, so the workbook is built in a
+    # temporary file (write-only mode keeps rows out of memory) and then streamed
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("testcases")
+        sheet.append(EXPORT_COLUMNS)
+        for case in cases:
+            sheet.append([
+                ILLEGAL_CHARACTERS_RE.sub("", value) if isinstance(value, str) else value
+                for value in _flat(case)
+            ])
+        workbook.save(path)
+
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
@@ -1,94 +1,188 @@
-import uuid
+import hashlib
 import json
-from typing import Dict
-from openai import OpenAI
+import contextvars
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from app.core.config import settings
 from app.core.prompts import PromptTemplates
+from app.services.chunker import chunk_text
+from app.services.llm_client import get_llm_client
 from app.services.graph_service import GraphService
 from app.services.milvus_service import MilvusService
 
+def _chunk_prompt_text(chunk: Dict) -> str:
+    """Chunk text with its page range, when the document has pages."""
+    start, end = chunk.get("page_start"), chunk.get("page_end")
+    if start is None:
+        return chunk["text"]
+    pages = f"第 {start} 页" if start == end else f"第 {start}-{end} 页"
+    return f"（{pages}）\n{chunk['text']}"
+
+
 class ExtractionService:
     def __init__(self, graph_service: GraphService, milvus_service: MilvusService):
         self.graph_service = graph_service
         self.milvus_service = milvus_service
-        self.openai_client = OpenAI(api_key=settings.openai_api_key)
+        self.llm_client = get_llm_client()
+        # Extraction LLM calls running at once in this process, across batch pipeline
+        # threads, queue jobs and the chunks of each requirement
+        self._llm_slots = threading.BoundedSemaphore(settings.extraction_concurrency)
 
     def _call_llm_for_extraction(self, text: str) -> Dict:
         prompt = PromptTemplates.get_knowledge_extraction_prompt(text)
 
-        response = self.openai_client.chat.completions.create(
-            model=settings.openai_model,
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-            temperature=settings.llm_temperature
-        )
-        
+        with self._llm_slots:
+            response = self.llm_client.chat(
+                "extraction",
+                [{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"},
+                temperature=settings.llm_temperature
+            )
+
         return json.loads(response.choices[0].message.content)
 
+    def extract(self, requirement_id: str, knowledge_base_id: str, text: str,
+                chunks: Optional[List[Dict]] = None) -> Dict:
+        """
+        Call the LLM for one requirement and assign graph ids to the extracted nodes.
+        Uploaded documents pass the chunks stored from DocumentParser.parse_document; other
+        text is split into structure-aware chunks here. Chunks are extracted concurrently
+        (at most EXTRACTION_CHUNK_CONCURRENCY per requirement) and merged.
+        Returns the nodes and edges ready for store(); nothing is written yet.
+        """
+        if chunks is None:
+            chunks = chunk_text(text, settings.chunk_max_chars)
+        texts = [_chunk_prompt_text(chunk) for chunk in chunks] or [text]
+
+        if len(texts) == 1:
+            results = [self._call_llm_for_extraction(texts[0])]
+        else:
+            executor = ThreadPoolExecutor(max_workers=min(len(texts), settings.extraction_chunk_concurrency))
+            try:
+                # Each call runs in a copy of the caller's context, so llm_call_context still applies
+                futures = [
+                    executor.submit(contextvars.copy_context().run, self._call_llm_for_extraction, chunk)
+                    for chunk in texts
+                ]
+                results = [future.result() for future in futures]
+            finally:
+                # One failed chunk fails the requirement; skip the calls not started yet
+                executor.shutdown(cancel_futures=True)
+
+        nodes, edges = self._merge(requirement_id, knowledge_base_id, results)
+        return {
+            "requirement_id": requirement_id,
+            "knowledge_base_id": knowledge_base_id,
+            "nodes": [{**node, "knowledge_base_id": knowledge_base_id} for node in nodes],
+            "edges": edges,
+            "edge_count": len(edges),
+            "chunk_count": len(texts)
+        }
+
+    @staticmethod
+    def _node_id(requirement_id: str, knowledge_base_id: str, node_type: str, normalized_content: str) -> str:
+        """
+        Graph id derived from the node itself, so a retried extraction MERGEs/upserts the
+        nodes a failed attempt already wrote instead of adding duplicates.
+        """
+        key = "\x1f".join(map(str, [requirement_id, knowledge_base_id, node_type, normalized_content]))
+        return f"K-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16].upper()}"
+
+    def _merge(self, requirement_id: str, knowledge_base_id: str, results: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Assign graph ids to the nodes extracted from each chunk. Nodes of the same type and
+        content become one node, and each chunk's edges are rewritten to the merged nodes.
+        """
+        nodes = []
+        node_by_key = {}
+        edges = []
+        edge_keys = set()
+        for extracted_data in results:
+            # Temporary ids are only unique within one LLM response
+            temp_id_to_node = {}
+            for node_data in extracted_data.get("nodes", []):
+                # Dynamically use the node type from LLM output
+                node_type = node_data.get("type", "TestPoint")  # Default to TestPoint
+                confidence = node_data.get("confidence", 1.0)
+                key = (node_type, " ".join(str(node_data["content"]).split()).casefold())
+                node = node_by_key.get(key)
+                if node is None:
+                    graph_id = self._node_id(requirement_id, knowledge_base_id, *key)
+                    node = {
+                        "id": graph_id,
+                        "content": node_data["content"],
+                        "type": node_type,
+                        "graph_id": graph_id,
+                        "confidence": confidence
+                    }
+                    node_by_key[key] = node
+                    nodes.append(node)
+                elif isinstance(confidence, (int, float)) and isinstance(node["confidence"], (int, float)):
+                    node["confidence"] = max(node["confidence"], confidence)
+                temp_id_to_node[node_data["id"]] = (node_type, node["graph_id"])
+
+            for edge_data in extracted_data.get("edges", []):
+                source = temp_id_to_node.get(edge_data["source"])
+                target = temp_id_to_node.get(edge_data["target"])
+                edge_key = (source, target, edge_data["relation"])
+                if source and target and edge_key not in edge_keys:
+                    edge_keys.add(edge_key)
+                    edges.append({"source": source, "target": target, "relation": edge_data["relation"]})
+        return nodes, edges
+
+    def store(self, extractions: List[Dict]):
+        """
+        Write the output of extract() for any number of requirements: one Neo4j query
+        per node label and relationship type, and one Milvus insert with batched embeddings.
+        """
+        # 1. Add requirement nodes to graph
+        self.graph_service.add_nodes("Requirement", [
+            {"id": item["requirement_id"], "content": "Root requirement", "knowledge_base_id": item["knowledge_base_id"]}
+            for item in extractions
+        ])
+
+        # 2. Store nodes, and "DERIVE" relationships as per the database design
+        nodes_by_type = defaultdict(list)
+        derived_by_type = defaultdict(list)
+        for item in extractions:
+            for node in item["nodes"]:
+                nodes_by_type[node["type"]].append({
+                    "id": node["id"],
+                    "content": node["content"],
+                    "requirement_id": item["requirement_id"],
+                    "knowledge_base_id": item["knowledge_base_id"]
+                })
+                derived_by_type[node["type"]].append((item["requirement_id"], node["id"]))
+        for node_type, nodes in nodes_by_type.items():
+            self.graph_service.add_nodes(node_type, nodes)
+            self.graph_service.add_relationships("Requirement", node_type, "DERIVE", derived_by_type[node_type])
+
+        # 3. Upsert to Milvus
+        milvus_rows = [node for item in extractions for node in item["nodes"]]
+        if milvus_rows:
+            self.milvus_service.upsert(milvus_rows)
+
+        # 4. Store extracted relationships
+        edges_by_kind = defaultdict(list)
+        for item in extractions:
+            for edge in item["edges"]:
+                (source_type, source_id), (target_type, target_id) = edge["source"], edge["target"]
+                edges_by_kind[(source_type, target_type, edge["relation"])].append((source_id, target_id))
+        for (source_type, target_type, relation), pairs in edges_by_kind.items():
+            self.graph_service.add_relationships(source_type, target_type, relation, pairs)
+
     def extract_and_store(self, requirement_id: str, knowledge_base_id: str, text: str):
         """
         Orchestrates the extraction and storage process, associating all data with a knowledge_base_id.
         """
-        extracted_data = self._call_llm_for_extraction(text)
-        
-        nodes_to_upsert_in_milvus = []
-        temp_id_to_graph_id = {}
-
-        # 1. Add requirement node to graph
-        self.graph_service.add_node("Requirement", {"id": requirement_id, "content": "Root requirement", "knowledge_base_id": knowledge_base_id})
-
-        # 2. Process and store nodes
-        for node_data in extracted_data.get("nodes", []):
-            graph_id = f"K-{uuid.uuid4().hex[:8].upper()}"
-            temp_id = node_data["id"]
-            temp_id_to_graph_id[temp_id] = graph_id
-            
-            node_properties = {
-                "id": graph_id,
-                "content": node_data["content"],
-                "requirement_id": requirement_id,
-                "knowledge_base_id": knowledge_base_id
-            }
-            # Dynamically use the node type from LLM output
-            node_type = node_data.get("type", "TestPoint") # Default to TestPoint
-            self.graph_service.add_node(node_type, node_properties)
-            
-            nodes_to_upsert_in_milvus.append({
-                "id": graph_id,
-                "content": node_data["content"],
-                "type": node_type,
-                "graph_id": graph_id,
-                "knowledge_base_id": knowledge_base_id,
-                "confidence": node_data.get("confidence", 1.0)
-            })
-            
-            # Use "DERIVE" relationship as per the database design
-            self.graph_service.add_relationship("Requirement", requirement_id, node_type, graph_id, "DERIVE")
+        extraction = self.extract(requirement_id, knowledge_base_id, text)
+        self.store([extraction])
 
-        # 3. Upsert to Milvus
-        if nodes_to_upsert_in_milvus:
-            self.milvus_service.upsert(nodes_to_upsert_in_milvus)
-
-        # 4. Process and store relationships
-        for edge_data in extracted_data.get("edges", []):
-            source_temp_id = edge_data["source"]
-            target_temp_id = edge_data["target"]
-            
-            source_graph_id = temp_id_to_graph_id.get(source_temp_id)
-            target_graph_id = temp_id_to_graph_id.get(target_temp_id)
-            
-            source_node_type = next((n["type"] for n in extracted_data["nodes"] if n["id"] == source_temp_id), "TestPoint")
-            target_node_type = next((n["type"] for n in extracted_data["nodes"] if n["id"] == target_temp_id), "TestPoint")
-
-            if all([source_graph_id, target_graph_id, source_node_type, target_node_type]):
-                self.graph_service.add_relationship(
-                    source_node_type, source_graph_id,
-                    target_node_type, target_graph_id,
-                    edge_data["relation"]
-                )
-        
         return {
             "knowledge_base_id": knowledge_base_id,
-            "processed_nodes": len(nodes_to_upsert_in_milvus),
-            "processed_edges": len(extracted_data.get("edges", []))
+            "processed_nodes": len(extraction["nodes"]),
+            "processed_edges": extraction["edge_count"],
+            "chunks": extraction["chunk_count"]
         }
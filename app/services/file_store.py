@@ -0,0 +1,77 @@
+"""
+Content-addressed storage for uploaded files.
+
+Uploads are copied to disk in fixed-size chunks while their SHA-256 is computed,
+so memory per upload stays constant whatever the file size and the size limit
+is enforced while copying. Each distinct content is stored once under its hash
+alone (uploads/objects/ab/abcdef...); uploading the same bytes again, under any
+name, extension or project, reuses the stored file. The extension of the client's
+filename is kept as metadata (StoredFile.suffix) for readers that pick the format
+by extension; the filename itself is never used as a path.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, NamedTuple, Optional
+
+from app.core.config import settings
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds UPLOAD_MAX_SIZE_MB."""
+
+
+class StoredFile(NamedTuple):
+    sha256: str
+    path: Path
+    size: int
+    # The same content was already stored
+    duplicate: bool
+    # Lower-cased extension of the uploaded filename, e.g. ".xlsx"
+    suffix: str
+
+
+def object_path(sha256: str) -> Path:
+    """Where the content with this hash is stored."""
+    return Path(settings.upload_dir) / "objects" / sha256[:2] / sha256
+
+
+def store_upload(stream: BinaryIO, filename: str, max_bytes: Optional[int] = None) -> StoredFile:
+    """Copy an upload stream into the store; raises UploadTooLargeError past max_bytes."""
+    if max_bytes is None:
+        max_bytes = settings.upload_max_size_mb * 1024 * 1024
+    tmp_dir = Path(settings.upload_dir) / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLargeError(
+                        f"{filename} exceeds the upload limit of {settings.upload_max_size_mb} MB"
+                    )
+                digest.update(chunk)
+                out.write(chunk)
+
+        sha256 = digest.hexdigest()
+        suffix = Path(filename).suffix.lower()
+        path = object_path(sha256)
+        if path.exists():
+            return StoredFile(sha256, path, size, True, suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Atomic, so concurrent uploads of the same content never expose a partial file
+        os.replace(tmp_path, path)
+        return StoredFile(sha256, path, size, False, suffix)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -1,89 +1,102 @@
 import json
 import uuid
-from typing import List, Dict
-from openai import OpenAI
+from typing import List, Dict, Optional
 from app.core.config import settings
+from app.core.llm_usage import accumulate_usage
+from app.core.prompts import PromptTemplates
+from app.services.llm_client import get_llm_client
 from app.services.retrieval_service import RetrievalService
 
+# Static instructions come first so that every call of a run shares one cacheable prefix.
+PLANNER_EXECUTOR_SYSTEM = """
+You are a senior test manager and test engineer working on one requirement.
+Every request below shares the same requirement, user target and knowledge base context;
+the last message of each request tells you which job to do.
+
+Job "plan": create a high-level test plan, a list of key aspects to test.
+Output the plan as a JSON object: {"plan": ["Test with valid credentials", "Test with invalid password"]}
+
+Job "test case": write a detailed test case for one test plan item.
+Output a single JSON object with keys: "title", "preconditions", "steps", "expected_results".
+- "steps" should be a list of strings.
+"""
+
+
 class GenerationService:
     def __init__(self, retrieval_service: RetrievalService):
         self.retrieval_service = retrieval_service
-        self.openai_client = OpenAI(api_key=settings.openai_api_key)
+        self.llm_client = get_llm_client()
 
-    def _create_plan(self, requirement_content: str, target_description: str, context: List[Dict]) -> List[str]:
+    def _build_prefix(self, requirement_content: str, target_description: str, context: List[Dict]) -> List[Dict]:
         """
-        Planner: Creates a test plan using LLM.
+        Builds the message prefix shared by the planner and every executor call.
         """
-        context_str = json.dumps(context, indent=2)
-        prompt = f"""
-        As a test manager, create a high-level test plan based on the requirement, user's target, and the provided context.
-        The plan should be a list of key aspects to test.
-
-        Requirement: {requirement_content}
-        Target: {target_description}
-        Context from Knowledge Base:
-        {context_str}
-
-        Output the plan as a JSON list of strings.
-        Example: ["Test with valid credentials", "Test with invalid password", "Test password recovery flow"]
+        context_str = PromptTemplates.serialize_context(context)
+        shared = (
+            f"Requirement: {requirement_content}\n"
+            f"Target: {target_description}\n"
+            f"Context from Knowledge Base:\n{context_str}\n"
+        )
+        return [
+            {"role": "system", "content": PLANNER_EXECUTOR_SYSTEM},
+            {"role": "user", "content": shared},
+        ]
+
+    def _create_plan(self, prefix: List[Dict], usage: Optional[Dict[str, int]] = None) -> List[str]:
         """
-        
-        response = self.openai_client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[{"role": "user", "content": prompt}],
+        Planner: Creates a test plan using LLM.
+        """
+        response = self.llm_client.chat(
+            "plan",
+            prefix + [{"role": "user", "content": 'Job: "plan"'}],
             response_format={"type": "json_object"},
         )
-        
+        accumulate_usage(usage, response)
+
         plan = json.loads(response.choices[0].message.content)
         return plan.get("plan", [])
 
-    def _execute_plan(self, plan: List[str], context: List[Dict]) -> List[Dict]:
+    def _execute_plan(self, plan: List[str], prefix: List[Dict], usage: Optional[Dict[str, int]] = None) -> List[Dict]:
         """
         Executor: Generates detailed test cases for each step in the plan.
         """
         test_cases = []
-        context_str = json.dumps(context, indent=2)
-
-        for i, step in enumerate(plan):
-            prompt = f"""
-            As a test engineer, write a detailed test case for the following test plan item.
-            
-            Test Plan Item: "{step}"
-
-            Relevant Context:
-            {context_str}
-
-            Format the output as a single JSON object with keys: "title", "preconditions", "steps", "expected_results".
-            - "steps" should be a list of strings.
-            """
-            
-            response = self.openai_client.chat.completions.create(
-                model=settings.openai_model,
-                messages=[{"role": "user", "content": prompt}],
+
+        for step in plan:
+            # Only this suffix varies between calls; the prefix is served from the provider cache.
+            messages = prefix + [{"role": "user", "content": f'Job: "test case"\nTest Plan Item: "{step}"'}]
+
+            response = self.llm_client.chat(
+                "plan_case",
+                messages,
                 response_format={"type": "json_object"},
                 temperature=settings.llm_temperature,
                 max_tokens=settings.llm_max_tokens
             )
-            
+            accumulate_usage(usage, response)
+
             test_case_data = json.loads(response.choices[0].message.content)
             test_case_data["id"] = f"TC-{uuid.uuid4().hex[:6].upper()}"
             test_cases.append(test_case_data)
-            
+
         return test_cases
 
-    def generate_test_cases(self, requirement_content: str, target_description: str) -> List[Dict]:
+    def generate_test_cases(self, requirement_content: str, target_description: str,
+                            usage: Optional[Dict[str, int]] = None) -> List[Dict]:
         """
         Orchestrates the Planner-Executor process.
+        If a usage dict is passed, prompt/completion/cached token counts are added to it.
         """
         # 1. Retrieve context
         context = self.retrieval_service.search(query_text=target_description, top_k=5)
+        prefix = self._build_prefix(requirement_content, target_description, context)
 
         # 2. Planner phase
-        plan = self._create_plan(requirement_content, target_description, context)
+        plan = self._create_plan(prefix, usage)
         if not plan:
             return []
 
         # 3. Executor phase
-        test_cases = self._execute_plan(plan, context)
-        
+        test_cases = self._execute_plan(plan, prefix, usage)
+
         return test_cases
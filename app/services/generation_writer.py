@@ -0,0 +1,159 @@
+"""
+Persistence layer for batch generation output.
+
+GenerationWriter stages TestPoint, TestCase, GenerationResult and checkpoint rows
+in memory and writes them with multi-row INSERTs that return primary keys, a few
+transactions per task instead of several commits per generated case. Progress and
+token usage are written with each flush, so they are throttled to the flush rate.
+The Core inserts bypass ORM events, so the statistics rollups are bumped explicitly.
+"""
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import sql_models
+from app.models.rollups import record_inserted
+
+# Rows per INSERT statement
+INSERT_CHUNK_SIZE = 1000
+
+
+def insert_returning_ids(db: Session, model, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Bulk insert rows and return their primary keys in row order.
+    Uses INSERT ... RETURNING where the dialect supports it. Otherwise (MySQL) it relies
+    on a single multi-row INSERT getting consecutive auto-increment ids starting at
+    LAST_INSERT_ID(), which InnoDB guarantees for simple inserts in every lock mode.
+    """
+    table = model.__table__
+    dialect = db.get_bind().dialect
+    ids: List[int] = []
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + INSERT_CHUNK_SIZE]
+        if getattr(dialect, "insert_executemany_returning_sort_by_parameter_order", False):
+            result = db.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), chunk)
+            ids.extend(row[0] for row in result)
+        else:
+            result = db.execute(insert(table).values(chunk))
+            first_id = result.lastrowid
+            ids.extend(range(first_id, first_id + len(chunk)))
+    return ids
+
+
+def apply_usage(task: sql_models.GenerationTask, usage: Dict[str, int]):
+    """Add the token usage accumulated since the last write to the task totals."""
+    task.prompt_tokens = (task.prompt_tokens or 0) + usage["prompt_tokens"]
+    task.completion_tokens = (task.completion_tokens or 0) + usage["completion_tokens"]
+    task.cached_tokens = (task.cached_tokens or 0) + usage["cached_tokens"]
+    for field in usage:
+        usage[field] = 0
+
+
+class GenerationWriter:
+    """Stages generation output for one task and writes it in bulk."""
+
+    def __init__(self, db: Session, task: sql_models.GenerationTask, usage: Dict[str, int],
+                 flush_size: Optional[int] = None, flush_interval: Optional[float] = None):
+        self.db = db
+        self.task = task
+        self.usage = usage
+        self.flush_size = flush_size or settings.generation_flush_size
+        self.flush_interval = flush_interval or settings.generation_flush_interval_seconds
+        self.total_cases = 0
+        self.cases_done = 0
+        self._staged: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+
+    def checkpoint(self, step_key: str, output: Any, progress: Optional[int] = None):
+        """Write a step checkpoint (and optional progress) in its own transaction."""
+        self._add_checkpoints([{"step_key": step_key, "output": output}])
+        if progress is not None:
+            self.task.progress = max(self.task.progress or 0, progress)
+        apply_usage(self.task, self.usage)
+        self.db.commit()
+
+    def write_test_points(self, step_key: str, test_points: List[Dict[str, Any]], progress: int) -> List[Dict[str, Any]]:
+        """Insert all generated test points and their checkpoint in one transaction."""
+        rows = [
+            {
+                "content": tp["description"],
+                "type": sql_models.TestKnowledgeTypeEnum.TEST_POINT,
+                "confidence": 0.8,
+                "vector_id": None,
+                "graph_id": None,
+                "source": "requirement",
+            }
+            for tp in test_points
+        ]
+        ids = insert_returning_ids(self.db, sql_models.TestPoint, rows)
+        record_inserted(self.db, sql_models.TestPoint, rows)
+        saved = [
+            {"category": tp.get("category"), "description": tp["description"], "test_point_id": tp_id}
+            for tp, tp_id in zip(test_points, ids)
+        ]
+        self.checkpoint(step_key, saved, progress)
+        return saved
+
+    def add_case(self, step_key: str, test_point: Dict[str, Any], case_data: Dict[str, Any]):
+        """Stage one generated test case; flushes when the batch is full or old enough."""
+        self._staged.append({"step_key": step_key, "test_point": test_point, "case_data": case_data})
+        if len(self._staged) >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write staged cases, their results, checkpoints, progress and usage in one transaction."""
+        if not self._staged:
+            return
+        staged = self._staged
+
+        case_rows = [
+            {
+                "title": item["case_data"].get("title", item["test_point"]["description"]),
+                "precondition": item["case_data"].get("precondition"),
+                "steps": json.dumps(item["case_data"].get("steps", []), ensure_ascii=False),
+                "expected": item["case_data"].get("expected", ""),
+                "related_req_id": None,  # Will be linked later
+                "test_point_id": item["test_point"]["test_point_id"],
+                "status": sql_models.TestCaseStatusEnum.DRAFT,
+                "created_by": sql_models.CreatorEnum.AI,
+            }
+            for item in staged
+        ]
+        case_ids = insert_returning_ids(self.db, sql_models.TestCase, case_rows)
+        record_inserted(self.db, sql_models.TestCase, case_rows)
+        result_ids = insert_returning_ids(self.db, sql_models.GenerationResult, [
+            {
+                "task_id": self.task.id,
+                "test_point_id": item["test_point"]["test_point_id"],
+                "test_case_content": json.dumps(item["case_data"], ensure_ascii=False),
+                "approved": False,
+            }
+            for item in staged
+        ])
+        self._add_checkpoints([
+            {"step_key": item["step_key"], "output": {"test_case_id": case_id, "result_id": result_id}}
+            for item, case_id, result_id in zip(staged, case_ids, result_ids)
+        ])
+
+        self.cases_done += len(staged)
+        if self.total_cases:
+            self.task.progress = 50 + int(self.cases_done / self.total_cases * 40)
+        apply_usage(self.task, self.usage)
+        self.db.commit()
+
+        self._staged = []
+        self._last_flush = time.monotonic()
+
+    def _add_checkpoints(self, checkpoints: List[Dict[str, Any]]):
+        self.db.execute(insert(sql_models.GenerationStep.__table__), [
+            {
+                "task_id": self.task.id,
+                "step_key": checkpoint["step_key"],
+                "output": json.dumps(checkpoint["output"], ensure_ascii=False),
+            }
+            for checkpoint in checkpoints
+        ])
@@ -40,6 +40,25 @@ class GraphService:
         result = self._execute_query(query, parameters={"props": properties})
         return result[0]['n'] if result else None
 
+    def add_nodes(self, label: str, nodes: List[dict]):
+        """MERGE many nodes with one label in a single query."""
+        if not nodes:
+            return
+        query = f"UNWIND $rows AS props MERGE (n:{label} {{id: props.id}}) SET n += props"
+        self._execute_query(query, parameters={"rows": nodes})
+
+    def add_relationships(self, start_node_label: str, end_node_label: str, relationship_type: str,
+                          pairs: List[Tuple[str, str]]):
+        """MERGE many (start_id, end_id) relationships of one type in a single query."""
+        if not pairs:
+            return
+        query = (
+            f"UNWIND $rows AS row "
+            f"MATCH (a:{start_node_label} {{id: row.start_id}}), (b:{end_node_label} {{id: row.end_id}}) "
+            f"MERGE (a)-[:{relationship_type}]->(b)"
+        )
+        self._execute_query(query, parameters={"rows": [{"start_id": a, "end_id": b} for a, b in pairs]})
+
     def add_relationship(self, start_node_label: str, start_node_id: str,
                          end_node_label: str, end_node_id: str,
                          relationship_type: str):
@@ -1,75 +1,343 @@
-"""Data import service for historical test data."""
+"""
+Data import service for historical test data.
+
+Files are read in chunks (openpyxl read-only mode for .xlsx, pandas chunked
+readers for CSV/JSONL, Parquet row batches), mapped to table columns with
+vectorized pandas operations and written with Core multi-row INSERTs, one
+commit per batch. Rows that fail validation or insertion are collected in an
+error report instead of aborting the import, so memory stays flat and a bad
+row only costs its own batch a row-by-row retry.
+
+Upsert mode makes re-imports idempotent: rows are matched on a natural key and
+carry a content hash, so a nightly sync of the same export only writes the rows
+that actually changed.
+"""
+import csv
+import hashlib
 import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
 import pandas as pd
-from typing import List, Dict, Any
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
-from app.models import sql_models
+
+from app.core.config import settings
+from app.models import rollups, sql_models
+
+SUPPORTED_EXTENSIONS = (".xlsx", ".xlsm", ".xls", ".csv", ".jsonl", ".parquet")
+# Errors returned in the response; the full list goes to the error report file
+MAX_REPORTED_ERRORS = 100
+
+
+# ---------- Readers ----------
+
+def read_chunks(file_path: str, chunk_size: int, suffix: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """
+    Yield the rows of a file as DataFrames of at most chunk_size rows, all values as read.
+    The format follows suffix (default: the file's extension).
+    """
+    suffix = (suffix or Path(file_path).suffix).lower()
+    if suffix in (".xlsx", ".xlsm"):
+        yield from _read_xlsx_chunks(file_path, chunk_size)
+    elif suffix == ".xls":
+        # Legacy format has no streaming reader
+        df = pd.read_excel(file_path, dtype=object)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    elif suffix == ".csv":
+        yield from pd.read_csv(file_path, chunksize=chunk_size, dtype=object, keep_default_na=False)
+    elif suffix == ".jsonl":
+        yield from pd.read_json(file_path, lines=True, chunksize=chunk_size, dtype=False)
+    elif suffix == ".parquet":
+        yield from _read_parquet_chunks(file_path, chunk_size)
+    else:
+        raise ValueError(f"Unsupported file type: {suffix}")
+
+
+def _read_xlsx_chunks(file_path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    # Opened as a file object: openpyxl rejects paths without an .xlsx extension,
+    # and stored uploads have none
+    with open(file_path, "rb") as stream:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [str(name).strip() if name is not None else f"column_{i}" for i, name in enumerate(header)]
+            width = len(columns)
+            buffer = []
+            for row in rows:
+                if all(value is None for value in row):
+                    continue
+                buffer.append(tuple(row[:width]) + (None,) * (width - len(row)))
+                if len(buffer) >= chunk_size:
+                    yield pd.DataFrame.from_records(buffer, columns=columns)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame.from_records(buffer, columns=columns)
+        finally:
+            workbook.close()
+
+
+def _read_parquet_chunks(file_path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ValueError("Parquet import requires pyarrow") from e
+
+    for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size):
+        yield batch.to_pandas()
+
+
+# ---------- Column mapping ----------
+
+def _text(df: pd.DataFrame, column: str, default: Optional[str] = "") -> pd.Series:
+    """A column as stripped strings; missing cells and columns become default."""
+    if column not in df.columns:
+        return pd.Series([default] * len(df), index=df.index, dtype=object)
+    values = df[column]
+    text = values.astype(str).str.strip()
+    return text.where(values.notna() & (text != ""), default)
+
+
+def _map_requirements(df: pd.DataFrame, source_file: str) -> pd.DataFrame:
+    return pd.DataFrame({
+        "external_key": _text(df, "external_key", None),
+        "title": _text(df, "title"),
+        "full_content": _text(df, "description"),
+        "source_type": "excel",
+        "source_file": source_file,
+    })
+
+
+def _map_testcases(df: pd.DataFrame, source_file: str) -> pd.DataFrame:
+    return pd.DataFrame({
+        "external_key": _text(df, "external_key", None),
+        "title": _text(df, "title"),
+        "precondition": _text(df, "precondition", None),
+        # Imported steps are kept as one free-text step
+        "steps": _text(df, "steps").map(lambda steps: json.dumps([steps], ensure_ascii=False)),
+        "expected": _text(df, "expected"),
+        "status": sql_models.TestCaseStatusEnum.DRAFT,
+    })
+
+
+def _map_defects(df: pd.DataFrame, source_file: str) -> pd.DataFrame:
+    return pd.DataFrame({
+        "defect_id": _text(df, "defect_id", None),
+        "title": _text(df, "title"),
+        "phenomenon": _text(df, "phenomenon", None),
+        "root_cause": _text(df, "root_cause", None),
+        "severity": _text(df, "severity", None),
+        "status": _text(df, "status", None),
+    })
+
+
+def content_hashes(rows: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """sha256 over the content columns of each row, to skip unchanged rows on re-import."""
+    joined = rows[columns].fillna("").astype(str).agg("\x1f".join, axis=1)
+    return joined.map(lambda content: hashlib.sha256(content.encode("utf-8")).hexdigest())
+
+
+class Importer(NamedTuple):
+    model: Any
+    mapper: Callable[[pd.DataFrame, str], pd.DataFrame]
+    required: List[str]
+    # Natural key matched in upsert mode
+    key: str
+    # Columns hashed and overwritten when a row changes; status and created_by are kept
+    content: List[str]
+
+
+IMPORTERS: Dict[str, Importer] = {
+    "requirements": Importer(
+        sql_models.RequirementRaw, _map_requirements, ["title"],
+        "external_key", ["title", "full_content"]
+    ),
+    "testcases": Importer(
+        sql_models.TestCase, _map_testcases, ["title"],
+        "external_key", ["title", "precondition", "steps", "expected"]
+    ),
+    "defects": Importer(
+        sql_models.Defect, _map_defects, ["title"],
+        "defect_id", ["title", "phenomenon", "root_cause", "severity", "status"]
+    ),
+}
+IMPORT_MODES = ("insert", "upsert")
 
 
 class DataImportService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, batch_size: Optional[int] = None):
         self.db = db
+        self.batch_size = batch_size or settings.import_batch_size
 
     def import_from_excel(self, file_path: str, data_type: str) -> Dict[str, Any]:
-        """Import data from Excel file."""
+        """Import data from an Excel (or CSV/JSONL/Parquet) file."""
+        return self.import_file(file_path, data_type)
+
+    def import_file(self, file_path: str, data_type: str, mode: str = "insert",
+                    source_file: Optional[str] = None, suffix: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stream a file into the table of data_type.
+        Rows are committed batch by batch; rows that fail are listed in the error report.
+        source_file is recorded on the rows (default: the file's name); suffix selects the
+        format (default: the file's extension, which stored uploads do not have).
+
+        mode "insert" adds every row. mode "upsert" matches rows on the natural key
+        (external_key, or defect_id for defects): new keys are inserted, rows whose
+        content hash changed are updated and unchanged rows are skipped.
+        """
+        if data_type not in IMPORTERS:
+            return {"status": "failed", "error": f"Unsupported: {data_type}", "imported": 0}
+        if mode not in IMPORT_MODES:
+            return {"status": "failed", "error": f"Unsupported mode: {mode}", "imported": 0}
+        importer = IMPORTERS[data_type]
+        upsert = mode == "upsert"
+        required = importer.required + [importer.key] if upsert else importer.required
+        source_file = source_file or Path(file_path).name
+
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        errors: List[Dict[str, Any]] = []
+        row_offset = 0
+        error = None
         try:
-            df = pd.read_excel(file_path)
-            if data_type == "requirements":
-                return self._import_requirements(df)
-            elif data_type == "testcases":
-                return self._import_testcases(df)
-            elif data_type == "defects":
-                return self._import_defects(df)
-            else:
-                raise ValueError(f"Unsupported: {data_type}")
-        except Exception as e:
-            return {"status": "failed", "error": str(e), "imported": 0}
-
-    def _import_requirements(self, df: pd.DataFrame) -> Dict[str, Any]:
-        count = 0
-        for _, row in df.iterrows():
-            try:
-                req = sql_models.RequirementRaw(
-                    title=str(row.get('title', '')),
-                    full_content=str(row.get('description', '')),
-                    source_type='excel'
-                )
-                self.db.add(req)
-                count += 1
-            except Exception as e:
-                print(f"Failed: {e}")
-        self.db.commit()
-        return {"status": "success", "imported": count}
-
-    def _import_testcases(self, df: pd.DataFrame) -> Dict[str, Any]:
-        count = 0
-        for _, row in df.iterrows():
-            try:
-                steps = json.dumps([str(row.get('steps', ''))], ensure_ascii=False)
-                tc = sql_models.TestCase(
-                    title=str(row.get('title', '')),
-                    steps=steps,
-                    expected=str(row.get('expected', '')),
-                    status=sql_models.TestCaseStatusEnum.DRAFT
-                )
-                self.db.add(tc)
-                count += 1
-            except Exception as e:
-                print(f"Failed: {e}")
-        self.db.commit()
-        return {"status": "success", "imported": count}
-
-    def _import_defects(self, df: pd.DataFrame) -> Dict[str, Any]:
-        count = 0
-        for _, row in df.iterrows():
-            try:
-                defect = sql_models.Defect(
-                    defect_id=str(row.get('defect_id', f"DEF-{count}")),
-                    title=str(row.get('title', ''))
+            for chunk in read_chunks(file_path, self.batch_size, suffix):
+                chunk = chunk.reset_index(drop=True)
+                # Row numbers as shown in the spreadsheet: header is row 1
+                row_numbers = pd.RangeIndex(row_offset + 2, row_offset + 2 + len(chunk))
+                row_offset += len(chunk)
+
+                rows = importer.mapper(chunk, source_file)
+                rows["content_hash"] = content_hashes(rows, importer.content)
+                empty = pd.DataFrame({column: rows[column].isna() | (rows[column] == "") for column in required})
+                invalid = empty.any(axis=1)
+                errors.extend(
+                    {"row": int(row_numbers[i]), "error": f"Missing required field: {', '.join(empty.columns[empty.loc[i]])}"}
+                    for i in rows.index[invalid]
                 )
-                self.db.add(defect)
-                count += 1
-            except Exception as e:
-                print(f"Failed: {e}")
+                valid = rows[~invalid]
+                if upsert:
+                    # One statement cannot touch a key twice; the last row of the batch wins
+                    duplicated = valid[importer.key].duplicated(keep="last")
+                    errors.extend(
+                        {"row": int(row_numbers[i]), "error": f"Duplicate {importer.key} {valid.at[i, importer.key]}, later row kept"}
+                        for i in valid.index[duplicated]
+                    )
+                    valid = valid[~duplicated]
+                records = valid.astype(object).where(valid.notna(), None).to_dict("records")
+                batch = self._write_batch(importer, records, [int(row_numbers[i]) for i in valid.index], errors, upsert)
+                for name, count in batch.items():
+                    counts[name] += count
+        except Exception as e:
+            self.db.rollback()
+            error = str(e)
+
+        imported = counts["inserted"] + counts["updated"]
+        if error:
+            status = "failed"
+        elif not errors:
+            status = "success"
+        else:
+            status = "partial" if imported or counts["unchanged"] else "failed"
+        result = {
+            "status": status,
+            "mode": mode,
+            "imported": imported,
+            **counts,
+            "failed": len(errors),
+            "errors": errors[:MAX_REPORTED_ERRORS],
+            "error_report": self._write_error_report(file_path, errors),
+        }
+        if error:
+            result["error"] = error
+        return result
+
+    def _write_batch(self, importer: Importer, records: List[Dict[str, Any]], row_numbers: List[int],
+                     errors: List[Dict[str, Any]], upsert: bool) -> Dict[str, int]:
+        """Write one batch in one transaction; on failure retry row by row to isolate bad rows."""
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        if not records:
+            return counts
+        table = importer.model.__table__
+        existing: Dict[str, str] = {}
+        if upsert:
+            key_column = table.c[importer.key]
+            existing = dict(self.db.execute(
+                select(key_column, table.c.content_hash).where(key_column.in_([r[importer.key] for r in records]))
+            ).all())
+            changed = [
+                (record, row_number) for record, row_number in zip(records, row_numbers)
+                if existing.get(record[importer.key], "") != record["content_hash"]
+            ]
+            counts["unchanged"] = len(records) - len(changed)
+            records = [record for record, _ in changed]
+            row_numbers = [row_number for _, row_number in changed]
+            if not records:
+                self.db.commit()
+                return counts
+            statement = self._upsert_statement(importer)
+        else:
+            statement = insert(table)
+
+        try:
+            self.db.execute(statement, records)
+            written = records
+        except Exception:
+            self.db.rollback()
+            written = []
+            for record, row_number in zip(records, row_numbers):
+                try:
+                    with self.db.begin_nested():
+                        self.db.execute(statement, [record])
+                    written.append(record)
+                except Exception as e:
+                    errors.append({"row": row_number, "error": str(getattr(e, "orig", e))})
+
+        # Updates only touch content columns, which no rollup counts
+        inserted = [record for record in written if record.get(importer.key) not in existing]
+        if inserted:
+            rollups.record_inserted(self.db, importer.model, inserted)
         self.db.commit()
-        return {"status": "success", "imported": count}
+        counts["inserted"] = len(inserted)
+        counts["updated"] = len(written) - len(inserted)
+        return counts
+
+    def _upsert_statement(self, importer: Importer):
+        """INSERT that overwrites the content columns of an existing row with the same natural key."""
+        table = importer.model.__table__
+        update_columns = importer.content + ["content_hash"]
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert as dialect_insert
+            statement = dialect_insert(table)
+            values = {column: statement.inserted[column] for column in update_columns}
+        else:
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            statement = dialect_insert(table)
+            values = {column: statement.excluded[column] for column in update_columns}
+        if "updated_at" in table.c:
+            # ON DUPLICATE KEY UPDATE does not apply Python-side onupdate defaults
+            values["updated_at"] = datetime.utcnow()
+        if dialect == "mysql":
+            return statement.on_duplicate_key_update(values)
+        return statement.on_conflict_do_update(index_elements=[importer.key], set_=values)
+
+    @staticmethod
+    def _write_error_report(file_path: str, errors: List[Dict[str, Any]]) -> Optional[str]:
+        """Write all row errors next to the imported file; returns the report path."""
+        if not errors:
+            return None
+        report_path = Path(file_path).with_suffix(".errors.csv")
+        with open(report_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["row", "error"])
+            writer.writeheader()
+            writer.writerows(sorted(errors, key=lambda error: error["row"]))
+        return str(report_path)
@@ -1,13 +1,13 @@
 import json
 import uuid
 from typing import List, Dict
-from openai import OpenAI
 from app.core.config import settings
 from app.core.prompts import PromptTemplates
+from app.services.llm_client import get_llm_client
 
 class IntentService:
     def __init__(self):
-        self.openai_client = OpenAI(api_key=settings.openai_api_key)
+        self.llm_client = get_llm_client()
 
     def analyze(self, requirement_content: str) -> List[Dict]:
         """
@@ -16,9 +16,9 @@ class IntentService:
         """
         prompt = PromptTemplates.get_intent_analysis_prompt(requirement_content)
 
-        response = self.openai_client.chat.completions.create(
-            model=settings.openai_model,
-            messages=[{"role": "user", "content": prompt}],
+        response = self.llm_client.chat(
+            "intent",
+            [{"role": "user", "content": prompt}],
             response_format={"type": "json_object"},
             temperature=settings.llm_temperature
         )
@@ -0,0 +1,412 @@
+"""
+Durable job queue backed by a SQL table.
+
+Jobs survive API restarts and are executed by separate worker processes
+(scripts/worker.py). A claimed job holds a lease (visibility timeout) that the
+worker keeps extending while it runs; if the worker dies the lease expires and
+the job is delivered again. The number of running jobs per queue is capped
+across all workers by settings.queue_concurrency.
+"""
+import json
+import os
+import socket
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, create_engine, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.models import sql_models
+from app.models.sql_models import SessionLocal, JobStatusEnum, StatusEnum, engine_options
+
+if settings.job_queue_database_uri:
+    # Local stand-in storage (e.g. SQLite) kept apart from the main database
+    queue_engine = create_engine(settings.job_queue_database_uri, **engine_options(settings.job_queue_database_uri))
+    QueueSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=queue_engine)
+    sql_models.Job.__table__.create(bind=queue_engine, checkfirst=True)
+    sql_models.JobQueueLock.__table__.create(bind=queue_engine, checkfirst=True)
+else:
+    QueueSessionLocal = SessionLocal
+
+# job_type -> handler(**payload)
+JOB_HANDLERS: Dict[str, Callable[..., Any]] = {}
+
+
+def job_handler(job_type: str):
+    """Register a function as the handler of a job type."""
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+class JobQueue:
+    """Enqueue, claim, lease and finish jobs stored in the job_queue table."""
+
+    def enqueue(self, queue: str, job_type: str, payload: Dict[str, Any],
+                task_id: Optional[int] = None, db: Optional[Session] = None) -> sql_models.Job:
+        """
+        Add a job to a queue.
+        When db is given and the queue shares the main database, the job is added to
+        that session so it commits atomically with the caller's changes.
+        """
+        job = sql_models.Job(
+            queue=queue,
+            job_type=job_type,
+            payload=json.dumps(payload, ensure_ascii=False),
+            status=JobStatusEnum.QUEUED,
+            attempts=0,
+            max_attempts=settings.job_max_attempts,
+            task_id=task_id,
+            visible_at=datetime.utcnow()
+        )
+        if db is not None and not settings.job_queue_database_uri:
+            db.add(job)
+            db.flush()
+            return job
+
+        session = QueueSessionLocal()
+        try:
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+            session.expunge(job)
+            return job
+        finally:
+            session.close()
+
+    def active_job(self, task_id: int) -> Optional[sql_models.Job]:
+        """Return the queued or still-leased job of a GenerationTask, if any."""
+        Job = sql_models.Job
+        session = QueueSessionLocal()
+        try:
+            job = session.query(Job).filter(
+                Job.task_id == task_id,
+                or_(
+                    Job.status == JobStatusEnum.QUEUED,
+                    and_(Job.status == JobStatusEnum.RUNNING, Job.visible_at > datetime.utcnow())
+                )
+            ).order_by(Job.id.desc()).first()
+            if job is not None:
+                session.expunge(job)
+            return job
+        finally:
+            session.close()
+
+    def claim(self, queue: str, worker_id: str, visibility_timeout: Optional[int] = None) -> Optional[sql_models.Job]:
+        """
+        Lease the next available job of a queue, or return None.
+        Available jobs are queued jobs whose visible_at has passed and running jobs whose lease expired.
+        On a queue with a concurrency limit, the running count and the claim happen under the
+        queue's lock row, so concurrent workers cannot all see a free slot and overshoot.
+        """
+        timeout = visibility_timeout or settings.job_visibility_timeout_seconds
+        limit = settings.queue_concurrency.get(queue)
+        Job = sql_models.Job
+        session = QueueSessionLocal()
+        try:
+            if limit is not None:
+                self._lock_queue(session, queue)
+            now = datetime.utcnow()
+            if limit is not None:
+                running = session.query(func.count(Job.id)).filter(
+                    Job.queue == queue,
+                    Job.status == JobStatusEnum.RUNNING,
+                    Job.visible_at > now
+                ).scalar()
+                if running >= limit:
+                    return None
+
+            available = and_(
+                Job.queue == queue,
+                Job.visible_at <= now,
+                or_(Job.status == JobStatusEnum.QUEUED, Job.status == JobStatusEnum.RUNNING)
+            )
+            candidate = session.query(Job).filter(available).order_by(Job.id).with_for_update(
+                skip_locked=True
+            ).first()
+            if candidate is None:
+                session.rollback()
+                return None
+
+            if candidate.attempts >= candidate.max_attempts:
+                # The last attempt's lease expired without the worker reporting back
+                self._finish_failed(session, candidate, "Lease expired after the last attempt")
+                session.commit()
+                return None
+
+            # Compare-and-set so that a concurrent claimer cannot take the same job
+            # on databases without row locks (e.g. the SQLite stand-in)
+            result = session.execute(
+                update(Job).where(
+                    Job.id == candidate.id,
+                    Job.attempts == candidate.attempts,
+                    available
+                ).values(
+                    status=JobStatusEnum.RUNNING,
+                    attempts=Job.attempts + 1,
+                    locked_by=worker_id,
+                    started_at=now,
+                    visible_at=now + timedelta(seconds=timeout)
+                )
+            )
+            session.commit()
+            if result.rowcount != 1:
+                return None
+
+            job = session.query(Job).filter(Job.id == candidate.id).first()
+            session.expunge(job)
+            return job
+        finally:
+            session.close()
+
+    def _lock_queue(self, session: Session, queue: str):
+        """Lock the queue's row in job_queue_lock until the session's transaction ends."""
+        Lock = sql_models.JobQueueLock
+        if session.query(Lock).filter(Lock.queue == queue).with_for_update().first() is not None:
+            return
+        # First claim on this queue: create its row; a concurrent creator wins on the primary key
+        try:
+            session.add(Lock(queue=queue))
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+        session.query(Lock).filter(Lock.queue == queue).with_for_update().one()
+
+    def extend_lease(self, job_ids: List[int], worker_id: str, visibility_timeout: Optional[int] = None):
+        """Push the lease expiry of jobs still running on this worker."""
+        if not job_ids:
+            return
+        timeout = visibility_timeout or settings.job_visibility_timeout_seconds
+        Job = sql_models.Job
+        session = QueueSessionLocal()
+        try:
+            session.execute(
+                update(Job).where(
+                    Job.id.in_(job_ids),
+                    Job.locked_by == worker_id,
+                    Job.status == JobStatusEnum.RUNNING
+                ).values(visible_at=datetime.utcnow() + timedelta(seconds=timeout))
+            )
+            session.commit()
+        finally:
+            session.close()
+
+    def complete(self, job_id: int, worker_id: str):
+        Job = sql_models.Job
+        session = QueueSessionLocal()
+        try:
+            session.execute(
+                update(Job).where(Job.id == job_id, Job.locked_by == worker_id).values(
+                    status=JobStatusEnum.DONE,
+                    finished_at=datetime.utcnow(),
+                    last_error=None
+                )
+            )
+            session.commit()
+        finally:
+            session.close()
+
+    def fail(self, job_id: int, worker_id: str, error: str):
+        """Schedule a retry with linear backoff, or fail the job after its last attempt."""
+        Job = sql_models.Job
+        session = QueueSessionLocal()
+        try:
+            job = session.query(Job).filter(Job.id == job_id, Job.locked_by == worker_id).first()
+            if job is None:
+                return
+            if job.attempts < job.max_attempts:
+                job.status = JobStatusEnum.QUEUED
+                job.locked_by = None
+                job.last_error = error
+                job.visible_at = datetime.utcnow() + timedelta(
+                    seconds=settings.job_retry_delay_seconds * job.attempts
+                )
+                if job.task_id:
+                    self._update_task(job.task_id, StatusEnum.INIT, error)
+            else:
+                self._finish_failed(session, job, error)
+            session.commit()
+        finally:
+            session.close()
+
+    def _finish_failed(self, session: Session, job: sql_models.Job, error: str):
+        job.status = JobStatusEnum.FAILED
+        job.last_error = error
+        job.locked_by = None
+        job.finished_at = datetime.utcnow()
+        if job.task_id:
+            self._update_task(job.task_id, StatusEnum.FAILED, error)
+
+    def _update_task(self, task_id: int, status: StatusEnum, error: str):
+        """
+        Reflect job state on its GenerationTask: a retry puts the task back to INIT
+        (queued), a terminal failure marks it FAILED.
+        """
+        db = SessionLocal()
+        try:
+            task = db.query(sql_models.GenerationTask).filter(
+                sql_models.GenerationTask.id == task_id
+            ).first()
+            if task and task.status not in (StatusEnum.DONE, StatusEnum.FAILED,
+                                            StatusEnum.CANCELLED, StatusEnum.TIMED_OUT):
+                task.status = status
+                task.error_message = error
+                if status == StatusEnum.FAILED:
+                    task.finished_at = datetime.utcnow()
+                db.commit()
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, running/expired leases and terminal counts per queue."""
+        Job = sql_models.Job
+        session = QueueSessionLocal()
+        try:
+            now = datetime.utcnow()
+            queues: Dict[str, Dict[str, Any]] = {}
+
+            def entry(name: str) -> Dict[str, Any]:
+                return queues.setdefault(name, {
+                    "queue": name,
+                    "ready": 0,
+                    "delayed": 0,
+                    "running": 0,
+                    "expired_leases": 0,
+                    "done": 0,
+                    "failed": 0,
+                    "oldest_ready_age_seconds": 0,
+                    "concurrency_limit": settings.queue_concurrency.get(name)
+                })
+
+            rows = session.query(
+                Job.queue,
+                Job.status,
+                Job.visible_at <= now,
+                func.count(Job.id),
+                func.min(Job.created_at)
+            ).group_by(Job.queue, Job.status, Job.visible_at <= now).all()
+
+            for queue, status, visible, count, oldest in rows:
+                item = entry(queue)
+                if status == JobStatusEnum.QUEUED:
+                    if visible:
+                        item["ready"] += count
+                        item["oldest_ready_age_seconds"] = int((now - oldest).total_seconds()) if oldest else 0
+                    else:
+                        item["delayed"] += count
+                elif status == JobStatusEnum.RUNNING:
+                    item["expired_leases" if visible else "running"] += count
+                elif status == JobStatusEnum.DONE:
+                    item["done"] += count
+                elif status == JobStatusEnum.FAILED:
+                    item["failed"] += count
+
+            for name in settings.queue_concurrency:
+                entry(name)
+            return {"queues": sorted(queues.values(), key=lambda q: q["queue"])}
+        finally:
+            session.close()
+
+
+class Worker:
+    """
+    Polls queues and runs claimed jobs on per-queue thread pools.
+    queues maps queue name -> number of jobs this worker runs at once for that queue.
+    """
+
+    def __init__(self, queues: Dict[str, int], worker_id: Optional[str] = None,
+                 visibility_timeout: Optional[int] = None, poll_interval: Optional[float] = None):
+        self.queues = queues
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.visibility_timeout = visibility_timeout or settings.job_visibility_timeout_seconds
+        self.poll_interval = poll_interval or settings.job_poll_interval_seconds
+        self.job_queue = JobQueue()
+        self._pools = {name: ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"job-{name}")
+                       for name, size in queues.items()}
+        self._in_flight: Dict[str, set] = {name: set() for name in queues}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat_stop = threading.Event()
+
+    def run(self):
+        """Claim and dispatch jobs until stop() is called."""
+        heartbeat = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        heartbeat.start()
+        print(f"Worker {self.worker_id} started for queues: {self.queues}")
+        try:
+            while not self._stop.is_set():
+                claimed = False
+                for name, size in self.queues.items():
+                    with self._lock:
+                        free = size - len(self._in_flight[name])
+                    for _ in range(free):
+                        try:
+                            job = self.job_queue.claim(name, self.worker_id, self.visibility_timeout)
+                        except Exception as e:
+                            print(f"Worker {self.worker_id}: claim failed on queue {name}: {e}")
+                            job = None
+                        if job is None:
+                            break
+                        claimed = True
+                        with self._lock:
+                            self._in_flight[name].add(job.id)
+                        self._pools[name].submit(self._execute, name, job)
+                if not claimed:
+                    self._stop.wait(self.poll_interval)
+        finally:
+            # Keep extending leases until in-flight jobs have drained
+            for pool in self._pools.values():
+                pool.shutdown(wait=True)
+            self._heartbeat_stop.set()
+            print(f"Worker {self.worker_id} stopped.")
+
+    def stop(self):
+        self._stop.set()
+
+    def _execute(self, queue: str, job: sql_models.Job):
+        try:
+            handler = JOB_HANDLERS.get(job.job_type)
+            if handler is None:
+                raise ValueError(f"No handler registered for job type: {job.job_type}")
+            payload = json.loads(job.payload) if job.payload else {}
+            handler(**payload)
+            self.job_queue.complete(job.id, self.worker_id)
+        except Exception as e:
+            print(f"Job {job.id} ({job.job_type}) failed on attempt {job.attempts}: {e}")
+            traceback.print_exc()
+            try:
+                self.job_queue.fail(job.id, self.worker_id, str(e))
+            except Exception as report_error:
+                # The lease will expire and the job will be delivered again
+                print(f"Failed to report failure of job {job.id}: {report_error}")
+        finally:
+            with self._lock:
+                self._in_flight[queue].discard(job.id)
+
+    def _heartbeat_loop(self):
+        interval = max(self.visibility_timeout / 3, 1)
+        while not self._heartbeat_stop.wait(interval):
+            with self._lock:
+                job_ids = [job_id for ids in self._in_flight.values() for job_id in ids]
+            try:
+                self.job_queue.extend_lease(job_ids, self.worker_id, self.visibility_timeout)
+            except Exception as e:
+                print(f"Worker {self.worker_id}: heartbeat failed: {e}")
+
+
+_job_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    """Get or create JobQueue singleton."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+    return _job_queue
@@ -0,0 +1,65 @@
+"""
+Job handlers executed by the queue workers.
+Importing this module registers every handler with the job queue.
+"""
+from typing import List
+
+from app.models import sql_models
+from app.models.sql_models import SessionLocal, StatusEnum
+from app.core.dependencies import get_extraction_service
+from app.services.job_queue import job_handler
+from app.services.llm_client import llm_call_context
+from app.services.batch_generation_service import run_batch_generation
+from app.services.batch_extraction_service import run_batch_extraction
+from app.services.knowledge_feedback_service import KnowledgeFeedbackService
+
+GENERATION_QUEUE = "generation"
+EXTRACTION_QUEUE = "extraction"
+
+
+@job_handler("batch_generation")
+def batch_generation_job(task_id: int, requirement_id: int):
+    run_batch_generation(task_id, requirement_id)
+
+
+@job_handler("knowledge_extraction")
+def knowledge_extraction_job(requirement_id: int, knowledge_base_id: str, text: str):
+    """Extract knowledge for a requirement and record the outcome on its KnowledgeBase."""
+    db = SessionLocal()
+    try:
+        with llm_call_context(requirement_id=requirement_id):
+            get_extraction_service().extract_and_store(
+                requirement_id=str(requirement_id),
+                knowledge_base_id=knowledge_base_id,
+                text=text
+            )
+        db_kb = db.query(sql_models.KnowledgeBase).filter(sql_models.KnowledgeBase.id == knowledge_base_id).first()
+        if db_kb:
+            db_kb.status = StatusEnum.COMPLETED
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        db_kb = db.query(sql_models.KnowledgeBase).filter(sql_models.KnowledgeBase.id == knowledge_base_id).first()
+        if db_kb:
+            db_kb.status = StatusEnum.FAILED
+            db.commit()
+        print(f"Extraction failed for KB {knowledge_base_id}: {e}")
+        raise
+    finally:
+        db.close()
+
+
+@job_handler("batch_extraction")
+def batch_extraction_job(batch_id: int):
+    run_batch_extraction(batch_id)
+
+
+@job_handler("knowledge_feedback")
+def knowledge_feedback_job(case_ids: List[int]):
+    """Knowledge feedback for test cases confirmed together."""
+    db = SessionLocal()
+    try:
+        result = KnowledgeFeedbackService(db).feedback_confirmed_cases(case_ids)
+        print(f"Knowledge feedback: {result['success']} of {result['processed']} cases, {result['created']} new test points")
+    finally:
+        db.close()
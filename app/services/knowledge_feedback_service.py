@@ -1,9 +1,12 @@
 """Knowledge feedback service for knowledge base evolution."""
+from collections import Counter
 from sqlalchemy.orm import Session
 from typing import Dict, Any, List
 
 from app.models import sql_models
-from app.core.dependencies import get_milvus_service, get_graph_service
+from app.models.rollups import record_inserted
+from app.services.generation_writer import insert_returning_ids
+from app.services.outbox import add_knowledge_event
 
 
 class KnowledgeFeedbackService:
@@ -11,92 +14,116 @@ class KnowledgeFeedbackService:
 
     def __init__(self, db: Session):
         self.db = db
-        self.milvus_service = get_milvus_service()
-        self.graph_service = get_graph_service()
 
     def feedback_from_confirmed_testcase(self, testcase_id: int) -> Dict[str, Any]:
         """
         Extract knowledge from confirmed test case and add to knowledge base.
         This implements the knowledge feedback loop.
         """
-        testcase = self.db.query(sql_models.TestCase).filter(
-            sql_models.TestCase.id == testcase_id
-        ).first()
+        return self.feedback_confirmed_cases([testcase_id])["results"][testcase_id]
 
-        if not testcase or testcase.status != sql_models.TestCaseStatusEnum.CONFIRMED:
-            return {"status": "failed", "reason": "Test case not confirmed"}
-
-        # Check if test point already exists
-        if testcase.test_point_id:
-            test_point = self.db.query(sql_models.TestPoint).filter(
-                sql_models.TestPoint.id == testcase.test_point_id
-            ).first()
-            if test_point:
-                # Update confidence
-                test_point.confidence = min(1.0, float(test_point.confidence or 0.5) + 0.1)
-                self.db.commit()
-                return {
-                    "status": "updated",
-                    "test_point_id": test_point.id,
-                    "new_confidence": float(test_point.confidence)
-                }
-
-        # Create new test point from confirmed case
-        test_point = sql_models.TestPoint(
-            content=testcase.title,
-            type=sql_models.TestKnowledgeTypeEnum.TEST_POINT,
-            confidence=0.8,  # High confidence for human-confirmed cases
-            source="confirmed_case"
-        )
-        self.db.add(test_point)
-        self.db.commit()
-        self.db.refresh(test_point)
-
-        # Update testcase reference
-        testcase.test_point_id = test_point.id
+    def feedback_confirmed_cases(self, testcase_ids: List[int]) -> Dict[str, Any]:
+        """
+        Knowledge feedback for many confirmed test cases at once.
+        Cases linked to a test point raise its confidence; the others get a new test point.
+        Cases and test points are loaded in one query and written in one transaction together
+        with the outbox events that propagate new test points to Milvus and Neo4j.
+        """
+        testcase_ids = list(dict.fromkeys(testcase_ids))
+        rows = self.db.query(sql_models.TestCase, sql_models.TestPoint).outerjoin(
+            sql_models.TestPoint, sql_models.TestPoint.id == sql_models.TestCase.test_point_id
+        ).filter(
+            sql_models.TestCase.id.in_(testcase_ids)
+        ).with_for_update(of=sql_models.TestCase).all() if testcase_ids else []
+        found = {testcase.id: (testcase, test_point) for testcase, test_point in rows}
+
+        results: Dict[int, Dict[str, Any]] = {}
+        new_cases = []
+        confirmations = Counter()
+        for testcase_id in testcase_ids:
+            testcase, test_point = found.get(testcase_id, (None, None))
+            if not testcase or testcase.status != sql_models.TestCaseStatusEnum.CONFIRMED:
+                results[testcase_id] = {"status": "failed", "reason": "Test case not confirmed"}
+            elif test_point:
+                confirmations[test_point] += 1
+            else:
+                new_cases.append(testcase)
+
+        # Each confirmation raises the confidence of an existing test point
+        for test_point, count in confirmations.items():
+            test_point.confidence = min(1.0, float(test_point.confidence or 0.5) + 0.1 * count)
+        for testcase_id in testcase_ids:
+            if testcase_id not in results:
+                testcase, test_point = found[testcase_id]
+                if test_point:
+                    results[testcase_id] = {
+                        "status": "updated",
+                        "test_point_id": test_point.id,
+                        "new_confidence": float(test_point.confidence)
+                    }
+
+        # Create new test points from confirmed cases
+        test_point_rows = [
+            {
+                "content": testcase.title,
+                "type": sql_models.TestKnowledgeTypeEnum.TEST_POINT,
+                "confidence": 0.8,  # High confidence for human-confirmed cases
+                "source": "confirmed_case"
+            }
+            for testcase in new_cases
+        ]
+        test_point_ids = insert_returning_ids(self.db, sql_models.TestPoint, test_point_rows)
+        if test_point_rows:
+            record_inserted(self.db, sql_models.TestPoint, test_point_rows)
+        for testcase, test_point_id in zip(new_cases, test_point_ids):
+            testcase.test_point_id = test_point_id
+            results[testcase.id] = {
+                "status": "success",
+                "test_point_id": test_point_id,
+                "message": "Knowledge extracted from confirmed test case"
+            }
+            self._add_test_point_event(testcase, test_point_id)
         self.db.commit()
 
-        # Add to vector database
-        try:
-            self.milvus_service.upsert([{
-                "id": f"TP-{test_point.id}",
-                "content": test_point.content,
-                "type": test_point.type.value,
-                "graph_id": f"TP-{test_point.id}",
-                "knowledge_base_id": "feedback",
-                "confidence": float(test_point.confidence)
-            }])
-        except Exception as e:
-            print(f"Failed to add to Milvus: {e}")
-
-        # Add to graph database
-        try:
-            self.graph_service.add_node("TestPoint", {
-                "id": f"TP-{test_point.id}",
-                "content": test_point.content,
-                "type": test_point.type.value,
-                "confidence": float(test_point.confidence)
-            })
-
-            # Create relationship with test case
-            self.graph_service.add_node("TestCase", {
-                "id": f"TC-{testcase.id}",
-                "title": testcase.title
-            })
-            self.graph_service.add_relationship(
-                "TestPoint", f"TP-{test_point.id}",
-                "TestCase", f"TC-{testcase.id}",
-                "COVERED_BY"
-            )
-        except Exception as e:
-            print(f"Failed to add to Neo4j: {e}")
-
+        success = sum(1 for result in results.values() if result["status"] in ["success", "updated"])
         return {
-            "status": "success",
-            "test_point_id": test_point.id,
-            "message": "Knowledge extracted from confirmed test case"
+            "processed": len(testcase_ids),
+            "success": success,
+            "failed": len(testcase_ids) - success,
+            "created": len(new_cases),
+            "results": results
         }
 
+    def _add_test_point_event(self, testcase: sql_models.TestCase, test_point_id: int):
+        """Queue the vector and graph writes of a test point created from a confirmed case."""
+        graph_id = f"TP-{test_point_id}"
+        add_knowledge_event(
+            self.db, "test_point", test_point_id,
+            vectors=[{
+                "id": graph_id,
+                "content": testcase.title,
+                "type": sql_models.TestKnowledgeTypeEnum.TEST_POINT.value,
+                "graph_id": graph_id,
+                "knowledge_base_id": "feedback",
+                "confidence": 0.8
+            }],
+            nodes=[
+                {"label": "TestPoint", "properties": {
+                    "id": graph_id,
+                    "content": testcase.title,
+                    "type": sql_models.TestKnowledgeTypeEnum.TEST_POINT.value,
+                    "confidence": 0.8
+                }},
+                # Create relationship with test case
+                {"label": "TestCase", "properties": {"id": f"TC-{testcase.id}", "title": testcase.title}},
+            ],
+            relationships=[{
+                "start_label": "TestPoint", "start_id": graph_id,
+                "end_label": "TestCase", "end_id": f"TC-{testcase.id}",
+                "type": "COVERED_BY"
+            }]
+        )
+
     def feedback_from_defect(self, defect_id: int) -> Dict[str, Any]:
         """
         Extract risk point from defect and add to knowledge base.
@@ -120,39 +147,38 @@ class KnowledgeFeedbackService:
             source="defect"
         )
         self.db.add(risk_point)
-        self.db.commit()
-        self.db.refresh(risk_point)
-
-        # Add to vector and graph databases
-        try:
-            self.milvus_service.upsert([{
+        self.db.flush()
+
+        # Add to vector and graph databases, committed together with the risk point
+        nodes = [{"label": "TestPoint", "properties": {
+            "id": f"RISK-{risk_point.id}",
+            "content": risk_point.content,
+            "type": "Risk",
+            "confidence": 0.9
+        }}]
+        relationships = []
+        if defect.defect_id:
+            # Link to defect
+            nodes.append({"label": "Defect", "properties": {"id": defect.defect_id, "title": defect.title}})
+            relationships.append({
+                "start_label": "TestPoint", "start_id": f"RISK-{risk_point.id}",
+                "end_label": "Defect", "end_id": defect.defect_id,
+                "type": "TRIGGERED"
+            })
+        add_knowledge_event(
+            self.db, "test_point", risk_point.id,
+            vectors=[{
                 "id": f"RISK-{risk_point.id}",
                 "content": risk_point.content,
                 "type": "Risk",
                 "graph_id": f"RISK-{risk_point.id}",
                 "knowledge_base_id": "defect_feedback",
                 "confidence": 0.9
-            }])
-
-            self.graph_service.add_node("TestPoint", {
-                "id": f"RISK-{risk_point.id}",
-                "content": risk_point.content,
-                "type": "Risk",
-                "confidence": 0.9
-            })
-
-            # Link to defect
-            self.graph_service.add_node("Defect", {
-                "id": defect.defect_id,
-                "title": defect.title
-            })
-            self.graph_service.add_relationship(
-                "TestPoint", f"RISK-{risk_point.id}",
-                "Defect", defect.defect_id,
-                "TRIGGERED"
-            )
-        except Exception as e:
-            print(f"Failed to add to vector/graph DB: {e}")
+            }],
+            nodes=nodes,
+            relationships=relationships
+        )
+        self.db.commit()
 
         return {
             "status": "success",
@@ -164,23 +190,16 @@ class KnowledgeFeedbackService:
         """
         Batch process confirmed test cases for knowledge feedback.
         """
-        confirmed_cases = self.db.query(sql_models.TestCase).filter(
-            sql_models.TestCase.status == sql_models.TestCaseStatusEnum.CONFIRMED,
-            sql_models.TestCase.test_point_id == None
-        ).limit(limit).all()
-
-        success_count = 0
-        failed_count = 0
-
-        for case in confirmed_cases:
-            result = self.feedback_from_confirmed_testcase(case.id)
-            if result.get("status") in ["success", "updated"]:
-                success_count += 1
-            else:
-                failed_count += 1
-
+        case_ids = [
+            case_id for (case_id,) in self.db.query(sql_models.TestCase.id).filter(
+                sql_models.TestCase.status == sql_models.TestCaseStatusEnum.CONFIRMED,
+                sql_models.TestCase.test_point_id == None
+            ).limit(limit).all()
+        ]
+
+        result = self.feedback_confirmed_cases(case_ids)
         return {
-            "processed": success_count + failed_count,
-            "success": success_count,
-            "failed": failed_count
+            "processed": result["processed"],
+            "success": result["success"],
+            "failed": result["failed"]
         }
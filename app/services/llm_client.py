@@ -0,0 +1,100 @@
+"""
+LLM client with per-call usage accounting.
+Every chat completion and embedding call goes through LLMClient and is recorded
+in llm_call_log with its call-site label, token usage and latency.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from openai import OpenAI
+
+from app.core.config import settings
+from app.core.llm_usage import extract_usage
+from app.models import sql_models
+from app.models.sql_models import SessionLocal
+
+# Task/requirement the current calls are made for; set by llm_call_context
+_call_context: ContextVar[Dict[str, Optional[int]]] = ContextVar("llm_call_context", default={})
+
+
+@contextmanager
+def llm_call_context(task_id: Optional[int] = None, requirement_id: Optional[int] = None):
+    """Attribute all LLM and embedding calls made inside the block to a task and requirement."""
+    token = _call_context.set({"task_id": task_id, "requirement_id": requirement_id})
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+class LLMClient:
+    def __init__(self):
+        self.openai_client = OpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url or None
+        )
+
+    def chat(self, call_site: str, messages: List[Dict[str, str]], **kwargs) -> Any:
+        """
+        Create a chat completion and record its usage under call_site.
+        Extra kwargs are passed to chat.completions.create; model defaults to settings.openai_model.
+        """
+        kwargs.setdefault("model", settings.openai_model)
+        start = time.perf_counter()
+        try:
+            response = self.openai_client.chat.completions.create(messages=messages, **kwargs)
+        except Exception:
+            self._record(call_site, "chat", kwargs["model"], None, start, success=False)
+            raise
+        self._record(call_site, "chat", kwargs["model"], response, start)
+        return response
+
+    def embed(self, call_site: str, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """Embed a list of texts in one request and record its usage under call_site."""
+        model = model or settings.openai_embedding_model
+        start = time.perf_counter()
+        try:
+            response = self.openai_client.embeddings.create(input=texts, model=model)
+        except Exception:
+            self._record(call_site, "embedding", model, None, start, success=False)
+            raise
+        self._record(call_site, "embedding", model, response, start)
+        return [item.embedding for item in response.data]
+
+    def _record(self, call_site: str, kind: str, model: str, response: Any, start: float, success: bool = True):
+        usage = extract_usage(response)
+        context = _call_context.get()
+        # Use a separate session so accounting never interferes with the caller's transaction
+        db = SessionLocal()
+        try:
+            db.add(sql_models.LLMCallLog(
+                call_site=call_site,
+                kind=kind,
+                model=model,
+                prompt_tokens=usage["prompt_tokens"],
+                completion_tokens=usage["completion_tokens"],
+                cached_tokens=usage["cached_tokens"],
+                latency_ms=int((time.perf_counter() - start) * 1000),
+                success=success,
+                task_id=context.get("task_id"),
+                requirement_id=context.get("requirement_id")
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Warning: Failed to record LLM usage for {call_site}: {e}")
+        finally:
+            db.close()
+
+
+_llm_client = None
+
+
+def get_llm_client() -> LLMClient:
+    """Get or create LLMClient singleton."""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = LLMClient()
+    return _llm_client
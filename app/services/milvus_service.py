@@ -1,7 +1,6 @@
 import os
 import uuid
 from typing import List, Dict
-from openai import OpenAI
 from pymilvus import (
     connections,
     utility,
@@ -11,12 +10,16 @@ from pymilvus import (
     Collection,
 )
 from app.core.config import settings
+from app.services.llm_client import get_llm_client
+
+# Texts per embedding request when upserting
+EMBEDDING_BATCH_SIZE = 256
 
 class MilvusService:
     def __init__(self, alias="default"):
         self.alias = alias
         self.collection_name = "test_knowledge_vectors"
-        self.openai_client = OpenAI(api_key=settings.openai_api_key)
+        self.llm_client = get_llm_client()
         
         try:
             connections.connect(
@@ -58,12 +61,8 @@ class MilvusService:
         self.collection.load()
         print("Collection loaded into memory.")
 
-    def _get_embedding(self, text: str) -> List[float]:
-        response = self.openai_client.embeddings.create(
-            input=[text],
-            model=self.embedding_model
-        )
-        return response.data[0].embedding
+    def _get_embedding(self, text: str, call_site: str = "embedding") -> List[float]:
+        return self.llm_client.embed(call_site, [text])[0]
 
     def upsert(self, data: List[Dict]) -> Dict:
         if not data:
@@ -74,9 +73,14 @@ class MilvusService:
             "graph_id": [], "knowledge_base_id": [], "confidence": [],
         }
 
+        contents = [item["content"] for item in data]
+        for start in range(0, len(contents), EMBEDDING_BATCH_SIZE):
+            entities["embedding"].extend(
+                self.llm_client.embed("embedding.upsert", contents[start:start + EMBEDDING_BATCH_SIZE])
+            )
+
         for item in data:
             entities["id"].append(item.get("id", str(uuid.uuid4())))
-            entities["embedding"].append(self._get_embedding(item["content"]))
             entities["content"].append(item["content"])
             entities["type"].append(item["type"])
             entities["graph_id"].append(item["graph_id"])
@@ -84,7 +88,8 @@ class MilvusService:
             entities["confidence"].append(item.get("confidence", 1.0))
 
         try:
-            result = self.collection.insert([
+            # Upsert by primary key, so writing the same entities again (e.g. an outbox retry) does not duplicate them
+            result = self.collection.upsert([
                 entities["id"], entities["embedding"], entities["content"],
                 entities["type"], entities["graph_id"], entities["knowledge_base_id"],
                 entities["confidence"],
@@ -96,7 +101,7 @@ class MilvusService:
             raise
 
     def search(self, query_text: str, top_k: int = 10) -> List[Dict]:
-        query_embedding = self._get_embedding(query_text)
+        query_embedding = self._get_embedding(query_text, "embedding.search")
         
         search_params = {"metric_type": "COSINE", "params": {"ef": 10}}
         
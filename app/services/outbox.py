@@ -0,0 +1,194 @@
+"""
+Transactional outbox for propagating MySQL changes to Milvus and Neo4j.
+
+Services add an outbox_event in the same transaction as the domain change
+(add_knowledge_event), so the event is committed exactly when the change is and
+the request only pays for that commit. OutboxRelay drains pending events in id
+order and applies a whole batch at once: one Milvus upsert for all vectors and
+one UNWIND query per node label and relationship type. Milvus upserts and Neo4j
+MERGEs are idempotent, so an event may safely be applied more than once.
+
+A failed event is retried with exponential backoff and later events of the
+same entity wait behind it, which keeps every entity's events in order. Only
+one relay drains at a time (a MySQL named lock), so the order holds across
+worker processes. Events still failing after outbox_max_attempts are marked
+failed and no longer block their entity.
+"""
+import json
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import sql_models
+from app.models.sql_models import SessionLocal, StatusEnum, engine
+
+KNOWLEDGE_SYNC = "knowledge.sync"
+LOCK_NAME = "knowledge_core_outbox_relay"
+MAX_RETRY_DELAY_SECONDS = 3600
+
+
+def add_knowledge_event(db: Session, aggregate_type: str, aggregate_id: Any,
+                        vectors: Optional[List[Dict[str, Any]]] = None,
+                        nodes: Optional[List[Dict[str, Any]]] = None,
+                        relationships: Optional[List[Dict[str, Any]]] = None) -> sql_models.OutboxEvent:
+    """
+    Record Milvus rows, graph nodes ({"label", "properties"}) and relationships
+    ({"start_label", "start_id", "end_label", "end_id", "type"}) to write for an entity.
+    The event is added to db and committed by the caller together with the change.
+    """
+    event = sql_models.OutboxEvent(
+        event_type=KNOWLEDGE_SYNC,
+        aggregate_type=aggregate_type,
+        aggregate_id=str(aggregate_id),
+        payload=json.dumps({
+            "vectors": vectors or [],
+            "nodes": nodes or [],
+            "relationships": relationships or [],
+        }, ensure_ascii=False),
+        status=StatusEnum.PENDING,
+        attempts=0
+    )
+    db.add(event)
+    return event
+
+
+def apply_knowledge_events(events: List[sql_models.OutboxEvent]):
+    """Write the vectors, nodes and relationships of the events, in event order."""
+    from app.core.dependencies import get_graph_service, get_milvus_service
+
+    vectors: Dict[str, Dict[str, Any]] = {}
+    nodes: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    relationships: Dict[Tuple[str, str, str], List[Tuple[str, str]]] = defaultdict(list)
+    for event in events:
+        payload = json.loads(event.payload)
+        for vector in payload["vectors"]:
+            # The latest version of a vector wins within the batch
+            vectors.pop(vector["id"], None)
+            vectors[vector["id"]] = vector
+        for node in payload["nodes"]:
+            nodes[node["label"]].append(node["properties"])
+        for rel in payload["relationships"]:
+            relationships[(rel["start_label"], rel["end_label"], rel["type"])].append((rel["start_id"], rel["end_id"]))
+
+    if vectors:
+        get_milvus_service().upsert(list(vectors.values()))
+    if nodes or relationships:
+        graph_service = get_graph_service()
+        for label, properties in nodes.items():
+            graph_service.add_nodes(label, properties)
+        for (start_label, end_label, relationship_type), pairs in relationships.items():
+            graph_service.add_relationships(start_label, end_label, relationship_type, pairs)
+
+
+class OutboxRelay:
+    """Drains the outbox into Milvus and Neo4j until stop() is called."""
+
+    def __init__(self, batch_size: Optional[int] = None, poll_interval: Optional[float] = None):
+        self.batch_size = batch_size or settings.outbox_batch_size
+        self.poll_interval = poll_interval or settings.outbox_poll_interval_seconds
+        self._stop = threading.Event()
+
+    def run(self):
+        print("Outbox relay started.")
+        while not self._stop.is_set():
+            try:
+                drained = self.drain_once()
+            except Exception as e:
+                print(f"Outbox relay: drain failed: {e}")
+                drained = 0
+            if drained < self.batch_size:
+                self._stop.wait(self.poll_interval)
+        print("Outbox relay stopped.")
+
+    def stop(self):
+        self._stop.set()
+
+    def drain_once(self) -> int:
+        """Apply one batch of due events; returns how many were attempted."""
+        with engine.connect() as lock_conn:
+            if lock_conn.dialect.name == "mysql":
+                if lock_conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": LOCK_NAME}).scalar() != 1:
+                    return 0
+            try:
+                return self._drain()
+            finally:
+                if lock_conn.dialect.name == "mysql":
+                    lock_conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+
+    def _drain(self) -> int:
+        Event = sql_models.OutboxEvent
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            # An entity with an event backing off holds back its later events
+            blocked = set(db.query(Event.aggregate_type, Event.aggregate_id).filter(
+                Event.status == StatusEnum.PENDING, Event.next_attempt_at > now
+            ).distinct().all())
+            due = [
+                event for event in db.query(Event).filter(
+                    Event.status == StatusEnum.PENDING,
+                    or_(Event.next_attempt_at.is_(None), Event.next_attempt_at <= now)
+                ).order_by(Event.id).limit(self.batch_size).all()
+                if (event.aggregate_type, event.aggregate_id) not in blocked
+            ]
+            if not due:
+                return 0
+
+            try:
+                apply_knowledge_events(due)
+                for event in due:
+                    self._mark_done(event)
+            except Exception as batch_error:
+                print(f"Outbox relay: batch of {len(due)} failed, retrying one by one: {batch_error}")
+                failed = set()
+                for event in due:
+                    key = (event.aggregate_type, event.aggregate_id)
+                    if key in failed:
+                        continue
+                    try:
+                        apply_knowledge_events([event])
+                        self._mark_done(event)
+                    except Exception as e:
+                        failed.add(key)
+                        self._mark_failed(event, str(e))
+            db.commit()
+            return len(due)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _mark_done(event: sql_models.OutboxEvent):
+        event.status = StatusEnum.DONE
+        event.attempts = (event.attempts or 0) + 1
+        event.processed_at = datetime.utcnow()
+        event.last_error = None
+
+    @staticmethod
+    def _mark_failed(event: sql_models.OutboxEvent, error: str):
+        event.attempts = (event.attempts or 0) + 1
+        event.last_error = error
+        if event.attempts >= settings.outbox_max_attempts:
+            event.status = StatusEnum.FAILED
+            print(f"Outbox relay: event {event.id} failed permanently: {error}")
+        else:
+            delay = min(settings.outbox_retry_delay_seconds * 2 ** (event.attempts - 1), MAX_RETRY_DELAY_SECONDS)
+            event.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+
+def outbox_stats(db: Session) -> Dict[str, Any]:
+    """Pending/failed event counts and the age of the oldest pending event."""
+    Event = sql_models.OutboxEvent
+    pending, oldest = db.query(func.count(Event.id), func.min(Event.created_at)).filter(
+        Event.status == StatusEnum.PENDING
+    ).one()
+    failed = db.query(func.count(Event.id)).filter(Event.status == StatusEnum.FAILED).scalar()
+    return {
+        "pending": pending,
+        "failed": failed,
+        "oldest_pending_age_seconds": int((datetime.utcnow() - oldest).total_seconds()) if oldest else 0,
+    }
@@ -0,0 +1,131 @@
+"""
+Local cache of parsed documents.
+
+Entries are keyed by (content SHA-256, parser version, parser) so the same
+bytes parse once however often, under whatever name or project they are
+uploaded, and bumping PARSER_VERSION invalidates every entry. Each entry is a
+gzipped JSON file under PARSE_CACHE_DIR written atomically, so the worker
+processes of the parse pool share one cache safely. When the cache grows past
+PARSE_CACHE_MAX_MB the least recently used entries are evicted (a hit refreshes
+an entry's mtime).
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+# Eviction brings the cache down to this fraction of its limit
+EVICT_TO = 0.8
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Size-bounded LRU cache of parse results on the local disk."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Bytes written by this process since the last scan; other processes write too,
+        # so the true size is only known after a scan
+        self._size: Optional[int] = None
+
+    @staticmethod
+    def key(content_hash: str, *parts: Any) -> str:
+        return hashlib.sha256(":".join([content_hash, *map(str, parts)]).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json.gz"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Truncated or corrupt entry
+            self._remove(path)
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=1) as f:
+                f.write(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += path.stat().st_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        entries = []
+        total = 0
+        for path in self.directory.glob("*/*.json.gz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        return entries, total
+
+    def _evict(self):
+        entries, total = self._scan()
+        target = self.max_bytes * EVICT_TO
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+        self._size = total
+
+    @staticmethod
+    def _remove(path: Path):
+        try:
+            path.unlink()
+        except OSError:
+            # Already gone, or the cache directory is unusable
+            pass
+
+
+_cache: Optional[ParseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> Optional[ParseCache]:
+    """The configured cache, or None when PARSE_CACHE_MAX_MB is 0."""
+    global _cache
+    if settings.parse_cache_max_mb <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ParseCache(settings.parse_cache_dir, settings.parse_cache_max_mb * 1024 * 1024)
+        return _cache
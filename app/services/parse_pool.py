@@ -0,0 +1,164 @@
+"""
+Document parsing in a bounded process pool.
+
+pypdf, python-docx and pandas hold the GIL for the whole document, so parsing
+inside a request blocks the event loop for every other request on the worker.
+parse_file() runs DocumentParser in a pool of PARSE_WORKERS processes (one per
+CPU by default) instead: the API keeps serving while files parse, and the files
+of one upload parse in parallel on all cores.
+
+Each worker caps its address space at PARSE_MEMORY_LIMIT_MB, so a pathological
+file fails with MemoryError instead of exhausting the host, and interrupts a
+parse after PARSE_TIMEOUT_SECONDS with SIGALRM. Where SIGALRM is missing
+(Windows) or a parse is stuck in C code, the caller gives up after a grace
+period and the pool is retired: new files go to a fresh pool, the other files
+already in the old one finish, and only then are its processes terminated
+(killing any single worker would break every parse in the pool).
+"""
+import asyncio
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Set
+
+from app.core.config import settings
+from app.services.parser import DocumentParser
+
+# Workers are replaced after this many files, returning memory fragmented by big documents
+MAX_TASKS_PER_WORKER = 100
+# Extra seconds the caller waits for a worker to report its own timeout
+TIMEOUT_GRACE_SECONDS = 10
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# Parses submitted to each live or retired pool and not finished yet
+_in_flight: Dict[ProcessPoolExecutor, Set[Future]] = {}
+
+
+class ParseTimeoutError(Exception):
+    """Raised when parsing a file takes longer than PARSE_TIMEOUT_SECONDS."""
+
+
+def _init_worker(memory_limit_mb: int):
+    if memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return
+    limit = memory_limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _on_timeout(signum, frame):
+    raise ParseTimeoutError(f"Parsing took longer than {settings.parse_timeout_seconds}s")
+
+
+def _parse(file_path: str, file_type: str, content_hash: Optional[str], timeout: int) -> Dict[str, Any]:
+    """Runs in a worker process."""
+    use_alarm = hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_timeout)
+        signal.alarm(timeout)
+    try:
+        return DocumentParser().parse_document(file_path, file_type, content_hash)
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the API process runs threads that may hold locks
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.parse_workers or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(settings.parse_memory_limit_mb,),
+                max_tasks_per_child=MAX_TASKS_PER_WORKER
+            )
+        return _pool
+
+
+def _submit(pool: ProcessPoolExecutor, *args) -> Future:
+    future = pool.submit(_parse, *args)
+    with _pool_lock:
+        _in_flight.setdefault(pool, set()).add(future)
+
+    def done(f: Future):
+        with _pool_lock:
+            _in_flight.get(pool, set()).discard(f)
+    future.add_done_callback(done)
+    return future
+
+
+def _terminate(pool: ProcessPoolExecutor):
+    with _pool_lock:
+        _in_flight.pop(pool, None)
+    # The executor has no public way to stop a running task
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Replace a broken pool; its futures have already failed."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    _terminate(pool)
+
+
+def _retire_pool(pool: ProcessPoolExecutor, stuck: Future):
+    """
+    Replace a pool with a stuck worker. The pool's other parses still finish (each is
+    bounded by its own timeout), then its processes, the stuck one included, are terminated.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+        others = _in_flight.get(pool, set()) - {stuck}
+
+    def drain():
+        wait_futures(others, timeout=settings.parse_timeout_seconds + TIMEOUT_GRACE_SECONDS)
+        _terminate(pool)
+    threading.Thread(target=drain, name="parse-pool-retire", daemon=True).start()
+
+
+async def parse_file(file_path: str, file_type: str, content_hash: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Parse a file (file_type as accepted by DocumentParser.parse) in the process pool into
+    {"text", "chunks"} (see DocumentParser.parse_document). Documents parsed before
+    return from the parse cache.
+    """
+    pool = _get_pool()
+    future = _submit(pool, file_path, file_type, content_hash, settings.parse_timeout_seconds)
+    try:
+        return await asyncio.wait_for(
+            asyncio.wrap_future(future), settings.parse_timeout_seconds + TIMEOUT_GRACE_SECONDS
+        )
+    except asyncio.TimeoutError:
+        _retire_pool(pool, future)
+        raise ParseTimeoutError(f"Parsing took longer than {settings.parse_timeout_seconds}s")
+    except BrokenProcessPool:
+        # A worker died, e.g. killed by the OOM killer
+        _discard_pool(pool)
+        raise Exception("Parser process terminated unexpectedly")
+
+
+def shutdown_parse_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+        _in_flight.pop(pool, None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
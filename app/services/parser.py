@@ -1,10 +1,22 @@
 import io
+import re
+import zipfile
 import magic
 import docx
+from docx.table import Table
+from docx.text.paragraph import Paragraph
 from pypdf import PdfReader
 from fastapi import UploadFile
 import pandas as pd
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.chunker import HEADING, PARAGRAPH, TABLE, Block, chunk_blocks, text_blocks
+from app.services.parse_cache import file_sha256, get_parse_cache
+
+# Bump when the output of any parse method changes; invalidates cached results
+PARSER_VERSION = 2
 
 class UnsupportedContentTypeError(Exception):
     """Exception raised for unsupported file types."""
@@ -47,12 +59,60 @@ async def parse_document(file: UploadFile) -> str:
         raise UnsupportedContentTypeError(mime_type)
 
 
+def _word_heading_level(style_name: str) -> int:
+    """Outline level of a Word paragraph style (Heading 1 / 标题 1 / Title), 0 for body text."""
+    if style_name == "Title":
+        return 1
+    match = re.match(r"(?:Heading|标题)\s*(\d)", style_name)
+    return int(match.group(1)) if match else 0
+
+
+def _unique_columns(header) -> List[str]:
+    """Column names of a header row; blank names become "Unnamed: i" and repeats get ".1", ".2"."""
+    columns = []
+    seen = {}
+    for i, name in enumerate(header):
+        column = str(name).strip() if name is not None and str(name).strip() else f"Unnamed: {i}"
+        if column in seen:
+            seen[column] += 1
+            column = f"{column}.{seen[column]}"
+        else:
+            seen[column] = 0
+        columns.append(column)
+    return columns
+
+
+def _trim_row(row) -> tuple:
+    """A worksheet row without its trailing empty cells; () for a blank row."""
+    row = tuple(row)
+    end = len(row)
+    while end and (row[end - 1] is None or row[end - 1] == ""):
+        end -= 1
+    return row[:end]
+
+
+def _cell_text(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _table_lines(columns: List[str], rows: Iterable[tuple]) -> List[str]:
+    """Rows as " | " lines under a header and separator line; no lines for a sheet without rows."""
+    lines = [" | ".join(map(_cell_text, row)) for row in rows]
+    if not lines:
+        return []
+    headers = " | ".join(columns)
+    return [headers, "-" * len(headers)] + lines
+
+
 class DocumentParser:
     """
     Document parser for various file formats.
     Supports Word, PDF, Excel, and text files.
     """
 
+    def __init__(self, use_cache: bool = True):
+        self.cache = get_parse_cache() if use_cache else None
+
     def parse_word(self, file_path: str) -> str:
         """Parse Word document (.docx) and extract text content."""
         try:
@@ -87,39 +147,64 @@ class DocumentParser:
         except Exception as e:
             raise Exception(f"Failed to parse PDF document: {str(e)}")
 
-    def parse_excel(self, file_path: str) -> str:
-        """Parse Excel file and extract content as text."""
-        try:
-            # Read all sheets
-            excel_file = pd.ExcelFile(file_path)
-            content = []
-
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
-
-                # Add sheet name
-                content.append(f"\n=== Sheet: {sheet_name} ===")
-
-                # Convert dataframe to text representation
-                # Remove rows that are all NaN
+    def _iter_excel(self, file_path: str) -> Iterator[Tuple[str, List[str], Iterator[tuple]]]:
+        """
+        (sheet name, columns, rows) for every sheet of a workbook, all from a single read.
+        Blank rows are skipped (leading ones included, so the header is the first row with
+        data), and the header is widened with "Unnamed: i" columns to the widest row, like
+        pd.read_excel. One sheet's rows are held at a time to find that width.
+        """
+        # Told apart by content, not extension: stored uploads have no extension
+        if not zipfile.is_zipfile(file_path):
+            # Legacy .xls has no streaming reader; all sheets still come from one read
+            for name, df in pd.read_excel(file_path, sheet_name=None, dtype=object).items():
                 df = df.dropna(how='all')
+                yield name, [str(col) for col in df.columns], df.where(df.notna(), None).itertuples(index=False, name=None)
+            return
 
-                # Convert to string representation
-                if not df.empty:
-                    # Get column headers
-                    headers = " | ".join([str(col) for col in df.columns])
-                    content.append(headers)
-                    content.append("-" * len(headers))
+        from openpyxl import load_workbook
 
-                    # Get row data
-                    for _, row in df.iterrows():
-                        row_text = " | ".join([str(val) if pd.notna(val) else "" for val in row])
-                        content.append(row_text)
+        # A file object, since openpyxl rejects paths without an .xlsx extension
+        with open(file_path, "rb") as stream:
+            workbook = load_workbook(stream, read_only=True, data_only=True)
+            try:
+                for worksheet in workbook.worksheets:
+                    # <dimension> is optional and often wrong in files from other writers; without
+                    # it every row is read up to its own last cell instead of being cut to the range
+                    worksheet.reset_dimensions()
+                    rows = [row for row in map(_trim_row, worksheet.iter_rows(values_only=True)) if row]
+                    if not rows:
+                        yield worksheet.title, [], iter(())
+                        continue
+                    width = max(map(len, rows))
+                    header = rows[0] + (None,) * (width - len(rows[0]))
+                    yield worksheet.title, _unique_columns(header), (
+                        row + (None,) * (width - len(row)) for row in rows[1:]
+                    )
+            finally:
+                workbook.close()
 
+    def parse_excel(self, file_path: str) -> str:
+        """Parse Excel file and extract content as text."""
+        try:
+            content = []
+            for name, columns, rows in self._iter_excel(file_path):
+                content.append(f"\n=== Sheet: {name} ===")
+                content.extend(_table_lines(columns, rows))
             return "\n".join(content)
         except Exception as e:
             raise Exception(f"Failed to parse Excel file: {str(e)}")
 
+    def excel_blocks(self, file_path: str) -> List[Block]:
+        """One heading and one table block per sheet."""
+        blocks = []
+        for name, columns, rows in self._iter_excel(file_path):
+            blocks.append(Block(HEADING, f"=== Sheet: {name} ===", 1))
+            lines = _table_lines(columns, rows)
+            if lines:
+                blocks.append(Block(TABLE, "\n".join(lines)))
+        return blocks
+
     def parse_text(self, file_path: str) -> str:
         """Parse plain text file."""
         try:
@@ -132,19 +217,37 @@ class DocumentParser:
         except Exception as e:
             raise Exception(f"Failed to parse text file: {str(e)}")
 
-    def parse(self, file_path: str, file_type: str = None) -> str:
-        """
-        Auto-detect and parse document based on file extension or specified type.
-
-        Args:
-            file_path: Path to the file
-            file_type: Optional file type hint (word, pdf, excel, text)
+    def word_blocks(self, file_path: str) -> List[Block]:
+        """Paragraphs and tables of a Word document in document order, headings by style."""
+        document = docx.Document(file_path)
+        blocks = []
+        for element in document.element.body.iterchildren():
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "p":
+                para = Paragraph(element, document)
+                text = para.text.strip()
+                if text:
+                    level = _word_heading_level(para.style.name if para.style is not None else "")
+                    blocks.append(Block(HEADING if level else PARAGRAPH, text, level))
+            elif tag == "tbl":
+                rows = []
+                for row in Table(element, document).rows:
+                    row_text = [cell.text.strip() for cell in row.cells if cell.text.strip()]
+                    if row_text:
+                        rows.append(" | ".join(row_text))
+                if rows:
+                    blocks.append(Block(TABLE, "\n".join(rows)))
+        return blocks
 
-        Returns:
-            Extracted text content
-        """
-        path = Path(file_path)
+    def pdf_blocks(self, file_path: str) -> List[Block]:
+        """Blocks of a PDF document, each with its page number."""
+        blocks = []
+        for number, page in enumerate(PdfReader(file_path).pages, start=1):
+            blocks.extend(text_blocks(page.extract_text() or "", page=number))
+        return blocks
 
+    def _resolve(self, file_path: str, file_type: str = None):
+        """The parse method for a file type hint, or for the file extension."""
         if file_type:
             type_map = {
                 'word': self.parse_word,
@@ -159,18 +262,102 @@ class DocumentParser:
             }
             parser_func = type_map.get(file_type.lower())
             if parser_func:
-                return parser_func(file_path)
+                return parser_func
 
         # Auto-detect from extension
-        ext = path.suffix.lower()
+        ext = Path(file_path).suffix.lower()
         if ext in ['.docx', '.doc']:
-            return self.parse_word(file_path)
+            return self.parse_word
         elif ext == '.pdf':
-            return self.parse_pdf(file_path)
+            return self.parse_pdf
         elif ext in ['.xlsx', '.xls']:
-            return self.parse_excel(file_path)
+            return self.parse_excel
         elif ext in ['.txt', '.md']:
-            return self.parse_text(file_path)
+            return self.parse_text
         else:
             raise UnsupportedContentTypeError(f"Unsupported file extension: {ext}")
 
+    def parse(self, file_path: str, file_type: str = None, content_hash: str = None) -> str:
+        """
+        Auto-detect and parse document based on file extension or specified type.
+        Results are cached by file content, so identical documents parse once.
+
+        Args:
+            file_path: Path to the file
+            file_type: Optional file type hint (word, pdf, excel, text)
+            content_hash: Optional SHA-256 of the file, saves hashing it again
+
+        Returns:
+            Extracted text content
+        """
+        parser_func = self._resolve(file_path, file_type)
+        return self._cached(
+            lambda: {"text": parser_func(file_path)},
+            file_path, content_hash, parser_func.__name__
+        )["text"]
+
+    def parse_chunks(self, file_path: str, file_type: str = None, content_hash: str = None,
+                     max_chars: int = None) -> List[Dict[str, Any]]:
+        """
+        Parse a document into structure-aware chunks (see app.services.chunker): sections
+        stay together, tables split between rows, and each chunk keeps its heading path
+        and page range. Cached like parse().
+        """
+        max_chars = max_chars or settings.chunk_max_chars
+        parser_func = self._resolve(file_path, file_type)
+        blocks_func = self._blocks_func(parser_func) or (lambda path: text_blocks(parser_func(path)))
+        return self._cached(
+            lambda: {"chunks": chunk_blocks(blocks_func(file_path), max_chars)},
+            file_path, content_hash, parser_func.__name__, "chunks", max_chars
+        )["chunks"]
+
+    def parse_document(self, file_path: str, file_type: str = None, content_hash: str = None) -> Dict[str, Any]:
+        """
+        Text and structured chunks (as parse_chunks()) of a document from a single parse,
+        cached as one entry. For Word, PDF and Excel the text is the document's blocks in
+        document order (Word tables stay in place rather than following the paragraphs as
+        in parse()); plain text is returned as read.
+        """
+        max_chars = settings.chunk_max_chars
+        parser_func = self._resolve(file_path, file_type)
+        blocks_func = self._blocks_func(parser_func)
+
+        def compute() -> Dict[str, Any]:
+            if blocks_func is None:
+                text = parser_func(file_path)
+                blocks = text_blocks(text)
+            else:
+                blocks = blocks_func(file_path)
+                text = "\n".join(block.text for block in blocks)
+            return {"text": text, "chunks": chunk_blocks(blocks, max_chars)}
+
+        return self._cached(compute, file_path, content_hash, parser_func.__name__, "document", max_chars)
+
+    def _blocks_func(self, parser_func) -> Optional[Callable[[str], List[Block]]]:
+        """The structured block reader for a parse method; None for plain text."""
+        return {
+            "parse_word": self.word_blocks,
+            "parse_pdf": self.pdf_blocks,
+            "parse_excel": self.excel_blocks
+        }.get(parser_func.__name__)
+
+    def _cached(self, compute: Callable[[], Dict[str, Any]], file_path: str, content_hash: str, *options) -> Dict[str, Any]:
+        """Cached result of compute(); the cache never turns a good parse into an error."""
+        if self.cache is None:
+            return compute()
+        try:
+            key = self.cache.key(content_hash or file_sha256(file_path), PARSER_VERSION, *options)
+            cached = self.cache.get(key)
+        except OSError as e:
+            # Unreadable file (the parser reports it) or unusable cache directory
+            print(f"Parse cache skipped for {file_path}: {e}")
+            return compute()
+        if cached is not None:
+            return cached
+        value = compute()
+        try:
+            self.cache.put(key, value)
+        except OSError as e:
+            # Disk full, read-only or missing cache directory
+            print(f"Parse cache write failed for {file_path}: {e}")
+        return value
@@ -1,10 +1,11 @@
 """Statistics and analytics service."""
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import Dict, Any
+from sqlalchemy import func, case, select
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 
-from app.models import sql_models
+from app.models import sql_models, rollups
+from app.core.config import settings
 
 
 class StatisticsService:
@@ -14,42 +15,38 @@ class StatisticsService:
         self.db = db
 
     def get_overview_stats(self) -> Dict[str, Any]:
-        """Get overview statistics."""
-        total_requirements = self.db.query(sql_models.RequirementRaw).count()
-        total_test_points = self.db.query(sql_models.TestPoint).count()
-        total_test_cases = self.db.query(sql_models.TestCase).count()
-        total_defects = self.db.query(sql_models.Defect).count()
-
-        confirmed_cases = self.db.query(sql_models.TestCase).filter(
-            sql_models.TestCase.status == sql_models.TestCaseStatusEnum.CONFIRMED
-        ).count()
-
-        ai_generated_cases = self.db.query(sql_models.TestCase).filter(
-            sql_models.TestCase.created_by == sql_models.CreatorEnum.AI
-        ).count()
-
+        """Get overview statistics from the rollup counters."""
+        confirmed = rollups.counter_name("test_case", "status", sql_models.TestCaseStatusEnum.CONFIRMED)
+        ai_generated = rollups.counter_name("test_case", "created_by", sql_models.CreatorEnum.AI)
+        totals = ["requirement_raw", "test_point", "test_case", "defect"]
+        counters = rollups.read_counters(
+            self.db, names=[rollups.counter_name(table) for table in totals] + [confirmed, ai_generated]
+        )
+
+        total_test_cases = counters.get("test_case.total", 0)
+        confirmed_cases = counters.get(confirmed, 0)
         return {
-            "total_requirements": total_requirements,
-            "total_test_points": total_test_points,
+            "total_requirements": counters.get("requirement_raw.total", 0),
+            "total_test_points": counters.get("test_point.total", 0),
             "total_test_cases": total_test_cases,
-            "total_defects": total_defects,
+            "total_defects": counters.get("defect.total", 0),
             "confirmed_cases": confirmed_cases,
-            "ai_generated_cases": ai_generated_cases,
+            "ai_generated_cases": counters.get(ai_generated, 0),
             "confirmation_rate": round(confirmed_cases / total_test_cases * 100, 2) if total_test_cases > 0 else 0
         }
 
     def get_generation_stats(self, days: int = 7) -> Dict[str, Any]:
-        """Get test case generation statistics for recent days."""
-        start_date = datetime.utcnow() - timedelta(days=days)
-
-        tasks = self.db.query(sql_models.GenerationTask).filter(
-            sql_models.GenerationTask.created_at >= start_date
-        ).all()
-
-        total_tasks = len(tasks)
-        completed_tasks = sum(1 for t in tasks if t.status == sql_models.StatusEnum.DONE)
-        failed_tasks = sum(1 for t in tasks if t.status == sql_models.StatusEnum.FAILED)
-        running_tasks = sum(1 for t in tasks if t.status == sql_models.StatusEnum.RUNNING)
+        """
+        Get test case generation statistics for recent days.
+        Counted from the daily rollup, i.e. tasks created since the start of the day `days` ago (UTC).
+        """
+        since = (datetime.utcnow() - timedelta(days=days)).date()
+        by_status = rollups.read_daily_generation(self.db, since)
+
+        total_tasks = sum(by_status.values())
+        completed_tasks = by_status.get(sql_models.StatusEnum.DONE.value, 0)
+        failed_tasks = by_status.get(sql_models.StatusEnum.FAILED.value, 0)
+        running_tasks = by_status.get(sql_models.StatusEnum.RUNNING.value, 0)
 
         return {
             "period_days": days,
@@ -60,43 +57,158 @@ class StatisticsService:
             "success_rate": round(completed_tasks / total_tasks * 100, 2) if total_tasks > 0 else 0
         }
 
-    def get_test_coverage_by_requirement(self, requirement_id: int) -> Dict[str, Any]:
-        """Get test coverage statistics for a specific requirement."""
-        # Get test points for this requirement
-        test_points = self.db.query(sql_models.TestPoint).filter(
+    def _requirement_point_count(self):
+        """Number of requirement-sourced test points, the coverage denominator."""
+        return select(func.count(sql_models.TestPoint.id)).where(
             sql_models.TestPoint.source == "requirement"
-        ).all()
-
-        # Get test cases
-        test_cases = self.db.query(sql_models.TestCase).filter(
-            sql_models.TestCase.related_req_id == requirement_id
-        ).all()
+        ).scalar_subquery()
 
-        covered_points = len([tp for tp in test_points if any(tc.test_point_id == tp.id for tc in test_cases)])
+    def get_test_coverage_by_requirement(self, requirement_id: int) -> Dict[str, Any]:
+        """Get test coverage statistics for a specific requirement."""
+        tc, tp = sql_models.TestCase, sql_models.TestPoint
+
+        covered = select(func.count(func.distinct(tc.test_point_id))).join(
+            tp, tp.id == tc.test_point_id
+        ).where(tc.related_req_id == requirement_id, tp.source == "requirement").scalar_subquery()
+        total_cases = select(func.count(tc.id)).where(tc.related_req_id == requirement_id).scalar_subquery()
+
+        row = self.db.query(
+            self._requirement_point_count().label("total_test_points"),
+            covered.label("covered_test_points"),
+            total_cases.label("total_test_cases"),
+        ).one()
+
+        return self._coverage_item(requirement_id, row.total_test_points, row.covered_test_points, row.total_test_cases)
+
+    def get_test_coverage_all(self, requirement_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Get test coverage for all (or the given) requirements with one grouped query."""
+        tc, tp, req = sql_models.TestCase, sql_models.TestPoint, sql_models.RequirementStd
+
+        query = self.db.query(
+            req.id,
+            func.count(tc.id),
+            func.count(func.distinct(case((tp.source == "requirement", tc.test_point_id)))),
+        ).outerjoin(
+            tc, tc.related_req_id == req.id
+        ).outerjoin(
+            tp, tp.id == tc.test_point_id
+        )
+        if requirement_ids:
+            query = query.filter(req.id.in_(requirement_ids))
+        rows = query.group_by(req.id).order_by(req.id).all()
+
+        total_points = self.db.query(self._requirement_point_count()).scalar()
+        items = [
+            self._coverage_item(requirement_id, total_points, covered, total_cases)
+            for requirement_id, total_cases, covered in rows
+        ]
+        return {
+            "total_test_points": total_points,
+            "requirements": items
+        }
 
+    @staticmethod
+    def _coverage_item(requirement_id: int, total_points: int, covered_points: int, total_cases: int) -> Dict[str, Any]:
         return {
             "requirement_id": requirement_id,
-            "total_test_points": len(test_points),
+            "total_test_points": total_points,
             "covered_test_points": covered_points,
-            "total_test_cases": len(test_cases),
-            "coverage_rate": round(covered_points / len(test_points) * 100, 2) if test_points else 0
+            "total_test_cases": total_cases,
+            "coverage_rate": round(covered_points / total_points * 100, 2) if total_points else 0
         }
 
     def get_knowledge_stats(self) -> Dict[str, Any]:
-        """Get knowledge base statistics."""
-        test_points = self.db.query(
-            sql_models.TestPoint.type,
-            func.count(sql_models.TestPoint.id)
-        ).group_by(sql_models.TestPoint.type).all()
-
-        type_distribution = {tp_type.value: count for tp_type, count in test_points}
-
-        avg_confidence = self.db.query(
-            func.avg(sql_models.TestPoint.confidence)
-        ).scalar() or 0
+        """Get knowledge base statistics from the rollup counters."""
+        counters = rollups.read_counters(self.db, prefix="test_point.")
+        type_prefix = "test_point.type."
+        type_distribution = {
+            name[len(type_prefix):]: count
+            for name, count in sorted(counters.items())
+            if name.startswith(type_prefix) and count
+        }
+        confidence_count = counters.get("test_point.confidence_count", 0)
+        avg_confidence = (
+            counters.get("test_point.confidence_sum", 0) / rollups.CONFIDENCE_SCALE / confidence_count
+            if confidence_count else 0
+        )
 
         return {
             "type_distribution": type_distribution,
             "average_confidence": round(float(avg_confidence), 2),
             "total_knowledge_units": sum(type_distribution.values())
         }
+
+    def get_llm_usage_stats(self, days: int = 7, group_by: str = "call_site") -> Dict[str, Any]:
+        """
+        Get LLM and embedding token usage, latency and estimated cost for recent days.
+        group_by: call_site, task, requirement or day
+        """
+        start_date = datetime.utcnow() - timedelta(days=days)
+        log = sql_models.LLMCallLog
+
+        group_columns = {
+            "call_site": log.call_site,
+            "task": log.task_id,
+            "requirement": log.requirement_id,
+            "day": func.date(log.created_at),
+        }
+        group_column = group_columns[group_by]
+
+        rows = self.db.query(
+            group_column.label("key"),
+            log.kind,
+            func.count(log.id),
+            func.sum(log.prompt_tokens),
+            func.sum(log.completion_tokens),
+            func.sum(log.cached_tokens),
+            func.avg(log.latency_ms),
+            func.sum(case((log.success == False, 1), else_=0)),
+        ).filter(
+            log.created_at >= start_date
+        ).group_by(group_column, log.kind).all()
+
+        groups: Dict[str, Dict[str, Any]] = {}
+        for key, kind, calls, prompt, completion, cached, avg_latency, failed in rows:
+            key = str(key) if key is not None else "unattributed"
+            group = groups.setdefault(key, {
+                "key": key, "calls": 0, "failed_calls": 0, "prompt_tokens": 0,
+                "completion_tokens": 0, "cached_tokens": 0, "avg_latency_ms": 0, "estimated_cost": 0.0
+            })
+            prompt, completion, cached = int(prompt or 0), int(completion or 0), int(cached or 0)
+            # Weighted average across the chat/embedding rows of the same group
+            total_calls = group["calls"] + calls
+            group["avg_latency_ms"] = round(
+                (group["avg_latency_ms"] * group["calls"] + float(avg_latency or 0) * calls) / total_calls, 1
+            )
+            group["calls"] = total_calls
+            group["failed_calls"] += int(failed or 0)
+            group["prompt_tokens"] += prompt
+            group["completion_tokens"] += completion
+            group["cached_tokens"] += cached
+            group["estimated_cost"] += self._estimate_cost(kind, prompt, completion, cached)
+
+        items = sorted(groups.values(), key=lambda g: g["estimated_cost"], reverse=True)
+        for item in items:
+            item["estimated_cost"] = round(item["estimated_cost"], 4)
+
+        return {
+            "period_days": days,
+            "group_by": group_by,
+            "total_prompt_tokens": sum(g["prompt_tokens"] for g in items),
+            "total_completion_tokens": sum(g["completion_tokens"] for g in items),
+            "total_cached_tokens": sum(g["cached_tokens"] for g in items),
+            "total_estimated_cost": round(sum(g["estimated_cost"] for g in items), 4),
+            "groups": items
+        }
+
+    @staticmethod
+    def _estimate_cost(kind: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> float:
+        """Estimate the USD cost of a token usage with the prices from settings."""
+        if kind == "embedding":
+            return prompt_tokens / 1000 * settings.embedding_price_per_1k
+        uncached = max(prompt_tokens - cached_tokens, 0)
+        return (
+            uncached / 1000 * settings.llm_prompt_price_per_1k
+            + cached_tokens / 1000 * settings.llm_cached_prompt_price_per_1k
+            + completion_tokens / 1000 * settings.llm_completion_price_per_1k
+        )
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Batch knowledge extraction script for offline backfills.
+Runs the same staged pipeline as the batch-extract job in this process.
+
+Usage:
+    python scripts/batch_extract.py --all                    # every requirement
+    python scripts/batch_extract.py --ids 1 2 3              # selected requirements
+    python scripts/batch_extract.py --resume 12              # re-run the unfinished items of batch 12
+    python scripts/batch_extract.py --all --concurrency 16
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.models.sql_models import SessionLocal
+from app.services.batch_extraction_service import create_extraction_batch, run_batch_extraction
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract test knowledge from requirements in batch")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Extract every requirement")
+    target.add_argument("--ids", type=int, nargs="+", help="Requirement IDs to extract")
+    target.add_argument("--resume", type=int, metavar="BATCH_ID", help="Re-run the items of a batch that are not DONE")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help=f"Concurrent LLM calls (default {settings.extraction_concurrency})")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Batch Knowledge Extraction Script")
+    print("=" * 60)
+    print(f"Database URI: {settings.sqlalchemy_database_uri}")
+
+    try:
+        if args.resume:
+            batch_id = args.resume
+        else:
+            db = SessionLocal()
+            try:
+                batch = create_extraction_batch(db, None if args.all else args.ids)
+                db.commit()
+                batch_id, total = batch.id, batch.total
+            finally:
+                db.close()
+            print(f"\nCreated extraction batch {batch_id} with {total} requirements")
+
+        start = time.monotonic()
+
+        def on_progress(done: int, failed: int):
+            elapsed = time.monotonic() - start
+            print(f"  done {done}, failed {failed}, {(done + failed) / elapsed:.1f} requirements/s")
+
+        result = run_batch_extraction(batch_id, concurrency=args.concurrency, on_progress=on_progress)
+        print(f"\n✓ Batch {batch_id} finished: {result['done']} done, {result['failed']} failed, "
+              f"{result['nodes']} knowledge nodes")
+        for failure in result["failures"]:
+            print(f"  requirement {failure['requirement_id']}: {failure['error']}")
+        print("\n" + "=" * 60)
+    except Exception as e:
+        print(f"\n✗ Batch extraction failed: {e}")
+        print("\n" + "=" * 60)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
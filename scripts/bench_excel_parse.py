@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Excel parsing benchmark.
+Generates a multi-sheet requirement workbook and compares the previous
+DocumentParser.parse_excel (pd.ExcelFile, pd.read_excel per sheet, iterrows)
+with the single-pass read-only parser. Reports wall-clock seconds, and peak
+Python memory (tracemalloc) from a second, slower run.
+
+First checks that both parsers produce the same text for awkward workbooks:
+ragged rows wider than the header, leading and inner blank rows, an empty
+sheet, and the same sheets without or with a wrong <dimension> element.
+
+Usage:
+    python scripts/bench_excel_parse.py
+    python scripts/bench_excel_parse.py --sheets 10 --rows 20000
+    python scripts/bench_excel_parse.py --check
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+from typing import Callable, Tuple
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+
+from app.services.parser import DocumentParser
+
+
+def previous_parse_excel(file_path: str) -> str:
+    excel_file = pd.ExcelFile(file_path)
+    content = []
+    for sheet_name in excel_file.sheet_names:
+        df = pd.read_excel(file_path, sheet_name=sheet_name)
+        content.append(f"\n=== Sheet: {sheet_name} ===")
+        df = df.dropna(how='all')
+        if not df.empty:
+            headers = " | ".join([str(col) for col in df.columns])
+            content.append(headers)
+            content.append("-" * len(headers))
+            for _, row in df.iterrows():
+                content.append(" | ".join([str(val) if pd.notna(val) else "" for val in row]))
+    return "\n".join(content)
+
+
+def make_workbook(path: str, sheets: int, rows: int):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for s in range(sheets):
+        worksheet = workbook.create_sheet(f"模块{s}")
+        worksheet.append(["需求编号", "需求标题", "需求描述", "优先级", "负责人", "预估工时", "状态", "备注"])
+        for i in range(rows):
+            worksheet.append([
+                f"REQ-{s}-{i}", f"需求 {i}", "用户登录后可以查看订单列表，按创建时间倒序分页展示。",
+                f"P{i % 4}", f"user{i % 37}", i % 13 + 0.5, "待评审", None if i % 3 else "需确认"
+            ])
+    workbook.save(path)
+
+
+def make_ragged_workbook(path: str, leading_blank_row: bool = False):
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = "需求"
+    if leading_blank_row:
+        worksheet.append([])
+    worksheet.append(["编号", "标题"])
+    worksheet.append(["REQ-1", "登录", "超出表头的描述", "备注"])
+    worksheet.append(["REQ-2"])
+    worksheet.append([])
+    worksheet.append(["REQ-3", "支付", None, None, None, "最右侧"])
+    worksheet.append(["REQ-4", "退款", 3])
+    workbook.create_sheet("空表")
+    narrow = workbook.create_sheet("窄表")
+    narrow.append(["a"])
+    narrow.append(["1", "2", "3"])
+    workbook.save(path)
+
+
+def rewrite_dimension(src: str, dst: str, replacement: str):
+    """Copy a workbook with every sheet's <dimension> element replaced (or removed when empty)."""
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst, "w", zipfile.ZIP_DEFLATED) as zout:
+        for item in zin.infolist():
+            data = zin.read(item.filename)
+            if item.filename.startswith("xl/worksheets/sheet"):
+                data = re.sub(rb"<dimension[^>]*/>", replacement.encode(), data)
+            zout.writestr(item, data)
+
+
+def check_parity(document_parser: DocumentParser) -> bool:
+    """
+    Compare both parsers on ragged and dimensionless sheets. A leading blank row is
+    checked separately: pd.read_excel takes the blank row as the header (all
+    "Unnamed" columns) while the new parser uses the first row with data, so that
+    sheet must parse exactly like the same sheet without the blank row.
+    """
+    directory = tempfile.mkdtemp()
+    ragged = os.path.join(directory, "ragged.xlsx")
+    make_ragged_workbook(ragged)
+    cases = {"ragged": ragged}
+    for name, replacement in (("no dimension", ""), ("wrong dimension", '<dimension ref="A1"/>')):
+        cases[name] = os.path.join(directory, f"{name.replace(' ', '_')}.xlsx")
+        rewrite_dimension(ragged, cases[name], replacement)
+    leading_blank = os.path.join(directory, "leading_blank.xlsx")
+    make_ragged_workbook(leading_blank, leading_blank_row=True)
+    leading_blank_no_dimension = os.path.join(directory, "leading_blank_no_dimension.xlsx")
+    rewrite_dimension(leading_blank, leading_blank_no_dimension, "")
+
+    comparisons = {
+        # pandas turns integer columns with gaps into floats ("3.0"); the new parser keeps "3"
+        name: (lambda path=path: re.sub(r"\b(\d+)\.0\b", r"\1", previous_parse_excel(path)), path)
+        for name, path in cases.items()
+    }
+    for name, path in (("leading blank row", leading_blank),
+                       ("leading blank row, no dimension", leading_blank_no_dimension)):
+        comparisons[name] = (lambda: document_parser.parse_excel(ragged), path)
+
+    ok = True
+    for name, (expected_fn, path) in comparisons.items():
+        expected = expected_fn()
+        actual = document_parser.parse_excel(path)
+        if actual == expected:
+            print(f"✓ {name}")
+        else:
+            ok = False
+            print(f"✗ {name}\n--- expected ---{expected}\n--- read-only ---{actual}")
+    for path in list(cases.values()) + [leading_blank, leading_blank_no_dimension]:
+        os.remove(path)
+    os.rmdir(directory)
+    return ok
+
+
+def measure(fn: Callable[[], str]) -> Tuple[float, float, int]:
+    """Seconds, peak MB and output length."""
+    start = time.perf_counter()
+    text = fn()
+    elapsed = time.perf_counter() - start
+    # Tracing slows allocation down several times, so memory is measured separately
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return elapsed, peak, len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Excel parsing")
+    parser.add_argument("--sheets", type=int, default=5, help="Sheets in the workbook (default 5)")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows per sheet (default 10000)")
+    parser.add_argument("--check", action="store_true", help="Only run the parity checks")
+    args = parser.parse_args()
+
+    # Measure parsing, not the parse cache
+    document_parser = DocumentParser(use_cache=False)
+    print("=" * 60)
+    print("Excel Parsing Benchmark")
+    print("=" * 60)
+    if not check_parity(document_parser):
+        sys.exit(1)
+    if args.check:
+        return
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        make_workbook(path, args.sheets, args.rows)
+
+        print(f"\n{args.sheets} sheets x {args.rows} rows, {os.path.getsize(path) / 1024 / 1024:.1f} MB\n")
+        print(f"{'parser':<12}{'seconds':>10}{'peak MB':>10}{'chars':>12}")
+        results = {}
+        for name, fn in (("previous", lambda: previous_parse_excel(path)),
+                         ("read-only", lambda: document_parser.parse_excel(path))):
+            results[name] = measure(fn)
+            seconds, peak, chars = results[name]
+            print(f"{name:<12}{seconds:>10.2f}{peak:>10.1f}{chars:>12}")
+        print(f"\nSpeedup: {results['previous'][0] / results['read-only'][0]:.1f}x")
+        print("=" * 60)
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Response serialization benchmark.
+Compares the previous path (Pydantic models + stdlib json JSONResponse) with the
+orjson Success path on large payloads: a requirement list page, a graph subgraph
+and a test case list. Reports CPU milliseconds per response.
+
+Usage:
+    python scripts/bench_responses.py
+    python scripts/bench_responses.py --rows 5000 --repeat 20
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.core.response import Success
+from app.models.sql_models import StatusEnum
+from app.schemas.requirement_schema import RequirementOut
+
+
+class GraphNode(BaseModel):
+    id: str
+    labels: List[str]
+    properties: Dict[str, Any]
+
+
+class GraphRelationship(BaseModel):
+    source: str
+    target: str
+    type: str
+    properties: Dict[str, Any]
+
+
+class Subgraph(BaseModel):
+    nodes: List[GraphNode]
+    relationships: List[GraphRelationship]
+
+
+def stdlib_success(data: Any) -> bytes:
+    return JSONResponse(content={"code": 0, "message": "success", "data": data}).body
+
+
+def make_requirements(rows: int) -> List[SimpleNamespace]:
+    now = datetime.utcnow()
+    return [
+        SimpleNamespace(id=i, name=f"需求 {i}", description="用户登录后可以查看订单列表，按创建时间倒序分页展示。" * 3,
+                        priority=i % 5, status=StatusEnum.PENDING, create_time=now, update_time=now)
+        for i in range(rows)
+    ]
+
+
+def make_subgraph(rows: int):
+    nodes = [
+        {"id": f"TP-{i}", "labels": ["TestPoint"],
+         "properties": {"id": f"TP-{i}", "content": f"校验第 {i} 个边界条件", "type": "test_point", "confidence": 0.8}}
+        for i in range(rows)
+    ]
+    relationships = [
+        {"source": f"TP-{i}", "target": f"TP-{i + 1}", "type": "RELATED_TO", "properties": {"weight": 0.5}}
+        for i in range(rows - 1)
+    ]
+    return nodes, relationships
+
+
+def make_testcases(rows: int) -> List[Dict[str, Any]]:
+    now = datetime.utcnow()
+    return [
+        {"id": i, "title": f"用例 {i}", "precondition": "已登录", "steps": ["打开页面", "输入数据", "点击提交"],
+         "expected": "提交成功并提示", "status": "confirmed", "created_at": now}
+        for i in range(rows)
+    ]
+
+
+def measure(fn: Callable[[], bytes], repeat: int) -> float:
+    """CPU milliseconds per call."""
+    fn()
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response serialization")
+    parser.add_argument("--rows", type=int, default=2000, help="Rows per payload (default 2000)")
+    parser.add_argument("--repeat", type=int, default=10, help="Responses per measurement (default 10)")
+    args = parser.parse_args()
+
+    requirements = make_requirements(args.rows)
+    nodes, relationships = make_subgraph(args.rows)
+    testcases = make_testcases(args.rows)
+
+    cases = {
+        "requirement list": (
+            lambda: stdlib_success({"items": [RequirementOut.model_validate(r).model_dump(mode="json") for r in requirements]}),
+            lambda: Success(data={"items": [
+                {"id": r.id, "name": r.name, "description": r.description, "priority": r.priority,
+                 "status": r.status, "create_time": r.create_time, "update_time": r.update_time}
+                for r in requirements
+            ]}).body,
+        ),
+        "graph subgraph": (
+            lambda: stdlib_success(Subgraph(
+                nodes=[GraphNode(**node) for node in nodes],
+                relationships=[GraphRelationship(**rel) for rel in relationships]
+            ).model_dump()),
+            lambda: Success(data={"nodes": nodes, "relationships": relationships}).body,
+        ),
+        "test case list": (
+            lambda: stdlib_success([{**tc, "created_at": tc["created_at"].isoformat()} for tc in testcases]),
+            lambda: Success(data=testcases).body,
+        ),
+    }
+
+    print("=" * 60)
+    print("Response Serialization Benchmark")
+    print("=" * 60)
+    print(f"{args.rows} rows per payload, {args.repeat} responses per measurement\n")
+    print(f"{'payload':<18}{'stdlib ms':>12}{'orjson ms':>12}{'speedup':>10}{'size KB':>10}")
+    for name, (before, after) in cases.items():
+        before_ms = measure(before, args.repeat)
+        after_ms = measure(after, args.repeat)
+        size = len(after()) / 1024
+        print(f"{name:<18}{before_ms:>12.2f}{after_ms:>12.2f}{before_ms / after_ms:>9.1f}x{size:>10.0f}")
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Database initialization script.
-Creates all tables defined in sql_models.py
+Creates all tables defined in sql_models.py and applies pending migrations
+(see scripts/migrate.py).
 """
 import sys
 from pathlib import Path
@@ -31,6 +32,15 @@ def main():
         print("  - defect")
         print("  - generation_task")
         print("  - generation_result")
+        print("  - generation_step")
+        print("  - job_queue")
+        print("  - llm_call_log")
+        print("  - extraction_batch")
+        print("  - extraction_batch_item")
+        print("  - outbox_event")
+        print("  - schema_version")
+        print("  - stats_counter")
+        print("  - stats_daily_generation")
         print("  - requirements (legacy)")
         print("  - knowledge_bases (legacy)")
         print("  - tasks (legacy)")
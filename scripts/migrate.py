@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Database migration script.
+Applies the versioned migrations in app/db/migrations and records them in schema_version.
+
+Usage:
+    python scripts/migrate.py              # apply all pending migrations
+    python scripts/migrate.py --status     # list applied and pending migrations
+    python scripts/migrate.py --target 2   # apply pending migrations up to version 2
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.db.migrations import applied_versions, load_migrations, run_migrations
+from app.models.sql_models import engine
+
+
+def show_status():
+    with engine.connect() as conn:
+        done = set(applied_versions(conn))
+        conn.commit()
+    for module in load_migrations():
+        state = "applied" if module.VERSION in done else "pending"
+        print(f"  {module.VERSION:03d}  [{state}]  {module.DESCRIPTION}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("--status", action="store_true", help="Only list applied and pending migrations")
+    parser.add_argument("--target", type=int, default=None, help="Highest version to apply")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Database Migration Script")
+    print("=" * 60)
+    print(f"Database URI: {settings.sqlalchemy_database_uri}")
+
+    try:
+        if args.status:
+            show_status()
+        else:
+            applied = run_migrations(engine, target=args.target)
+            if applied:
+                print(f"\n✓ Applied migrations: {', '.join(f'{v:03d}' for v in applied)}")
+            else:
+                print("\n✓ Schema is up to date.")
+        print("\n" + "=" * 60)
+    except Exception as e:
+        print(f"\n✗ Migration failed: {e}")
+        print("\n" + "=" * 60)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+OpenAI-compatible mock LLM and embedding server for load testing.
+
+Implements /v1/chat/completions and /v1/embeddings with schema-valid JSON for every
+prompt type used by the services, deterministic hash-based embeddings, configurable
+latency, token counts and error/429 rates. Point the application at it with:
+
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=mock
+
+Usage:
+    python scripts/mock_llm_server.py --port 8100 --latency-ms 800 --jitter-ms 400 --rate-limit-rate 0.02
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import struct
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.core.config import settings
+
+
+class MockConfig:
+    """Runtime knobs of the mock server, set from the command line."""
+    latency_ms: float = 500
+    jitter_ms: float = 200
+    ms_per_completion_token: float = 0
+    completion_tokens: int = 0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    items_per_list: int = 5
+    embedding_dim: int = settings.embedding_dim
+    seed: int = 0
+
+
+config = MockConfig()
+app = FastAPI(title="Mock LLM Server")
+
+# Prefixes seen recently, used to report cached_tokens like providers with prefix caching
+_seen_prefixes: "OrderedDict[str, None]" = OrderedDict()
+_MAX_SEEN_PREFIXES = 10000
+
+
+def _estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English and 1.5 per token for CJK text
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return max(1, int(cjk / 1.5 + (len(text) - cjk) / 4))
+
+
+def _cached_prefix_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Report all but the last message as cached when the same prefix was seen before."""
+    if len(messages) < 2:
+        return 0
+    prefix = json.dumps(messages[:-1], ensure_ascii=False, sort_keys=True)
+    key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+    if key in _seen_prefixes:
+        _seen_prefixes.move_to_end(key)
+        return _estimate_tokens("".join(str(m.get("content", "")) for m in messages[:-1]))
+    _seen_prefixes[key] = None
+    if len(_seen_prefixes) > _MAX_SEEN_PREFIXES:
+        _seen_prefixes.popitem(last=False)
+    return 0
+
+
+def _detect_prompt_type(messages: List[Dict[str, Any]]) -> str:
+    """Infer which service prompt this is, looking at the last message first."""
+    last = str(messages[-1].get("content", "")) if messages else ""
+    everything = "\n".join(str(m.get("content", "")) for m in messages)
+
+    if 'Job: "plan"' in last:
+        return "plan"
+    if 'Job: "test case"' in last:
+        return "plan_case"
+    for text in (last, everything):
+        if "【当前任务】" in text and "测试点列表" in text:
+            return "test_points"
+        if "【当前任务】" in text and "测试用例" in text:
+            return "test_case"
+        if '"intents"' in text:
+            return "intents"
+        if '"nodes"' in text and '"edges"' in text:
+            return "extraction"
+        if '"risk_point"' in text:
+            return "risk"
+        if '"test_points"' in text:
+            return "test_points"
+    return "test_case"
+
+
+def _fake_content(prompt_type: str, rng: random.Random) -> Dict[str, Any]:
+    n = max(1, config.items_per_list)
+    if prompt_type == "intents":
+        scopes = ["functional", "exception", "risk", "boundary"]
+        return {"intents": [
+            {"description": f"测试意图 {i + 1}", "scope": scopes[i % len(scopes)]} for i in range(n)
+        ]}
+    if prompt_type == "test_points":
+        categories = ["正常", "异常", "边界"]
+        return {"test_points": [
+            {"category": categories[i % len(categories)], "description": f"验证测试点 {i + 1}-{rng.randint(1000, 9999)}"}
+            for i in range(n)
+        ]}
+    if prompt_type == "plan":
+        return {"plan": [f"Test plan item {i + 1}" for i in range(n)]}
+    if prompt_type == "plan_case":
+        return {
+            "title": f"Test case {rng.randint(1000, 9999)}",
+            "preconditions": "System is available",
+            "steps": ["Open the page", "Enter the input", "Submit"],
+            "expected_results": "The operation succeeds",
+        }
+    if prompt_type == "extraction":
+        types = ["TestPoint", "Scenario", "Risk"]
+        nodes = [
+            {"id": f"temp-{i + 1}", "type": types[i % len(types)],
+             "content": f"测试知识 {i + 1}-{rng.randint(1000, 9999)}", "confidence": round(rng.uniform(0.5, 1.0), 2)}
+            for i in range(n)
+        ]
+        edges = [
+            {"source": f"temp-{i}", "target": f"temp-{i + 1}", "relation": "RELATES_TO"} for i in range(1, n)
+        ]
+        return {"nodes": nodes, "edges": edges}
+    if prompt_type == "risk":
+        return {"risk_point": "输入校验缺失导致异常数据入库", "severity": "medium", "mitigation": "增加边界值与非法输入测试"}
+    return {
+        "title": f"测试用例 {rng.randint(1000, 9999)}",
+        "precondition": "系统正常运行",
+        "steps": ["步骤1", "步骤2", "步骤3"],
+        "expected": "预期结果符合需求",
+    }
+
+
+def _embedding(text: str, dim: int) -> List[float]:
+    """Deterministic unit vector derived from the SHA-256 of the text."""
+    values: List[float] = []
+    counter = 0
+    while len(values) < dim:
+        digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+        # 8 unsigned 32-bit ints per digest mapped to [-1, 1)
+        values.extend(v / 2147483648.0 - 1.0 for v in struct.unpack("<8I", digest))
+        counter += 1
+    values = values[:dim]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+
+def _error(status_code: int, message: str, error_type: str) -> JSONResponse:
+    headers = {"retry-after": "1"} if status_code == 429 else None
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": message, "type": error_type, "code": error_type}},
+        headers=headers,
+    )
+
+
+async def _simulate(completion_tokens: int = 0):
+    """Sleep for the configured latency and maybe return an injected failure."""
+    latency = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+    latency += completion_tokens * config.ms_per_completion_token
+    await asyncio.sleep(max(latency, 0) / 1000)
+
+    roll = random.random()
+    if roll < config.rate_limit_rate:
+        return _error(429, "Rate limit reached (mock)", "rate_limit_exceeded")
+    if roll < config.rate_limit_rate + config.error_rate:
+        return _error(500, "Internal server error (mock)", "server_error")
+    return None
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    prompt_type = _detect_prompt_type(messages)
+
+    rng = random.Random(config.seed or None)
+    content = json.dumps(_fake_content(prompt_type, rng), ensure_ascii=False)
+
+    prompt_text = "".join(str(m.get("content", "")) for m in messages)
+    prompt_tokens = _estimate_tokens(prompt_text)
+    completion_tokens = config.completion_tokens or _estimate_tokens(content)
+
+    failure = await _simulate(completion_tokens)
+    if failure is not None:
+        return failure
+
+    return {
+        "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": min(_cached_prefix_tokens(messages), prompt_tokens)},
+        },
+    }
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    dim = body.get("dimensions") or config.embedding_dim
+
+    failure = await _simulate()
+    if failure is not None:
+        return failure
+
+    prompt_tokens = sum(_estimate_tokens(str(text)) for text in inputs)
+    return {
+        "object": "list",
+        "data": [
+            {"object": "embedding", "index": i, "embedding": _embedding(str(text), dim)}
+            for i, text in enumerate(inputs)
+        ],
+        "model": body.get("model", "mock-embedding"),
+        "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+    }
+
+
+@app.get("/v1/models")
+def list_models():
+    return {"object": "list", "data": [
+        {"id": settings.openai_model, "object": "model", "owned_by": "mock"},
+        {"id": settings.openai_embedding_model, "object": "model", "owned_by": "mock"},
+    ]}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM/embedding server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=MockConfig.latency_ms, help="Base latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=MockConfig.jitter_ms, help="Uniform +/- latency jitter")
+    parser.add_argument("--ms-per-completion-token", type=float, default=0,
+                        help="Extra latency per generated token, to mimic decode time")
+    parser.add_argument("--completion-tokens", type=int, default=0,
+                        help="Fixed completion token count to report (0 = estimate from content)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests failing with 429")
+    parser.add_argument("--items", type=int, default=MockConfig.items_per_list,
+                        help="Number of intents/test points/plan items/nodes per response")
+    parser.add_argument("--embedding-dim", type=int, default=settings.embedding_dim)
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generated content (0 = random)")
+    args = parser.parse_args()
+
+    config.latency_ms = args.latency_ms
+    config.jitter_ms = args.jitter_ms
+    config.ms_per_completion_token = args.ms_per_completion_token
+    config.completion_tokens = args.completion_tokens
+    config.error_rate = args.error_rate
+    config.rate_limit_rate = args.rate_limit_rate
+    config.items_per_list = args.items
+    config.embedding_dim = args.embedding_dim
+    config.seed = args.seed
+
+    print("=" * 60)
+    print("Mock LLM Server")
+    print("=" * 60)
+    print(f"Listening on http://{args.host}:{args.port}/v1")
+    print(f"Latency: {args.latency_ms}ms +/- {args.jitter_ms}ms, "
+          f"errors: {args.error_rate:.1%}, 429s: {args.rate_limit_rate:.1%}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Statistics rollup rebuild script.
+Recomputes stats_counter and stats_daily_generation from the base tables to repair drift,
+e.g. after rows were changed outside the application. Run it while writes are quiet.
+
+Usage:
+    python scripts/rebuild_stats.py            # rebuild and print the counters
+    python scripts/rebuild_stats.py --check    # only report counters that drifted
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.models import rollups
+from app.models.sql_models import engine
+
+
+def show_drift():
+    with engine.connect() as conn:
+        expected = rollups.compute_deltas(conn)
+        stored = rollups.read_stored(conn)
+
+    drifted = 0
+    for name in sorted(set(expected.counters) | set(stored.counters)):
+        if stored.counters.get(name, 0) != expected.counters.get(name, 0):
+            drifted += 1
+            print(f"  {name}: stored {stored.counters.get(name, 0)}, actual {expected.counters.get(name, 0)}")
+    for day, status in sorted(set(expected.days) | set(stored.days)):
+        key = (day, status)
+        if stored.days.get(key, 0) != expected.days.get(key, 0):
+            drifted += 1
+            print(f"  generation {day} {status}: stored {stored.days.get(key, 0)}, actual {expected.days.get(key, 0)}")
+    return drifted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the statistics rollup tables")
+    parser.add_argument("--check", action="store_true", help="Only report drifted counters")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Statistics Rollup Rebuild Script")
+    print("=" * 60)
+    print(f"Database URI: {settings.sqlalchemy_database_uri}")
+
+    try:
+        if args.check:
+            drifted = show_drift()
+            print(f"\n{'✗' if drifted else '✓'} {drifted} rollup values drifted.")
+        else:
+            with engine.begin() as conn:
+                deltas = rollups.rebuild(conn)
+            for name, value in sorted(deltas.counters.items()):
+                print(f"  {name}: {value}")
+            print(f"\n✓ Rebuilt {len(deltas.counters)} counters and {len(deltas.days)} daily generation buckets.")
+        print("\n" + "=" * 60)
+    except Exception as e:
+        print(f"\n✗ Rebuild failed: {e}")
+        print("\n" + "=" * 60)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
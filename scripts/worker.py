@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Job queue worker.
+Runs queued generation and extraction jobs outside the API server,
+and the outbox relay that propagates knowledge changes to Milvus and Neo4j.
+
+Usage:
+    python scripts/worker.py                                   # all queues, limits from QUEUE_CONCURRENCY
+    python scripts/worker.py --queues generation=4,extraction=2 --processes 3
+"""
+import argparse
+import multiprocessing
+import signal
+import sys
+import threading
+from pathlib import Path
+from typing import Dict
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+
+
+def parse_queues(value: str) -> Dict[str, int]:
+    """Parse "name=size,name=size" into a dict; a bare name uses the configured limit."""
+    queues = {}
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, size = part.partition("=")
+        queues[name] = int(size) if size else settings.queue_concurrency.get(name, 1)
+    return queues
+
+
+def run_worker(queues: Dict[str, int]):
+    # Registers the job handlers
+    import app.services.jobs  # noqa: F401
+    from app.services.job_queue import Worker
+
+    worker = Worker(queues)
+    relay = None
+    if settings.outbox_relay_enabled:
+        # Propagates outbox events to Milvus/Neo4j; one relay drains at a time across processes
+        from app.services.outbox import OutboxRelay
+        relay = OutboxRelay()
+        threading.Thread(target=relay.run, daemon=True).start()
+
+    def stop(*_):
+        worker.stop()
+        if relay is not None:
+            relay.stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    worker.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Job queue worker")
+    parser.add_argument("--queues", default=",".join(settings.queue_concurrency),
+                        help="Comma separated queue=threads list (threads per process)")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes")
+    args = parser.parse_args()
+
+    queues = parse_queues(args.queues)
+    print("=" * 60)
+    print("Job Queue Worker")
+    print("=" * 60)
+    print(f"Queues (threads per process): {queues}")
+    print(f"Processes: {args.processes}")
+    print(f"Global concurrency limits: {settings.queue_concurrency}")
+
+    if args.processes == 1:
+        run_worker(queues)
+        return
+
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(queues,), name=f"worker-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward(signum, _frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()